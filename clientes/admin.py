@@ -12,7 +12,8 @@ class ClienteAdmin(admin.ModelAdmin):
     list_display = ['numero_cliente', 'nome', 'nif', 'tipo_cliente', 'status', 'saldo_atual', 'data_cadastro']
     list_filter = ['tipo_cliente', 'status', 'data_cadastro']
     search_fields = ['numero_cliente', 'nome', 'nif', 'bi', 'telefone', 'email']
-    readonly_fields = ['numero_cliente', 'data_cadastro', 'data_atualizacao']
+    # O saldo só muda pela conta-corrente (pagamentos.recargas.lancar_movimento)
+    readonly_fields = ['numero_cliente', 'saldo_atual', 'data_cadastro', 'data_atualizacao']
     fieldsets = (
         ('Informações Básicas', {
             'fields': ('numero_cliente', 'nome', 'nif', 'bi')
@@ -0,0 +1,42 @@
+import django_filters
+from django.db.models import Case, IntegerField, When
+from energia_gestao.api import ApiViewSet
+from . import pesquisa
+from .models import Cliente
+from .serializers import ClienteSerializer
+
+class ClienteFilter(django_filters.FilterSet):
+    # Nome, números, telefone ou contador (clientes.pesquisa); devolve os resultados mais relevantes
+    # (até pesquisa.LIMITE_RESULTADOS), do mais para o menos relevante
+    pesquisa = django_filters.CharFilter(method='filtrar_pesquisa')
+
+    def filtrar_pesquisa(self, queryset, name, value):
+        ids = pesquisa.pesquisar(value)
+        if not ids:
+            return queryset.none()
+        relevancia = Case(*(When(pk=cliente_id, then=posicao) for posicao, cliente_id in enumerate(ids)), output_field=IntegerField())
+        return queryset.filter(pk__in=ids).order_by(relevancia)
+
+    class Meta:
+        model = Cliente
+        fields = {
+            'numero_cliente': ['exact'],
+            'nif': ['exact'],
+            'bi': ['exact'],
+            'tipo_cliente': ['exact'],
+            'status': ['exact'],
+            'tarifa': ['exact'],
+            'data_cadastro': ['gte', 'lt'],
+        }
+
+class ClienteViewSet(ApiViewSet):
+    queryset = Cliente.objects.select_related('tarifa')
+    serializer_class = ClienteSerializer
+    filterset_class = ClienteFilter
+
+    def paginate_queryset(self, queryset):
+        # Com ?pesquisa= a resposta é a lista dos resultados pela ordem de relevância, sem
+        # paginação: o cursor da paginação voltaria a ordenar por -id
+        if self.request.query_params.get('pesquisa'):
+            return None
+        return super().paginate_queryset(queryset)
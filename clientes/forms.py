@@ -5,7 +5,7 @@ from django.contrib.auth.models import User
 class ClienteForm(forms.ModelForm):
     class Meta:
         model = Cliente
-        fields = ['nome', 'nif', 'bi', 'morada', 'telefone', 'email', 'tipo_cliente', 'status', 'saldo_atual', 'observacoes']
+        fields = ['nome', 'nif', 'bi', 'morada', 'telefone', 'email', 'tipo_cliente', 'status', 'observacoes']
         widgets = {
             'nome': forms.TextInput(attrs={'class': 'form-control'}),
             'nif': forms.TextInput(attrs={'class': 'form-control'}),
@@ -15,7 +15,6 @@ class ClienteForm(forms.ModelForm):
             'email': forms.EmailInput(attrs={'class': 'form-control'}),
             'tipo_cliente': forms.Select(attrs={'class': 'form-control'}),
             'status': forms.Select(attrs={'class': 'form-control'}),
-            'saldo_atual': forms.NumberInput(attrs={'class': 'form-control'}),
             'observacoes': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
         }
 
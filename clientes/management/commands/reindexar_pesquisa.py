@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from clientes.pesquisa import reindexar
+
+
+class Command(BaseCommand):
+    help = 'Recalcula o texto de pesquisa de todos os clientes e reconstrói o índice de pesquisa'
+
+    def handle(self, *args, **options):
+        def progresso(clientes):
+            if options['verbosity'] >= 2:
+                self.stdout.write(f'  {clientes} clientes reindexados')
+
+        inicio = time.monotonic()
+        total = reindexar(progresso=progresso)
+        self.stdout.write(self.style.SUCCESS(f'{total} clientes reindexados em {time.monotonic() - inicio:.2f}s'))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0003_cliente_tarifa'),
+        ('pagamentos', '0007_fatura_pdf_hash'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['data_cadastro'], name='cliente_cadastro_idx'),
+        ),
+    ]
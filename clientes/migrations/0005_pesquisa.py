@@ -0,0 +1,70 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:57
+
+from django.db import migrations, models
+
+from clientes.pesquisa import TABELA_FTS, _texto
+
+TAMANHO_BLOCO = 5000
+
+# PostgreSQL: índice de trigramas na própria coluna (requer permissão para criar a extensão pg_trgm)
+INDICE_TRIGRAMAS = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX cliente_pesquisa_trgm_idx ON clientes_cliente USING gin (texto_pesquisa gin_trgm_ops)",
+]
+
+
+def preencher_texto_pesquisa(apps, schema_editor):
+    Cliente = apps.get_model('clientes', 'Cliente')
+    Contador = apps.get_model('equipamentos', 'Contador')
+    ultimo = 0
+    while True:
+        clientes = list(Cliente.objects.filter(pk__gt=ultimo).order_by('pk')[:TAMANHO_BLOCO])
+        if not clientes:
+            break
+        series = dict(
+            Contador.objects.filter(cliente_id__gte=clientes[0].pk, cliente_id__lte=clientes[-1].pk)
+            .values_list('cliente_id', 'numero_serie')
+        )
+        textos = [
+            (_texto(cliente.nome, cliente.numero_cliente, cliente.nif, cliente.bi, cliente.telefone, series.get(cliente.pk)), cliente.pk)
+            for cliente in clientes
+        ]
+        with schema_editor.connection.cursor() as cursor:
+            cursor.executemany('UPDATE clientes_cliente SET texto_pesquisa = %s WHERE id = %s', textos)
+        ultimo = clientes[-1].pk
+
+
+def criar_indice_pesquisa(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        for sql in INDICE_TRIGRAMAS:
+            schema_editor.execute(sql)
+    elif vendor == 'sqlite':
+        schema_editor.execute(f"CREATE VIRTUAL TABLE {TABELA_FTS} USING fts5(texto_pesquisa, tokenize='trigram')")
+        schema_editor.execute(f"INSERT INTO {TABELA_FTS} (rowid, texto_pesquisa) SELECT id, texto_pesquisa FROM clientes_cliente")
+
+
+def apagar_indice_pesquisa(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS cliente_pesquisa_trgm_idx")
+    elif vendor == 'sqlite':
+        schema_editor.execute(f"DROP TABLE IF EXISTS {TABELA_FTS}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0004_indices_consultas'),
+        ('equipamentos', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='texto_pesquisa',
+            field=models.TextField(blank=True, default='', editable=False, help_text='Nome, números e contador normalizados (clientes.pesquisa)'),
+        ),
+        migrations.RunPython(preencher_texto_pesquisa, migrations.RunPython.noop),
+        migrations.RunPython(criar_indice_pesquisa, apagar_indice_pesquisa),
+    ]
@@ -2,6 +2,8 @@ from django.db import models
 from django.core.validators import RegexValidator
 from django.contrib.auth.models import User
 import uuid
+from numeracao import series
+from . import pesquisa
 
 class Perfil(models.Model):
     TIPO_USUARIO_CHOICES = [
@@ -47,24 +49,27 @@ class Cliente(models.Model):
     data_cadastro = models.DateTimeField(auto_now_add=True)
     data_atualizacao = models.DateTimeField(auto_now=True)
     observacoes = models.TextField(blank=True, null=True)
+    texto_pesquisa = models.TextField(blank=True, default='', editable=False, help_text='Nome, números e contador normalizados (clientes.pesquisa)')
     
     class Meta:
         verbose_name = 'Cliente'
         verbose_name_plural = 'Clientes'
         ordering = ['-data_cadastro']
+        indexes = [
+            models.Index(fields=['data_cadastro'], name='cliente_cadastro_idx'),
+        ]
     
     def __str__(self):
         return f"{self.numero_cliente} - {self.nome}"
     
     def save(self, *args, **kwargs):
         if not self.numero_cliente:
-            ultimo_numero = Cliente.objects.all().order_by('-id').first()
-            if ultimo_numero:
-                numero = int(ultimo_numero.numero_cliente.split('-')[1]) + 1
-            else:
-                numero = 1
-            self.numero_cliente = f"CLI-{numero:06d}"
+            self.numero_cliente = series.proximo('CLIENTE')
+        self.texto_pesquisa = pesquisa.texto_cliente(self)
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'texto_pesquisa'}
         super().save(*args, **kwargs)
+        pesquisa.indexar(self.pk, self.texto_pesquisa)
 
 
 class Contrato(models.Model):
@@ -0,0 +1,190 @@
+"""
+Pesquisa de clientes (e dos seus contadores) para o atendimento.
+
+Cada cliente tem em ``Cliente.texto_pesquisa`` o nome, o número de cliente,
+o NIF, o BI, o telefone e o número de série do contador, normalizados (sem
+acentos nem pontuação, em minúsculas). O texto é recalculado ao gravar o
+cliente e, quando muda o número de série ou o cliente de um contador, ao
+gravar o contador.
+
+A coluna é indexada para pesquisas de partes de palavras:
+
+* PostgreSQL: índice GIN ``pg_trgm`` (as pesquisas ``LIKE '%...%'`` usam-no);
+* SQLite: tabela FTS5 com o tokenizador ``trigram`` (``TABELA_FTS``),
+  atualizada pelo ``save`` do cliente.
+
+Um NIF, BI ou número de cliente completo devolve só esse cliente (pelos
+índices únicos); nos outros termos, os identificadores completos aparecem
+à frente. Os restantes resultados são os ``CANDIDATOS`` clientes mais
+recentes que contêm todas as palavras, ordenados por ``_relevancia``
+(palavras completas antes de inícios de palavra e de partes): ordenar
+todas as correspondências de um termo frequente (um apelido comum num
+milhão de clientes) custaria centenas de milissegundos, e um termo assim
+tem de ser refinado de qualquer forma. ``manage.py reindexar_pesquisa``
+reconstrói tudo.
+"""
+import re
+import unicodedata
+
+from django.apps import apps
+from django.db import connection, transaction
+from django.db.models import Q
+
+TABELA_FTS = 'clientes_cliente_pesquisa'
+LIMITE_RESULTADOS = 50
+CANDIDATOS = 500
+MIN_CARACTERES = 3  # os índices de trigramas só procuram partes com pelo menos 3 caracteres
+TAMANHO_BLOCO = 5000
+
+
+def normalizar(texto):
+    """Minúsculas, sem acentos e só letras e algarismos separados por espaços."""
+    texto = unicodedata.normalize('NFKD', str(texto or '')).encode('ascii', 'ignore').decode()
+    return ' '.join(re.sub(r'[^0-9a-z]+', ' ', texto.lower()).split())
+
+
+def _texto(nome, numero_cliente, nif, bi, telefone, numero_serie):
+    telefone = re.sub(r'\D', '', telefone or '')
+    # O número de cliente também sem o hífen (CLI-000123 e cli000123)
+    partes = [nome, numero_cliente, (numero_cliente or '').replace('-', ''), nif, bi, telefone, numero_serie]
+    return normalizar(' '.join(parte for parte in partes if parte))
+
+
+def texto_cliente(cliente):
+    """Texto de pesquisa de ``cliente`` (ainda não gravado)."""
+    numero_serie = None
+    if cliente.pk:
+        Contador = apps.get_model('equipamentos', 'Contador')
+        numero_serie = Contador.objects.filter(cliente_id=cliente.pk).values_list('numero_serie', flat=True).first()
+    return _texto(cliente.nome, cliente.numero_cliente, cliente.nif, cliente.bi, cliente.telefone, numero_serie)
+
+
+def indexar(cliente_id, texto):
+    """Atualiza a entrada do cliente no índice FTS (só em SQLite; em PostgreSQL o índice é da própria coluna)."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABELA_FTS} WHERE rowid = %s', [cliente_id])
+        if texto is not None:
+            cursor.execute(f'INSERT INTO {TABELA_FTS} (rowid, texto_pesquisa) VALUES (%s, %s)', [cliente_id, texto])
+
+
+def atualizar(cliente_ids):
+    """Recalcula e grava o texto de pesquisa dos clientes ``cliente_ids``."""
+    Cliente = apps.get_model('clientes', 'Cliente')
+    Contador = apps.get_model('equipamentos', 'Contador')
+    cliente_ids = [cliente_id for cliente_id in cliente_ids if cliente_id]
+    series = dict(
+        Contador.objects.filter(cliente_id__in=cliente_ids).values_list('cliente_id', 'numero_serie')
+    )
+    for cliente_id, nome, numero_cliente, nif, bi, telefone in Cliente.objects.filter(pk__in=cliente_ids).values_list(
+        'pk', 'nome', 'numero_cliente', 'nif', 'bi', 'telefone'
+    ):
+        texto = _texto(nome, numero_cliente, nif, bi, telefone, series.get(cliente_id))
+        Cliente.objects.filter(pk=cliente_id).update(texto_pesquisa=texto)
+        indexar(cliente_id, texto)
+
+
+def reindexar(progresso=None):
+    """
+    Recalcula o texto de pesquisa de todos os clientes, por blocos, e
+    reconstrói o índice FTS. ``progresso``, se indicado, é chamado como
+    ``progresso(clientes)`` após cada bloco. Devolve o número de clientes.
+    """
+    Cliente = apps.get_model('clientes', 'Cliente')
+    Contador = apps.get_model('equipamentos', 'Contador')
+    total = 0
+    ultimo = 0
+    while True:
+        clientes = list(
+            Cliente.objects.filter(pk__gt=ultimo).order_by('pk')
+            .only('pk', 'nome', 'numero_cliente', 'nif', 'bi', 'telefone')[:TAMANHO_BLOCO]
+        )
+        if not clientes:
+            break
+        series = dict(
+            Contador.objects.filter(cliente_id__gte=clientes[0].pk, cliente_id__lte=clientes[-1].pk)
+            .values_list('cliente_id', 'numero_serie')
+        )
+        textos = [
+            (_texto(cliente.nome, cliente.numero_cliente, cliente.nif, cliente.bi, cliente.telefone, series.get(cliente.pk)), cliente.pk)
+            for cliente in clientes
+        ]
+        # Um UPDATE por cliente em lote: o bulk_update (um CASE por cliente) é dezenas de vezes mais lento
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(f'UPDATE {Cliente._meta.db_table} SET texto_pesquisa = %s WHERE id = %s', textos)
+        total += len(clientes)
+        ultimo = clientes[-1].pk
+        if progresso:
+            progresso(total)
+    if connection.vendor == 'sqlite':
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABELA_FTS}')
+            cursor.execute(f'INSERT INTO {TABELA_FTS} (rowid, texto_pesquisa) SELECT id, texto_pesquisa FROM clientes_cliente')
+    return total
+
+
+def _relevancia(texto, palavras):
+    """Pontuação de ``texto`` para ``palavras``: 2 por palavra completa, 1 por início de palavra."""
+    texto = ' %s ' % texto
+    return sum(2 if ' %s ' % palavra in texto else 1 if ' ' + palavra in texto else 0 for palavra in palavras)
+
+
+def _candidatos_fts(palavras):
+    """``(id, texto)`` dos clientes mais recentes com todas as ``palavras``, pelo índice FTS."""
+    longas = [palavra for palavra in palavras if len(palavra) >= MIN_CARACTERES]
+    # As palavras curtas não estão no índice de trigramas: filtram as linhas encontradas
+    curtas = [palavra for palavra in palavras if len(palavra) < MIN_CARACTERES]
+    condicoes = ''.join(' AND texto_pesquisa LIKE %s' for _ in curtas)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid, texto_pesquisa FROM {TABELA_FTS} WHERE {TABELA_FTS} MATCH %s{condicoes} '
+            'ORDER BY rowid DESC LIMIT %s',
+            [' '.join('"%s"' % palavra for palavra in longas)] + ['%%%s%%' % palavra for palavra in curtas] + [CANDIDATOS],
+        )
+        return cursor.fetchall()
+
+
+def pesquisar(termo, limite=LIMITE_RESULTADOS):
+    """
+    Devolve a lista dos ids dos clientes que correspondem a ``termo`` (todas
+    as palavras têm de aparecer, em qualquer campo), do mais relevante para
+    o menos relevante, até ``limite``.
+    """
+    Cliente = apps.get_model('clientes', 'Cliente')
+    termo = (termo or '').strip()
+    normalizado = normalizar(termo)
+    if not normalizado:
+        return []
+    palavras = normalizado.split()
+
+    # Identificadores completos (índices únicos) à frente de tudo
+    exatos = list(
+        Cliente.objects.filter(Q(nif=termo) | Q(bi=termo) | Q(numero_cliente=termo.upper()))
+        .values_list('pk', flat=True)[:limite]
+    )
+    if exatos and len(termo.split()) == 1:
+        # Um NIF, BI ou número de cliente completo identifica o cliente (as partes
+        # de outros números que o contenham não interessam e são as pesquisas mais lentas)
+        return exatos
+
+    if connection.vendor == 'sqlite' and any(len(palavra) >= MIN_CARACTERES for palavra in palavras):
+        candidatos = _candidatos_fts(palavras)
+    else:
+        clientes = Cliente.objects.all()
+        for palavra in palavras:
+            # texto_pesquisa já está em minúsculas: contains (LIKE) usa o índice de trigramas, icontains (UPPER) não
+            clientes = clientes.filter(texto_pesquisa__contains=palavra)
+        candidatos = clientes.order_by('-pk').values_list('pk', 'texto_pesquisa')[:CANDIDATOS]
+
+    # Ordenação estável: com a mesma relevância, os mais recentes primeiro
+    ids = [cliente_id for cliente_id, texto in sorted(candidatos, key=lambda candidato: -_relevancia(candidato[1], palavras))]
+    return (exatos + [cliente_id for cliente_id in ids if cliente_id not in exatos])[:limite]
+
+
+def clientes(termo, queryset=None, limite=LIMITE_RESULTADOS):
+    """Os clientes de ``pesquisar(termo)`` (restringidos a ``queryset``), pela ordem de relevância."""
+    Cliente = apps.get_model('clientes', 'Cliente')
+    ids = pesquisar(termo, limite)
+    por_id = (queryset if queryset is not None else Cliente.objects.all()).in_bulk(ids)
+    return [por_id[cliente_id] for cliente_id in ids if cliente_id in por_id]
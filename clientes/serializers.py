@@ -0,0 +1,11 @@
+from energia_gestao.api import CamposSerializer
+from rest_framework import serializers
+from .models import Cliente
+
+class ClienteSerializer(CamposSerializer):
+    tarifa_nome = serializers.CharField(source='tarifa.nome', read_only=True, default=None)
+
+    class Meta:
+        model = Cliente
+        fields = ['id', 'numero_cliente', 'nome', 'nif', 'bi', 'morada', 'telefone', 'email', 'tipo_cliente',
+                  'status', 'saldo_atual', 'tarifa', 'tarifa_nome', 'data_cadastro', 'data_atualizacao']
@@ -0,0 +1,19 @@
+"""Manutenção do índice de pesquisa (``clientes.pesquisa``) quando clientes ou contadores são apagados."""
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from equipamentos.models import Contador
+from . import pesquisa
+from .models import Cliente
+
+
+@receiver(post_delete, sender=Cliente)
+def remover_da_pesquisa(sender, instance, **kwargs):
+    pesquisa.indexar(instance.pk, None)
+
+
+@receiver(post_delete, sender=Contador)
+def retirar_contador_da_pesquisa(sender, instance, **kwargs):
+    # O número de série do contador apagado deixa de encontrar o cliente
+    if instance.cliente_id:
+        pesquisa.atualizar([instance.cliente_id])
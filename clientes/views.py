@@ -1,10 +1,11 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db import models
 from django.contrib.auth.models import User
 from .models import Cliente, Perfil
 from .forms import ClienteForm, UserProfileForm
+from energia_gestao.paginacao import PaginaCursor, paginar_por_cursor
+from . import pesquisa
 
 @login_required
 def perfil_edit(request):
@@ -25,11 +26,20 @@ def perfil_edit(request):
 @login_required
 def cliente_list(request):
     search_query = request.GET.get('q') or request.GET.get('search', '')
+    limite_pesquisa = None
     if search_query:
-        clientes = Cliente.objects.filter(models.Q(nome__icontains=search_query) | models.Q(numero_cliente__icontains=search_query))
+        # Os resultados mais relevantes (clientes.pesquisa), sem paginação
+        pagina = PaginaCursor(pesquisa.clientes(search_query))
+        if len(pagina) >= pesquisa.LIMITE_RESULTADOS:
+            limite_pesquisa = pesquisa.LIMITE_RESULTADOS
     else:
-        clientes = Cliente.objects.all()
-    return render(request, 'clientes/cliente_list.html', {'clientes': clientes, 'search_query': search_query})
+        pagina = paginar_por_cursor(
+            Cliente.objects.all(), ['-data_cadastro', '-id'],
+            apos=request.GET.get('apos'), antes=request.GET.get('antes'),
+        )
+    return render(request, 'clientes/cliente_list.html', {
+        'clientes': pagina, 'search_query': search_query, 'limite_pesquisa': limite_pesquisa,
+    })
 
 @login_required
 def cliente_create(request):
@@ -0,0 +1,52 @@
+"""
+Peças comuns da API REST (``/api/v1/``). A paginação por cursor está em
+``energia_gestao.paginacao.PaginacaoCursor``.
+
+- ``CamposSerializer``: seleção de campos com ``?fields=a,b,c``.
+- ``ApiViewSet``: viewset só de leitura que restringe os utilizadores com
+  perfil CLIENTE aos seus próprios dados (como as páginas HTML).
+- ``PermissaoLancamentos``: as operações que escrevem (recargas, etc.) ficam
+  reservadas à equipa (staff e perfis ADMIN, OPERADOR e FINANCEIRO).
+"""
+from rest_framework import permissions, viewsets
+from rest_framework.serializers import ModelSerializer
+
+
+class CamposSerializer(ModelSerializer):
+    """Serializer que devolve apenas os campos pedidos em ``?fields=``, se indicados."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        pedidos = request.query_params.get('fields') if request else None
+        if pedidos:
+            pedidos = {campo.strip() for campo in pedidos.split(',')}
+            for campo in set(self.fields) - pedidos:
+                self.fields.pop(campo)
+
+
+class ApiViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    ``campo_cliente`` é o caminho do modelo até ao ``Cliente`` (vazio no
+    próprio ``Cliente``), usado para limitar os utilizadores CLIENTE aos seus
+    dados pelo email, tal como nas listagens HTML.
+    """
+    campo_cliente = ''
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if hasattr(user, 'perfil') and user.perfil.tipo_usuario == 'CLIENTE':
+            caminho = f'{self.campo_cliente}__email' if self.campo_cliente else 'email'
+            queryset = queryset.filter(**{caminho: user.email})
+        return queryset
+
+
+class PermissaoLancamentos(permissions.BasePermission):
+    """Leitura para qualquer utilizador autenticado; escrita só para a equipa."""
+
+    def has_permission(self, request, view):
+        if request.method in permissions.SAFE_METHODS:
+            return True
+        user = request.user
+        return user.is_staff or (hasattr(user, 'perfil') and user.perfil.tipo_usuario in ['ADMIN', 'OPERADOR', 'FINANCEIRO'])
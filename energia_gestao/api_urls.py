@@ -0,0 +1,22 @@
+from django.urls import path
+from rest_framework.routers import DefaultRouter
+from clientes.api import ClienteViewSet
+from equipamentos.api import (
+    ConsumoDiarioViewSet, ConsumoMensalViewSet, ContadorViewSet, IngestaoIntervalosView, LeituraConsumoViewSet,
+)
+from pagamentos.api import FaturaViewSet, MovimentoSaldoViewSet, PagamentoViewSet, RecargaViewSet
+
+router = DefaultRouter()
+router.register('clientes', ClienteViewSet)
+router.register('contadores', ContadorViewSet)
+router.register('leituras', LeituraConsumoViewSet)
+router.register('consumos-diarios', ConsumoDiarioViewSet)
+router.register('consumos-mensais', ConsumoMensalViewSet)
+router.register('faturas', FaturaViewSet)
+router.register('pagamentos', PagamentoViewSet)
+router.register('recargas', RecargaViewSet)
+router.register('movimentos-saldo', MovimentoSaldoViewSet)
+
+urlpatterns = [
+    path('leituras-intervalo/', IngestaoIntervalosView.as_view(), name='ingestao_intervalos'),
+] + router.urls
@@ -0,0 +1,94 @@
+"""
+Encaminhamento de leituras para a réplica (``DATABASES['replica']``).
+
+Por omissão tudo vai para a base principal. As vistas de relatórios, os
+dashboards e as exportações marcam as suas leituras com ``usar_replica()``
+(decorador ou gestor de contexto); se a réplica não estiver configurada as
+leituras continuam na principal.
+
+``usar_principal()`` fixa as leituras na principal e tem prioridade sobre um
+``usar_replica()`` interior, para ler logo a seguir a uma escrita sem o
+atraso de replicação. Uma escrita feita dentro de ``usar_replica()`` fixa
+também as leituras seguintes na principal até ao fim desse bloco, tal como
+qualquer leitura dentro de uma transação.
+
+Entre pedidos, uma vista que escreve e redireciona para uma vista lida da
+réplica chama ``fixar_principal(request)``: durante
+``settings.REPLICA_ATRASO_MAXIMO`` segundos as vistas decoradas com
+``replica_exceto_apos_escrita`` leem dessa sessão na principal, para que o
+utilizador veja logo o que acabou de gravar.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA = 'replica'
+CHAVE_SESSAO = 'leituras_principal_ate'
+
+_leituras = ContextVar('leituras', default=None)
+
+
+def _replica_configurada():
+    return REPLICA in settings.DATABASES
+
+
+@contextmanager
+def usar_replica():
+    """Envia as leituras do bloco para a réplica (se existir e as leituras não estiverem fixadas na principal)."""
+    if _leituras.get() == DEFAULT_DB_ALIAS or not _replica_configurada():
+        yield
+        return
+    token = _leituras.set(REPLICA)
+    try:
+        yield
+    finally:
+        _leituras.reset(token)
+
+
+@contextmanager
+def usar_principal():
+    """Fixa as leituras do bloco na base principal."""
+    token = _leituras.set(DEFAULT_DB_ALIAS)
+    try:
+        yield
+    finally:
+        _leituras.reset(token)
+
+
+def fixar_principal(request):
+    """Depois de uma escrita: as leituras desta sessão vão para a principal durante o atraso máximo da réplica."""
+    request.session[CHAVE_SESSAO] = time.time() + getattr(settings, 'REPLICA_ATRASO_MAXIMO', 10)
+
+
+def replica_exceto_apos_escrita(vista):
+    """Decorador de vistas: lê da réplica, exceto logo a seguir a um ``fixar_principal`` na mesma sessão."""
+    @wraps(vista)
+    def envolvida(request, *args, **kwargs):
+        recente = request.session.get(CHAVE_SESSAO, 0) > time.time()
+        with usar_principal() if recente else usar_replica():
+            return vista(request, *args, **kwargs)
+    return envolvida
+
+
+class RouterReplica:
+    def db_for_read(self, model, **hints):
+        if _leituras.get() != REPLICA or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        if _leituras.get() == REPLICA:
+            # Só dentro de usar_replica(), que repõe o valor anterior à saída
+            _leituras.set(DEFAULT_DB_ALIAS)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # A réplica tem os mesmos dados que a principal
+        return {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, REPLICA}
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
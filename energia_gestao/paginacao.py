@@ -0,0 +1,123 @@
+"""
+Paginação por cursor (keyset) para listagens grandes.
+
+Em vez de ``OFFSET``, cada página filtra a partir dos valores de ordenação da
+última (ou primeira) linha da página anterior, pelo que páginas profundas
+custam o mesmo que a primeira. A ordenação deve terminar num campo único
+(normalmente ``id``) para que o cursor seja inequívoco.
+"""
+import base64
+import json
+
+from django.db.models import Q
+from rest_framework.pagination import CursorPagination
+
+POR_PAGINA = 25
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+class PaginaCursor:
+    def __init__(self, itens, cursor_anterior=None, cursor_seguinte=None):
+        self.itens = itens
+        self.cursor_anterior = cursor_anterior
+        self.cursor_seguinte = cursor_seguinte
+
+    def __iter__(self):
+        return iter(self.itens)
+
+    def __len__(self):
+        return len(self.itens)
+
+    @property
+    def has_previous(self):
+        return self.cursor_anterior is not None
+
+    @property
+    def has_next(self):
+        return self.cursor_seguinte is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_previous or self.has_next
+
+
+def _campos(ordenacao):
+    return [(campo.lstrip('-'), campo.startswith('-')) for campo in ordenacao]
+
+
+def _codificar(item, campos):
+    valores = []
+    for nome, _ in campos:
+        valor = getattr(item, nome)
+        valores.append(valor.isoformat() if hasattr(valor, 'isoformat') else valor)
+    return base64.urlsafe_b64encode(json.dumps(valores).encode()).decode().rstrip('=')
+
+
+def _descodificar(cursor, modelo, campos):
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if len(valores) != len(campos):
+            raise ValueError
+        return [modelo._meta.get_field(nome).to_python(valor) for (nome, _), valor in zip(campos, valores)]
+    except Exception as erro:
+        raise CursorInvalido(cursor) from erro
+
+
+def _filtro_apos(campos, valores, inverter=False):
+    """Comparação lexicográfica (a, b, c) > (va, vb, vc) respeitando o sentido de cada campo."""
+    filtro = Q()
+    iguais = {}
+    for (nome, descendente), valor in zip(campos, valores):
+        operador = 'lt' if descendente != inverter else 'gt'
+        filtro |= Q(**iguais, **{f'{nome}__{operador}': valor})
+        iguais[nome] = valor
+    return filtro
+
+
+def paginar_por_cursor(queryset, ordenacao, apos=None, antes=None, por_pagina=POR_PAGINA):
+    """
+    Devolve a ``PaginaCursor`` de ``queryset`` ordenado por ``ordenacao``
+    (ex.: ``['-data_emissao', '-id']``) que começa depois do cursor ``apos``
+    ou termina antes do cursor ``antes``. Cursores inválidos voltam à primeira página.
+    """
+    campos = _campos(ordenacao)
+    modelo = queryset.model
+    try:
+        if antes:
+            valores = _descodificar(antes, modelo, campos)
+            invertida = [campo[1:] if campo.startswith('-') else f'-{campo}' for campo in ordenacao]
+            itens = list(
+                queryset.filter(_filtro_apos(campos, valores, inverter=True))
+                .order_by(*invertida)[:por_pagina + 1]
+            )
+            existe_anterior = len(itens) > por_pagina
+            itens = itens[:por_pagina][::-1]
+            return PaginaCursor(
+                itens,
+                cursor_anterior=_codificar(itens[0], campos) if existe_anterior else None,
+                cursor_seguinte=_codificar(itens[-1], campos) if itens else None,
+            )
+        if apos:
+            valores = _descodificar(apos, modelo, campos)
+            queryset = queryset.filter(_filtro_apos(campos, valores))
+    except CursorInvalido:
+        apos = None
+
+    itens = list(queryset.order_by(*ordenacao)[:por_pagina + 1])
+    existe_seguinte = len(itens) > por_pagina
+    itens = itens[:por_pagina]
+    return PaginaCursor(
+        itens,
+        cursor_anterior=_codificar(itens[0], campos) if apos and itens else None,
+        cursor_seguinte=_codificar(itens[-1], campos) if existe_seguinte else None,
+    )
+
+
+class PaginacaoCursor(CursorPagination):
+    """Equivalente na API REST: cursor sobre ``-id``, com ``?page_size=`` até 500."""
+    ordering = '-id'
+    page_size_query_param = 'page_size'
+    max_page_size = 500
@@ -52,11 +52,14 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'rest_framework',
+    'rest_framework.authtoken',
     'django_filters',
     'clientes',
     'equipamentos',
     'pagamentos',
     'relatorios',
+    'processamento',
+    'numeracao',
 ]
 
 MIDDLEWARE = [
@@ -104,14 +107,90 @@ WSGI_APPLICATION = 'energia_gestao.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# DB_ENGINE=postgresql usa as variáveis PGDATABASE/PGUSER/PGPASSWORD/PGHOST/PGPORT.
+# Com DB_POOL=True usa o pool de ligações nativo do Django (requer psycopg 3 com
+# o extra "pool"); caso contrário as ligações persistem DB_CONN_MAX_AGE segundos.
+
+DB_ENGINE = config('DB_ENGINE', default='sqlite')
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('PGDATABASE'),
+            'USER': config('PGUSER', default=''),
+            'PASSWORD': config('PGPASSWORD', default=''),
+            'HOST': config('PGHOST', default='localhost'),
+            'PORT': config('PGPORT', default='5432'),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'sslmode': config('PGSSLMODE', default='prefer'),
+            },
+        }
+    }
+    if config('DB_POOL', default=False, cast=bool):
+        # O pool é incompatível com ligações persistentes (CONN_MAX_AGE tem de ser 0)
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': config('DB_POOL_MIN', default=2, cast=int),
+            'max_size': config('DB_POOL_MAX', default=10, cast=int),
+            'timeout': config('DB_POOL_TIMEOUT', default=10, cast=int),
+        }
+    else:
+        DATABASES['default']['CONN_MAX_AGE'] = config('DB_CONN_MAX_AGE', default=60, cast=int)
+    # Mesma base, noutra ligação: a reserva dos blocos de numeração (numeracao.series) é
+    # confirmada logo, sem ficar bloqueada até ao fim da transação de quem pede os números
+    DATABASES['numeracao'] = {
+        **DATABASES['default'],
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+        'TEST': {'MIRROR': 'default'},
+    }
+    if config('PGHOST_REPLICA', default=''):
+        # Réplica só de leitura para relatórios, dashboards e exportações
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'HOST': config('PGHOST_REPLICA'),
+            'PORT': config('PGPORT_REPLICA', default=DATABASES['default']['PORT']),
+            'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+            'TEST': {'MIRROR': 'default'},
+        }
+        # Segundos em que uma sessão lê da principal depois de escrever (db_routers.fixar_principal)
+        REPLICA_ATRASO_MAXIMO = config('REPLICA_ATRASO_MAXIMO', default=10, cast=int)
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': config('SQLITE_PATH', default=str(BASE_DIR / 'db.sqlite3')),
+            'OPTIONS': {
+                # WAL: leituras não bloqueiam a escrita; a escrita espera até
+                # "timeout" segundos pelo bloqueio em vez de falhar com
+                # "database is locked", e as transações pedem o bloqueio de
+                # escrita logo no início (IMMEDIATE) para não falharem a meio.
+                'timeout': config('SQLITE_TIMEOUT', default=20, cast=int),
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': 'PRAGMA journal_mode=WAL;PRAGMA synchronous=NORMAL',
+            },
+        }
+    }
+
+DATABASE_ROUTERS = ['energia_gestao.db_routers.RouterReplica']
 
-DATABASES = {
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Em produção com vários workers use um backend partilhado, por exemplo
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache e CACHE_LOCATION=redis://...
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='energia-gestao'),
     }
 }
 
+# Segundos durante os quais as métricas do dashboard ficam em cache
+METRICAS_CACHE_TTL = config('METRICAS_CACHE_TTL', default=60, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -166,7 +245,12 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # REST Framework Configuration
 REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.TokenAuthentication',
+    ],
+    'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.IsAuthenticated'],
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'energia_gestao.paginacao.PaginacaoCursor',
     'PAGE_SIZE': 20
 }
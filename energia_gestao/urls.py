@@ -20,6 +20,7 @@ from django.conf import settings
 from django.conf.urls.static import static
 from energia_gestao import views
 from django.contrib.auth import views as auth_views
+from rest_framework.authtoken.views import obtain_auth_token
 
 urlpatterns = [
     path('', auth_views.LoginView.as_view(), name='login_root'),
@@ -29,6 +30,9 @@ urlpatterns = [
     path('contadores/', include('equipamentos.urls')),
     path('pagamentos/', include('pagamentos.urls')),
     path('relatorios/', include('relatorios.urls')),
+    path('processos/', include('processamento.urls')),
+    path('api/v1/', include('energia_gestao.api_urls')),
+    path('api/v1/token/', obtain_auth_token, name='api_token'),
     path('accounts/', include('django.contrib.auth.urls')),
     path('admin/', admin.site.urls),
 ]
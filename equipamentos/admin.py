@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Contador, HistoricoManutencao, CartaoRecarga
+from .models import Contador, HistoricoManutencao, CartaoRecarga, ConsumoDiario, ConsumoMensal, AnomaliaConsumo
 
 @admin.register(Contador)
 class ContadorAdmin(admin.ModelAdmin):
@@ -29,3 +29,27 @@ class CartaoRecargaAdmin(admin.ModelAdmin):
     list_filter = ['status', 'data_criacao']
     search_fields = ['codigo_cartao', 'cliente_uso__nome']
     raw_id_fields = ['cliente_uso']
+
+@admin.register(ConsumoDiario)
+class ConsumoDiarioAdmin(admin.ModelAdmin):
+    list_display = ['contador', 'dia', 'energia_wh', 'intervalos']
+    list_filter = ['dia']
+    search_fields = ['contador__numero_serie']
+    raw_id_fields = ['contador']
+    date_hierarchy = 'dia'
+
+@admin.register(ConsumoMensal)
+class ConsumoMensalAdmin(admin.ModelAdmin):
+    list_display = ['contador', 'mes', 'energia_wh', 'intervalos']
+    list_filter = ['mes']
+    search_fields = ['contador__numero_serie']
+    raw_id_fields = ['contador']
+
+@admin.register(AnomaliaConsumo)
+class AnomaliaConsumoAdmin(admin.ModelAdmin):
+    list_display = ['contador', 'tipo', 'consumo', 'consumo_medio', 'pontuacao_z', 'leituras_seguidas', 'resolvida', 'data_detecao']
+    list_filter = ['tipo', 'resolvida', 'data_detecao']
+    list_editable = ['resolvida']
+    search_fields = ['contador__numero_serie', 'contador__cliente__nome']
+    raw_id_fields = ['contador', 'leitura']
+    readonly_fields = ['data_detecao']
@@ -0,0 +1,152 @@
+"""
+Deteção de anomalias no histórico de leituras dos contadores.
+
+O histórico (``LeituraConsumo``) é lido por blocos de ``TAMANHO_BLOCO``
+contadores, numa única consulta por bloco (``values_list``, ordenada por
+contador e data), para vetores NumPy. Todas as contas são feitas de uma vez
+sobre o bloco inteiro, sem ciclos por contador:
+
+* consumo negativo (leitura inferior à anterior);
+* média e desvio padrão móveis das ``JANELA`` leituras anteriores de cada
+  contador (por somas acumuladas) e a pontuação z de cada leitura: picos
+  (``PICO_CONSUMO``) e quedas bruscas (``QUEDA_CONSUMO``, típicas de
+  adulteração) acima de ``LIMITE_Z``;
+* sequências de pelo menos ``MIN_LEITURAS_ZERO`` leituras seguidas com
+  consumo zero em contadores ativos (contador parado).
+
+As anomalias são gravadas em ``AnomaliaConsumo`` (uma por leitura e tipo):
+repetir a análise atualiza-as, sem duplicar nem reabrir as já resolvidas.
+A leitura do histórico é feita na réplica, quando configurada.
+"""
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from energia_gestao.db_routers import usar_replica
+from .models import AnomaliaConsumo, Contador, LeituraConsumo
+
+TAMANHO_BLOCO = 20000  # contadores analisados de cada vez
+DIAS_HISTORICO = 365
+JANELA = 6  # leituras anteriores usadas na média móvel
+MIN_HISTORICO = 3  # leituras anteriores necessárias para calcular a pontuação z
+LIMITE_Z = 3.5
+# Desvio mínimo (fração da média, e nunca menos de 1 kWh), para que um
+# contador de consumo muito regular não dê pontuações z enormes
+DESVIO_MINIMO = 0.1
+MIN_LEITURAS_ZERO = 3
+
+
+def _kwh(valor):
+    return Decimal(f'{valor:.2f}')
+
+
+def _historico(primeiro, ultimo, desde):
+    """Devolve ``(ids, contador_ids, consumos)`` das leituras dos contadores ``primeiro``..``ultimo``."""
+    with usar_replica():
+        linhas = list(
+            LeituraConsumo.objects
+            .filter(contador_id__gte=primeiro, contador_id__lte=ultimo, data_leitura__gte=desde)
+            .order_by('contador_id', 'data_leitura', 'pk')
+            # Em float na própria consulta, sem criar um Decimal por linha
+            .annotate(consumo_kwh=Cast('consumo', FloatField()))
+            .values_list('pk', 'contador_id', 'consumo_kwh')
+        )
+    dados = np.array(linhas, dtype=np.float64).reshape(-1, 3)
+    return dados[:, 0].astype(np.int64), dados[:, 1].astype(np.int64), dados[:, 2]
+
+
+def _analisar(ids, contador_ids, consumos, inativos):
+    """Devolve as ``AnomaliaConsumo`` (por gravar) das leituras de um bloco, ordenadas por contador e data."""
+    n = len(ids)
+    posicoes = np.arange(n)
+    inicio = np.ones(n, dtype=bool)
+    inicio[1:] = contador_ids[1:] != contador_ids[:-1]
+    # Posição da primeira leitura do contador, em cada leitura
+    primeira = np.maximum.accumulate(np.where(inicio, posicoes, 0))
+
+    # Média e desvio das JANELA leituras anteriores do mesmo contador
+    soma = np.concatenate(([0.0], np.cumsum(consumos)))
+    soma_quadrados = np.concatenate(([0.0], np.cumsum(consumos * consumos)))
+    desde = np.maximum(primeira, posicoes - JANELA)
+    anteriores = posicoes - desde
+    divisor = np.maximum(anteriores, 1)
+    media = (soma[posicoes] - soma[desde]) / divisor
+    variancia = (soma_quadrados[posicoes] - soma_quadrados[desde]) / divisor - media * media
+    desvio = np.maximum(np.sqrt(np.clip(variancia, 0, None)), np.maximum(DESVIO_MINIMO * np.abs(media), 1.0))
+    pontuacao = np.where(anteriores >= MIN_HISTORICO, (consumos - media) / desvio, 0.0)
+
+    # Sequências de consumo zero: posição onde começa a sequência em curso
+    zero = consumos == 0
+    marca = np.where(~zero, posicoes + 1, np.where(inicio, posicoes, 0))
+    inicio_zeros = np.maximum.accumulate(marca)
+    termina = np.ones(n, dtype=bool)
+    termina[:-1] = inicio[1:] | ~zero[1:]
+    seguidas = posicoes - inicio_zeros + 1
+    parados = zero & termina & (seguidas >= MIN_LEITURAS_ZERO) & ~np.isin(contador_ids, inativos)
+
+    anomalias = []
+
+    def assinalar(tipo, indices, origem=None, com_pontuacao=True):
+        origem = indices if origem is None else origem
+        for i, j in zip(indices.tolist(), origem.tolist()):
+            anomalias.append(AnomaliaConsumo(
+                contador_id=int(contador_ids[j]),
+                leitura_id=int(ids[j]),
+                tipo=tipo,
+                consumo=_kwh(consumos[j]),
+                consumo_medio=_kwh(media[j]) if anteriores[j] else None,
+                pontuacao_z=round(float(pontuacao[j]), 2) if com_pontuacao else None,
+                leituras_seguidas=int(seguidas[i]) if tipo == 'CONTADOR_PARADO' else 1,
+            ))
+
+    assinalar('CONSUMO_NEGATIVO', np.flatnonzero(consumos < 0), com_pontuacao=False)
+    assinalar('PICO_CONSUMO', np.flatnonzero(pontuacao >= LIMITE_Z))
+    assinalar('QUEDA_CONSUMO', np.flatnonzero((pontuacao <= -LIMITE_Z) & (consumos > 0)))
+    # A anomalia fica na primeira leitura da sequência, que não muda se o contador continuar parado
+    fins = np.flatnonzero(parados)
+    assinalar('CONTADOR_PARADO', fins, inicio_zeros[fins], com_pontuacao=False)
+    return anomalias
+
+
+def detetar_anomalias(desde=None, tamanho_bloco=TAMANHO_BLOCO, progresso=None):
+    """
+    Analisa as leituras desde ``desde`` (por omissão, os últimos
+    ``DIAS_HISTORICO`` dias) de todos os contadores e grava as anomalias.
+    ``progresso``, se indicado, é chamado como ``progresso(contadores)`` após
+    cada bloco. Devolve um dicionário com o resumo.
+    """
+    inicio = time.monotonic()
+    desde = desde or timezone.now() - timedelta(days=DIAS_HISTORICO)
+    with usar_replica():
+        contadores = list(Contador.objects.order_by('pk').values_list('pk', 'status'))
+    inativos = np.array([pk for pk, status in contadores if status != 'ATIVO'], dtype=np.int64)
+
+    resultado = {'contadores': len(contadores), 'leituras': 0, 'anomalias': 0, 'por_tipo': {tipo: 0 for tipo, _ in AnomaliaConsumo.TIPO_CHOICES}}
+    for posicao in range(0, len(contadores), tamanho_bloco):
+        bloco = contadores[posicao:posicao + tamanho_bloco]
+        ids, contador_ids, consumos = _historico(bloco[0][0], bloco[-1][0], desde)
+        if len(ids):
+            anomalias = _analisar(ids, contador_ids, consumos, inativos)
+            AnomaliaConsumo.objects.bulk_create(
+                anomalias,
+                batch_size=1000,
+                update_conflicts=True,
+                unique_fields=['leitura', 'tipo'],
+                update_fields=['consumo_medio', 'pontuacao_z', 'leituras_seguidas'],
+            )
+            resultado['leituras'] += len(ids)
+            resultado['anomalias'] += len(anomalias)
+            for anomalia in anomalias:
+                resultado['por_tipo'][anomalia.tipo] += 1
+        if progresso:
+            progresso(posicao + len(bloco))
+
+    duracao = time.monotonic() - inicio
+    resultado['duracao'] = duracao
+    resultado['contadores_por_segundo'] = resultado['contadores'] / duracao if duracao > 0 else 0
+    return resultado
@@ -0,0 +1,95 @@
+import django_filters
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from energia_gestao.api import ApiViewSet, PermissaoLancamentos
+from .intervalos import ingerir
+from .models import ConsumoDiario, ConsumoMensal, Contador, LeituraConsumo
+from .serializers import ConsumoDiarioSerializer, ConsumoMensalSerializer, ContadorSerializer, LeituraConsumoSerializer
+
+MAX_LEITURAS_PEDIDO = 50000
+
+class ContadorFilter(django_filters.FilterSet):
+    class Meta:
+        model = Contador
+        fields = {
+            'numero_serie': ['exact'],
+            'cliente': ['exact'],
+            'tipo_contador': ['exact'],
+            'status': ['exact'],
+            'data_instalacao': ['gte', 'lt'],
+        }
+
+class LeituraConsumoFilter(django_filters.FilterSet):
+    numero_serie = django_filters.CharFilter(field_name='contador__numero_serie')
+
+    class Meta:
+        model = LeituraConsumo
+        fields = {
+            'contador': ['exact'],
+            'data_leitura': ['gte', 'lt'],
+        }
+
+class ConsumoDiarioFilter(django_filters.FilterSet):
+    numero_serie = django_filters.CharFilter(field_name='contador__numero_serie')
+
+    class Meta:
+        model = ConsumoDiario
+        fields = {
+            'contador': ['exact'],
+            'dia': ['exact', 'gte', 'lt'],
+        }
+
+class ConsumoMensalFilter(django_filters.FilterSet):
+    numero_serie = django_filters.CharFilter(field_name='contador__numero_serie')
+
+    class Meta:
+        model = ConsumoMensal
+        fields = {
+            'contador': ['exact'],
+            'mes': ['exact', 'gte', 'lt'],
+        }
+
+class ContadorViewSet(ApiViewSet):
+    queryset = Contador.objects.select_related('cliente')
+    serializer_class = ContadorSerializer
+    filterset_class = ContadorFilter
+    campo_cliente = 'cliente'
+
+class LeituraConsumoViewSet(ApiViewSet):
+    queryset = LeituraConsumo.objects.select_related('contador')
+    serializer_class = LeituraConsumoSerializer
+    filterset_class = LeituraConsumoFilter
+    campo_cliente = 'contador__cliente'
+
+class ConsumoDiarioViewSet(ApiViewSet):
+    queryset = ConsumoDiario.objects.select_related('contador')
+    serializer_class = ConsumoDiarioSerializer
+    filterset_class = ConsumoDiarioFilter
+    campo_cliente = 'contador__cliente'
+
+class ConsumoMensalViewSet(ApiViewSet):
+    queryset = ConsumoMensal.objects.select_related('contador')
+    serializer_class = ConsumoMensalSerializer
+    filterset_class = ConsumoMensalFilter
+    campo_cliente = 'contador__cliente'
+
+class IngestaoIntervalosView(APIView):
+    """
+    Recebe as leituras de intervalo dos contadores inteligentes:
+    ``{"leituras": [{"numero_serie": ..., "instante": ..., "energia_wh": ...}, ...]}``.
+    As leituras inválidas são devolvidas no resumo, sem rejeitar o envio inteiro.
+    """
+    permission_classes = [IsAuthenticated, PermissaoLancamentos]
+
+    def post(self, request):
+        leituras = request.data.get('leituras') if isinstance(request.data, dict) else request.data
+        if not isinstance(leituras, list):
+            raise ValidationError({'leituras': 'Indique a lista de leituras.'})
+        if len(leituras) > MAX_LEITURAS_PEDIDO:
+            raise ValidationError({'leituras': f'No máximo {MAX_LEITURAS_PEDIDO} leituras por pedido.'})
+        resultado = ingerir(leituras)
+        resultado['duracao'] = round(resultado['duracao'], 3)
+        resultado['leituras_por_segundo'] = round(resultado['leituras_por_segundo'], 1)
+        return Response(resultado)
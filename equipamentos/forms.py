@@ -1,4 +1,7 @@
+import csv
+
 from django import forms
+from .importacao import COLUNAS_OBRIGATORIAS
 from .models import Contador
 
 class ContadorForm(forms.ModelForm):
@@ -26,4 +29,29 @@ class ContadorForm(forms.ModelForm):
         if tipo_contador == 'PRE_PAGO' and not numero_cartao:
             self.add_error('numero_cartao', 'O número do cartão é obrigatório para contadores pré-pagos.')
         
-        return cleaned_data
\ No newline at end of file
+        return cleaned_data
+
+class ImportacaoLeiturasForm(forms.Form):
+    DELIMITADOR_CHOICES = [
+        (',', 'Vírgula (,)'),
+        (';', 'Ponto e vírgula (;)'),
+    ]
+
+    ficheiro = forms.FileField(
+        label='Ficheiro CSV',
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,text/csv'}),
+    )
+    delimitador = forms.ChoiceField(choices=DELIMITADOR_CHOICES, widget=forms.Select(attrs={'class': 'form-control'}))
+
+    def clean(self):
+        cleaned_data = super().clean()
+        ficheiro = cleaned_data.get('ficheiro')
+        delimitador = cleaned_data.get('delimitador')
+        if ficheiro and delimitador:
+            # Verifica só o cabeçalho; as linhas são validadas na importação
+            cabecalho = ficheiro.readline().decode('utf-8-sig', errors='replace')
+            ficheiro.seek(0)
+            colunas = {coluna.strip() for coluna in next(csv.reader([cabecalho], delimiter=delimitador), [])}
+            if not COLUNAS_OBRIGATORIAS <= colunas:
+                self.add_error('ficheiro', 'O ficheiro tem de ter as colunas numero_serie e leitura (verifique o separador).')
+        return cleaned_data
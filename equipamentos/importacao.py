@@ -0,0 +1,188 @@
+"""
+Importação em lote de leituras de contadores (ficheiros CSV).
+
+O ficheiro é lido em fluxo, por blocos de linhas. Para cada bloco os
+contadores são carregados numa única consulta (bloqueados com
+``select_for_update``) e as leituras, as atualizações dos contadores e as
+faturas dos contadores pós-pagos são gravadas com ``bulk_create`` /
+``bulk_update`` numa única transação.
+
+Formato do CSV (com cabeçalho)::
+
+    numero_serie,leitura[,observacoes]
+
+As linhas rejeitadas (contador desconhecido, leitura inválida, inferior à
+leitura atual do contador ou com valores que não cabem nas colunas das
+leituras e das faturas) não interrompem a importação e são devolvidas no
+resultado com o motivo.
+"""
+import csv
+import time
+from datetime import timedelta
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from numeracao import series
+from pagamentos import tarifacao
+from pagamentos.models import Fatura
+from relatorios import metricas, resumos
+from .models import Contador, LeituraConsumo
+
+TAMANHO_BLOCO = 1000
+MAX_REJEICOES = 1000  # rejeições devolvidas em detalhe (as restantes são apenas contadas)
+DIAS_VENCIMENTO = 15
+COLUNAS_OBRIGATORIAS = {'numero_serie', 'leitura'}
+CENTESIMO = Decimal('0.01')
+
+
+def _maximo(modelo, campo):
+    """Maior valor que cabe na coluna ``DecimalField`` ``campo`` de ``modelo``."""
+    campo = modelo._meta.get_field(campo)
+    return Decimal(10) ** (campo.max_digits - campo.decimal_places) - Decimal(10) ** -campo.decimal_places
+
+
+# Um valor fora destes limites faria falhar o bulk_create/bulk_update do bloco inteiro
+LEITURA_MAXIMA = _maximo(LeituraConsumo, 'leitura_atual')
+VALOR_MAXIMO = _maximo(Fatura, 'valor_total')
+
+
+class FormatoInvalido(ValueError):
+    pass
+
+
+def _contadores(numeros_serie):
+    return {
+        contador.numero_serie: contador
+        for contador in Contador.objects.select_for_update(of=('self',))
+        .select_related('cliente')
+        .filter(numero_serie__in=numeros_serie)
+    }
+
+
+def _fatura(contador, leitura_anterior, leitura_atual, valores, agora):
+    """Fatura pós-paga de uma leitura, valorizada em ``valores`` por ``pagamentos.tarifacao``."""
+    valor_consumo, outras_taxas, valor_total = valores
+    return Fatura(
+        cliente=contador.cliente,
+        contador=contador,
+        periodo_referencia=agora.strftime('%B/%Y'),
+        leitura_anterior=leitura_anterior,
+        leitura_atual=leitura_atual,
+        consumo_kwh=leitura_atual - leitura_anterior,
+        valor_consumo=valor_consumo,
+        outras_taxas=outras_taxas,
+        valor_total=valor_total,
+        data_emissao=agora.date(),
+        data_vencimento=agora.date() + timedelta(days=DIAS_VENCIMENTO),
+    )
+
+
+def _gravar_bloco(bloco, operador, agora, resultado):
+    """Valida e grava um bloco de ``(numero_linha, linha)``; acumula os totais em ``resultado``."""
+    def rejeitar(numero_linha, numero_serie, motivo):
+        resultado['rejeitadas'] += 1
+        if len(resultado['rejeicoes']) < MAX_REJEICOES:
+            resultado['rejeicoes'].append({'linha': numero_linha, 'numero_serie': numero_serie, 'motivo': motivo})
+
+    with transaction.atomic():
+        contadores = _contadores({(linha.get('numero_serie') or '').strip() for _, linha in bloco})
+        # Linha a linha: uma fatura fora dos limites rejeita a leitura, e a seguinte do mesmo contador parte da anterior
+        valorizar = tarifacao.valorizador()
+        leituras = []
+        faturas = []
+        alterados = {}
+        for numero_linha, linha in bloco:
+            numero_serie = (linha.get('numero_serie') or '').strip()
+            contador = contadores.get(numero_serie)
+            if contador is None:
+                rejeitar(numero_linha, numero_serie, 'Contador desconhecido')
+                continue
+            try:
+                leitura_atual = Decimal((linha.get('leitura') or '').strip().replace(',', '.'))
+                if not leitura_atual.is_finite():
+                    raise InvalidOperation
+                leitura_atual = leitura_atual.quantize(CENTESIMO, ROUND_HALF_UP)
+            except InvalidOperation:
+                rejeitar(numero_linha, numero_serie, f"Leitura inválida: {linha.get('leitura')!r}")
+                continue
+            if not 0 <= leitura_atual <= LEITURA_MAXIMA:
+                rejeitar(numero_linha, numero_serie, f"Leitura fora dos limites (0 a {LEITURA_MAXIMA}): {leitura_atual}")
+                continue
+            leitura_anterior = contador.leitura_atual
+            if leitura_atual < leitura_anterior:
+                rejeitar(numero_linha, numero_serie, f"Leitura {leitura_atual} inferior à atual ({leitura_anterior})")
+                continue
+            if contador.tipo_contador == 'POS_PAGO' and contador.cliente and leitura_atual > leitura_anterior:
+                valores = valorizar(
+                    (contador.cliente.tipo_cliente, contador.cliente.tarifa_id, leitura_atual - leitura_anterior)
+                )
+                if valores[2] > VALOR_MAXIMO:
+                    rejeitar(numero_linha, numero_serie, f"Valor da fatura fora dos limites: {valores[2]} Kz")
+                    continue
+                faturas.append(_fatura(contador, leitura_anterior, leitura_atual, valores, agora))
+
+            leituras.append(LeituraConsumo(
+                contador=contador,
+                leitura_anterior=leitura_anterior,
+                leitura_atual=leitura_atual,
+                consumo=leitura_atual - leitura_anterior,
+                operador=operador,
+                observacoes=(linha.get('observacoes') or '').strip() or None,
+            ))
+            # Várias leituras do mesmo contador no ficheiro encadeiam-se
+            contador.leitura_atual = leitura_atual
+            contador.data_ultima_leitura = agora
+            alterados[contador.pk] = contador
+
+        LeituraConsumo.objects.bulk_create(leituras)
+        Contador.objects.bulk_update(alterados.values(), ['leitura_atual', 'data_ultima_leitura'])
+        series.atribuir(faturas, 'numero_fatura', 'FATURA')
+        Fatura.objects.bulk_create(faturas)
+
+    resultado['importadas'] += len(leituras)
+    resultado['faturas'] += len(faturas)
+
+
+def importar_leituras(ficheiro, operador=None, tamanho_bloco=TAMANHO_BLOCO, delimitador=',', progresso=None):
+    """
+    Importa as leituras de ``ficheiro`` (objeto de texto ou iterável de linhas
+    CSV). ``progresso``, se indicado, é chamado como ``progresso(linhas)``
+    após cada bloco. Devolve um dicionário com o resumo da importação.
+    """
+    inicio = time.monotonic()
+    agora = timezone.localtime()
+    leitor = csv.DictReader(ficheiro, delimiter=delimitador)
+    if not leitor.fieldnames or not COLUNAS_OBRIGATORIAS <= {coluna.strip() for coluna in leitor.fieldnames}:
+        raise FormatoInvalido('O ficheiro tem de ter as colunas numero_serie e leitura.')
+    leitor.fieldnames = [coluna.strip() for coluna in leitor.fieldnames]
+
+    resultado = {'linhas': 0, 'importadas': 0, 'faturas': 0, 'rejeitadas': 0, 'rejeicoes': []}
+    bloco = []
+    # A linha 1 é o cabeçalho
+    for numero_linha, linha in enumerate(leitor, start=2):
+        bloco.append((numero_linha, linha))
+        if len(bloco) >= tamanho_bloco:
+            _gravar_bloco(bloco, operador, agora, resultado)
+            resultado['linhas'] += len(bloco)
+            bloco = []
+            if progresso:
+                progresso(resultado['linhas'])
+    if bloco:
+        _gravar_bloco(bloco, operador, agora, resultado)
+        resultado['linhas'] += len(bloco)
+        if progresso:
+            progresso(resultado['linhas'])
+
+    # bulk_create/bulk_update não emitem post_save
+    if resultado['importadas']:
+        metricas.invalidar('contadores')
+    if resultado['faturas']:
+        metricas.invalidar('faturas')
+        resumos.marcar('faturacao', agora.date())
+
+    duracao = time.monotonic() - inicio
+    resultado['duracao'] = duracao
+    resultado['linhas_por_segundo'] = resultado['linhas'] / duracao if duracao > 0 else 0
+    return resultado
@@ -0,0 +1,265 @@
+"""
+Telecontagem: leituras de intervalo dos contadores inteligentes.
+
+Os contadores enviam a energia consumida em cada intervalo de
+``INTERVALO_MINUTOS`` minutos. As leituras são gravadas em blocos em
+``LeituraIntervalo`` (tabela estreita, chave ``(contador, instante)``); um
+intervalo reenviado substitui o anterior, pelo que repetir um envio não
+duplica consumo.
+
+Na mesma transação de cada bloco são recalculados, a partir das leituras, os
+agregados ``ConsumoDiario`` dos dias tocados e, a partir destes, os
+``ConsumoMensal`` dos meses tocados. Os contadores do bloco ficam bloqueados
+(``select_for_update``) até ao fim da transação, para que dois envios
+simultâneos do mesmo contador não deixem agregados desatualizados. A
+faturação usa os totais mensais (``pagamentos.faturacao``).
+
+Em PostgreSQL a tabela das leituras é particionada por mês: antes de gravar,
+``garantir_particoes`` cria as partições em falta. Os meses antigos podem ser
+arquivados separando a partição (``ALTER TABLE ... DETACH PARTITION``) sem
+tocar nos agregados.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ConsumoDiario, ConsumoMensal, Contador, LeituraIntervalo
+
+INTERVALO_MINUTOS = 15
+TAMANHO_BLOCO = 20000
+MAX_REJEICOES = 1000  # rejeições devolvidas em detalhe (as restantes são apenas contadas)
+MAX_ENERGIA_WH = 2 ** 31 - 1
+
+_trinco = threading.Lock()
+_particoes = set()  # meses com partição já criada neste processo
+
+
+def _inicio_do_mes(dia):
+    return dia.replace(day=1)
+
+
+def _mes_seguinte(mes):
+    return (mes + timedelta(days=32)).replace(day=1)
+
+
+def _inicio_do_dia(dia):
+    return timezone.make_aware(datetime(dia.year, dia.month, dia.day))
+
+
+def garantir_particoes(meses):
+    """Cria (em PostgreSQL) as partições mensais de ``LeituraIntervalo`` que ainda não existam."""
+    if connection.vendor != 'postgresql':
+        return
+    with _trinco:
+        em_falta = sorted(set(meses) - _particoes)
+    if not em_falta:
+        return
+    tabela = LeituraIntervalo._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Serializa a criação entre processos (CREATE TABLE IF NOT EXISTS não é atómico)
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [tabela])
+        for mes in em_falta:
+            inicio = _inicio_do_dia(mes).isoformat()
+            fim = _inicio_do_dia(_mes_seguinte(mes)).isoformat()
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {tabela}_{mes:%Y%m} PARTITION OF {tabela} "
+                f"FOR VALUES FROM ('{inicio}') TO ('{fim}')"
+            )
+    with _trinco:
+        _particoes.update(em_falta)
+
+
+def _agregar_dias(dias):
+    """
+    Recalcula ``ConsumoDiario`` para ``{dia: {contador_id, ...}}`` a partir das
+    leituras (``None`` em vez dos contadores recalcula o dia inteiro).
+    """
+    for dia, contadores in dias.items():
+        leituras = LeituraIntervalo.objects.filter(
+            instante__gte=_inicio_do_dia(dia), instante__lt=_inicio_do_dia(dia + timedelta(days=1)),
+        )
+        if contadores is not None:
+            leituras = leituras.filter(contador_id__in=contadores)
+        totais = (
+            leituras
+            .order_by()
+            .values('contador_id')
+            .annotate(energia=Sum('energia_wh'), intervalos=Count('*'))
+        )
+        ConsumoDiario.objects.bulk_create(
+            [
+                ConsumoDiario(contador_id=total['contador_id'], dia=dia, energia_wh=total['energia'], intervalos=total['intervalos'])
+                for total in totais
+            ],
+            update_conflicts=True,
+            unique_fields=['contador', 'dia'],
+            update_fields=['energia_wh', 'intervalos'],
+        )
+
+
+def _agregar_meses(meses):
+    """Recalcula ``ConsumoMensal`` para ``{mes: {contador_id, ...}}`` a partir dos consumos diários."""
+    for mes, contadores in meses.items():
+        diarios = ConsumoDiario.objects.filter(dia__gte=mes, dia__lt=_mes_seguinte(mes))
+        if contadores is not None:
+            diarios = diarios.filter(contador_id__in=contadores)
+        totais = (
+            diarios
+            .order_by()
+            .values('contador_id')
+            .annotate(energia=Sum('energia_wh'), intervalos=Sum('intervalos'))
+        )
+        ConsumoMensal.objects.bulk_create(
+            [
+                ConsumoMensal(contador_id=total['contador_id'], mes=mes, energia_wh=total['energia'], intervalos=total['intervalos'])
+                for total in totais
+            ],
+            update_conflicts=True,
+            unique_fields=['contador', 'mes'],
+            update_fields=['energia_wh', 'intervalos'],
+        )
+
+
+def _agregar(dias):
+    """Recalcula os consumos diários de ``{dia: {contador_id, ...}}`` e os mensais desses meses."""
+    meses = {}
+    for dia, contadores in dias.items():
+        meses.setdefault(_inicio_do_mes(dia), set()).update(contadores)
+    _agregar_dias(dias)
+    _agregar_meses(meses)
+
+
+def _validar(leitura, limite):
+    """Devolve ``(numero_serie, instante, energia_wh)`` ou levanta ``ValueError`` com o motivo."""
+    numero_serie = str(leitura.get('numero_serie') or '').strip()
+    if not numero_serie:
+        raise ValueError('Número de série em falta')
+    texto = leitura.get('instante')
+    instante = texto if isinstance(texto, datetime) else parse_datetime(str(texto or '').strip())
+    if instante is None:
+        raise ValueError(f'Instante inválido: {texto!r}')
+    if timezone.is_naive(instante):
+        instante = timezone.make_aware(instante)
+    if instante.minute % INTERVALO_MINUTOS or instante.second or instante.microsecond:
+        raise ValueError(f'Instante não alinhado com o intervalo de {INTERVALO_MINUTOS} minutos: {texto}')
+    if instante > limite:
+        raise ValueError(f'Instante no futuro: {texto}')
+    try:
+        energia_wh = int(leitura.get('energia_wh'))
+    except (TypeError, ValueError):
+        raise ValueError(f"Energia inválida: {leitura.get('energia_wh')!r}")
+    if not 0 <= energia_wh <= MAX_ENERGIA_WH:
+        raise ValueError(f'Energia fora dos limites: {energia_wh}')
+    return numero_serie, instante, energia_wh
+
+
+def _gravar_bloco(bloco, resultado):
+    """Valida e grava um bloco de ``(posicao, leitura)``; acumula os totais em ``resultado``."""
+    def rejeitar(posicao, numero_serie, motivo):
+        resultado['rejeitadas'] += 1
+        if len(resultado['rejeicoes']) < MAX_REJEICOES:
+            resultado['rejeicoes'].append({'posicao': posicao, 'numero_serie': numero_serie, 'motivo': motivo})
+
+    limite = timezone.now() + timedelta(minutes=INTERVALO_MINUTOS)
+    validas = []
+    for posicao, leitura in bloco:
+        try:
+            validas.append((posicao, *_validar(leitura, limite)))
+        except ValueError as e:
+            rejeitar(posicao, str(leitura.get('numero_serie') or ''), str(e))
+        except AttributeError:
+            rejeitar(posicao, '', 'A leitura tem de ser um objeto com numero_serie, instante e energia_wh')
+    if not validas:
+        return
+
+    garantir_particoes({_inicio_do_mes(timezone.localdate(instante)) for _, _, instante, _ in validas})
+    with transaction.atomic():
+        contadores = dict(
+            Contador.objects.select_for_update()
+            .filter(numero_serie__in={numero_serie for _, numero_serie, _, _ in validas})
+            .order_by('pk')
+            .values_list('numero_serie', 'pk')
+        )
+        # Um intervalo repetido no bloco fica com o último valor, como nos reenvios
+        leituras = {}
+        dias = {}
+        for posicao, numero_serie, instante, energia_wh in validas:
+            contador_id = contadores.get(numero_serie)
+            if contador_id is None:
+                rejeitar(posicao, numero_serie, 'Contador desconhecido')
+                continue
+            leituras[contador_id, instante] = LeituraIntervalo(contador_id=contador_id, instante=instante, energia_wh=energia_wh)
+            dias.setdefault(timezone.localdate(instante), set()).add(contador_id)
+
+        LeituraIntervalo.objects.bulk_create(
+            leituras.values(),
+            update_conflicts=True,
+            unique_fields=['contador', 'instante'],
+            update_fields=['energia_wh'],
+        )
+        _agregar(dias)
+
+    resultado['gravadas'] += len(leituras)
+    resultado['consumos_diarios'] += sum(len(contadores) for contadores in dias.values())
+
+
+def ingerir(leituras, tamanho_bloco=TAMANHO_BLOCO, progresso=None):
+    """
+    Grava as ``leituras`` (iterável de dicionários com ``numero_serie``,
+    ``instante`` e ``energia_wh``) e atualiza os agregados. ``progresso``, se
+    indicado, é chamado como ``progresso(recebidas)`` após cada bloco.
+    Devolve um dicionário com o resumo.
+    """
+    inicio = time.monotonic()
+    resultado = {'recebidas': 0, 'gravadas': 0, 'rejeitadas': 0, 'consumos_diarios': 0, 'rejeicoes': []}
+    bloco = []
+    for posicao, leitura in enumerate(leituras):
+        bloco.append((posicao, leitura))
+        if len(bloco) >= tamanho_bloco:
+            _gravar_bloco(bloco, resultado)
+            resultado['recebidas'] += len(bloco)
+            bloco = []
+            if progresso:
+                progresso(resultado['recebidas'])
+    if bloco:
+        _gravar_bloco(bloco, resultado)
+        resultado['recebidas'] += len(bloco)
+        if progresso:
+            progresso(resultado['recebidas'])
+
+    duracao = time.monotonic() - inicio
+    resultado['duracao'] = duracao
+    resultado['leituras_por_segundo'] = resultado['recebidas'] / duracao if duracao > 0 else 0
+    return resultado
+
+
+def reagregar(desde, ate, progresso=None):
+    """
+    Reconstrói de raiz os consumos diários de ``desde`` a ``ate`` (inclusive)
+    e os mensais desses meses, a partir das leituras. ``progresso``, se
+    indicado, é chamado como ``progresso(dias)`` após cada dia. Devolve o
+    número de dias reconstruídos.
+    """
+    dias = 0
+    dia = desde
+    while dia <= ate:
+        with transaction.atomic():
+            ConsumoDiario.objects.filter(dia=dia).delete()
+            _agregar_dias({dia: None})
+        dias += 1
+        if progresso:
+            progresso(dias)
+        dia += timedelta(days=1)
+
+    mes = _inicio_do_mes(desde)
+    while mes <= ate:
+        with transaction.atomic():
+            ConsumoMensal.objects.filter(mes=mes).delete()
+            _agregar_meses({mes: None})
+        mes = _mes_seguinte(mes)
+    return dias
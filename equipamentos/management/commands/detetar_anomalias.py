@@ -0,0 +1,36 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from equipamentos.anomalias import TAMANHO_BLOCO, detetar_anomalias
+
+
+class Command(BaseCommand):
+    help = 'Analisa o histórico de leituras e assinala contadores com consumo negativo, parados ou com consumo atípico'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Analisa as leituras a partir deste dia (AAAA-MM-DD; por omissão, o último ano)')
+        parser.add_argument('--batch-size', type=int, default=TAMANHO_BLOCO, help='Contadores analisados por bloco')
+
+    def handle(self, *args, **options):
+        desde = None
+        if options['desde']:
+            try:
+                desde = timezone.make_aware(timezone.datetime.combine(date.fromisoformat(options['desde']), timezone.datetime.min.time()))
+            except ValueError:
+                raise CommandError('Data inválida em --desde (use AAAA-MM-DD).')
+
+        def progresso(contadores):
+            if options['verbosity'] >= 2:
+                self.stdout.write(f'  {contadores} contadores analisados')
+
+        resultado = detetar_anomalias(desde=desde, tamanho_bloco=options['batch_size'], progresso=progresso)
+        self.stdout.write(self.style.SUCCESS(
+            f"Análise concluída. {resultado['contadores']} contadores, {resultado['leituras']} leituras, "
+            f"{resultado['anomalias']} anomalias assinaladas."
+        ))
+        for tipo, quantidade in resultado['por_tipo'].items():
+            if quantidade:
+                self.stdout.write(f'  {tipo}: {quantidade}')
+        self.stdout.write(f"Tempo: {resultado['duracao']:.2f}s ({resultado['contadores_por_segundo']:.0f} contadores/s)")
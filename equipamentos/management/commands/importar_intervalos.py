@@ -0,0 +1,44 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from equipamentos.intervalos import TAMANHO_BLOCO, ingerir
+
+COLUNAS = {'numero_serie', 'instante', 'energia_wh'}
+
+class Command(BaseCommand):
+    help = 'Importa leituras de intervalo de contadores inteligentes a partir de um CSV (numero_serie,instante,energia_wh)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('ficheiro', help='Caminho do ficheiro CSV')
+        parser.add_argument('--batch-size', type=int, default=TAMANHO_BLOCO, help='Leituras gravadas por bloco/transação')
+        parser.add_argument('--delimitador', default=',', help='Separador de colunas do CSV')
+
+    def handle(self, *args, **options):
+        def progresso(leituras):
+            if options['verbosity'] >= 2:
+                self.stdout.write(f'  {leituras} leituras processadas')
+
+        try:
+            with open(options['ficheiro'], newline='', encoding='utf-8-sig') as ficheiro:
+                leitor = csv.DictReader(ficheiro, delimiter=options['delimitador'])
+                if not leitor.fieldnames or not COLUNAS <= {coluna.strip() for coluna in leitor.fieldnames}:
+                    raise CommandError('O ficheiro tem de ter as colunas numero_serie, instante e energia_wh.')
+                leitor.fieldnames = [coluna.strip() for coluna in leitor.fieldnames]
+                resultado = ingerir(leitor, tamanho_bloco=options['batch_size'], progresso=progresso)
+        except OSError as e:
+            raise CommandError(f'Não foi possível ler o ficheiro: {e}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Importação concluída. {resultado['gravadas']} leituras gravadas, "
+            f"{resultado['consumos_diarios']} consumos diários atualizados, {resultado['rejeitadas']} rejeitadas."
+        ))
+        if options['verbosity'] >= 1:
+            for rejeicao in resultado['rejeicoes'][:20]:
+                # A posição conta a partir da primeira linha de dados (linha 2 do ficheiro)
+                self.stdout.write(self.style.WARNING(
+                    f"  Linha {rejeicao['posicao'] + 2} ({rejeicao['numero_serie'] or '-'}): {rejeicao['motivo']}"
+                ))
+            if resultado['rejeitadas'] > 20:
+                self.stdout.write(f"  ... e mais {resultado['rejeitadas'] - 20}")
+        self.stdout.write(f"Tempo: {resultado['duracao']:.2f}s ({resultado['leituras_por_segundo']:.0f} leituras/s)")
@@ -0,0 +1,51 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from equipamentos.importacao import TAMANHO_BLOCO, FormatoInvalido, importar_leituras
+
+class Command(BaseCommand):
+    help = 'Importa leituras de contadores a partir de um ficheiro CSV (numero_serie,leitura[,observacoes])'
+
+    def add_arguments(self, parser):
+        parser.add_argument('ficheiro', help='Caminho do ficheiro CSV')
+        parser.add_argument('--batch-size', type=int, default=TAMANHO_BLOCO, help='Linhas gravadas por bloco/transação')
+        parser.add_argument('--delimitador', default=',', help='Separador de colunas do CSV')
+        parser.add_argument('--rejeitados', help='Grava as linhas rejeitadas (com o motivo) neste ficheiro CSV')
+
+    def handle(self, *args, **options):
+        def progresso(linhas):
+            if options['verbosity'] >= 2:
+                self.stdout.write(f'  {linhas} linhas processadas')
+
+        try:
+            with open(options['ficheiro'], newline='', encoding='utf-8-sig') as ficheiro:
+                resultado = importar_leituras(
+                    ficheiro,
+                    tamanho_bloco=options['batch_size'],
+                    delimitador=options['delimitador'],
+                    progresso=progresso,
+                )
+        except OSError as e:
+            raise CommandError(f'Não foi possível ler o ficheiro: {e}')
+        except FormatoInvalido as e:
+            raise CommandError(str(e))
+
+        if options['rejeitados'] and resultado['rejeicoes']:
+            with open(options['rejeitados'], 'w', newline='', encoding='utf-8') as saida:
+                escritor = csv.DictWriter(saida, fieldnames=['linha', 'numero_serie', 'motivo'])
+                escritor.writeheader()
+                escritor.writerows(resultado['rejeicoes'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Importação concluída. {resultado['importadas']} leituras importadas, "
+            f"{resultado['faturas']} faturas geradas, {resultado['rejeitadas']} linhas rejeitadas."
+        ))
+        if options['verbosity'] >= 1:
+            for rejeicao in resultado['rejeicoes'][:20]:
+                self.stdout.write(self.style.WARNING(
+                    f"  Linha {rejeicao['linha']} ({rejeicao['numero_serie'] or '-'}): {rejeicao['motivo']}"
+                ))
+            if resultado['rejeitadas'] > 20:
+                self.stdout.write(f"  ... e mais {resultado['rejeitadas'] - 20} (use --rejeitados para as gravar em ficheiro)")
+        self.stdout.write(f"Tempo: {resultado['duracao']:.2f}s ({resultado['linhas_por_segundo']:.0f} linhas/s)")
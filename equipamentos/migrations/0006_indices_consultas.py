@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0004_indices_consultas'),
+        ('equipamentos', '0005_contador_data_suspensao_alter_contador_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contador',
+            index=models.Index(fields=['status'], name='contador_status_idx'),
+        ),
+    ]
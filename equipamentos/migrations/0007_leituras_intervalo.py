@@ -0,0 +1,94 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Em PostgreSQL a tabela é particionada por mês (as partições mensais são criadas
+# por equipamentos.intervalos.garantir_particoes); a partição por omissão só
+# recebe linhas fora dos meses já criados. A chave primária tem de incluir a
+# chave de partição, o que (contador_id, instante) já faz.
+TABELA_PARTICIONADA = [
+    """
+    CREATE TABLE equipamentos_leituraintervalo (
+        contador_id bigint NOT NULL
+            REFERENCES equipamentos_contador (id) DEFERRABLE INITIALLY DEFERRED,
+        instante timestamp with time zone NOT NULL,
+        energia_wh integer NOT NULL CHECK (energia_wh >= 0),
+        PRIMARY KEY (contador_id, instante)
+    ) PARTITION BY RANGE (instante)
+    """,
+    "CREATE TABLE equipamentos_leituraintervalo_padrao PARTITION OF equipamentos_leituraintervalo DEFAULT",
+]
+
+
+def criar_tabela_intervalos(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for sql in TABELA_PARTICIONADA:
+            schema_editor.execute(sql)
+    else:
+        schema_editor.create_model(apps.get_model('equipamentos', 'LeituraIntervalo'))
+
+
+def apagar_tabela_intervalos(apps, schema_editor):
+    schema_editor.delete_model(apps.get_model('equipamentos', 'LeituraIntervalo'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipamentos', '0006_indices_consultas'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='LeituraIntervalo',
+                    fields=[
+                        ('pk', models.CompositePrimaryKey('contador', 'instante', blank=True, editable=False, primary_key=True, serialize=False)),
+                        ('instante', models.DateTimeField(help_text='Início do intervalo')),
+                        ('energia_wh', models.PositiveIntegerField(help_text='Energia consumida no intervalo, em Wh')),
+                        ('contador', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='leituras_intervalo', to='equipamentos.contador')),
+                    ],
+                    options={
+                        'verbose_name': 'Leitura de Intervalo',
+                        'verbose_name_plural': 'Leituras de Intervalo',
+                    },
+                ),
+            ],
+        ),
+        migrations.RunPython(criar_tabela_intervalos, apagar_tabela_intervalos),
+        migrations.CreateModel(
+            name='ConsumoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('energia_wh', models.BigIntegerField()),
+                ('intervalos', models.PositiveSmallIntegerField(help_text='Intervalos recebidos (96 num dia completo)')),
+                ('contador', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='consumos_diarios', to='equipamentos.contador')),
+            ],
+            options={
+                'verbose_name': 'Consumo Diário',
+                'verbose_name_plural': 'Consumos Diários',
+                'ordering': ['-dia'],
+                'constraints': [models.UniqueConstraint(fields=('contador', 'dia'), name='consumo_diario_unico')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ConsumoMensal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(help_text='Primeiro dia do mês')),
+                ('energia_wh', models.BigIntegerField()),
+                ('intervalos', models.PositiveIntegerField()),
+                ('contador', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='consumos_mensais', to='equipamentos.contador')),
+            ],
+            options={
+                'verbose_name': 'Consumo Mensal',
+                'verbose_name_plural': 'Consumos Mensais',
+                'ordering': ['-mes'],
+                'indexes': [models.Index(fields=['mes'], name='consumo_mensal_mes_idx')],
+                'constraints': [models.UniqueConstraint(fields=('contador', 'mes'), name='consumo_mensal_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipamentos', '0007_leituras_intervalo'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnomaliaConsumo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('CONSUMO_NEGATIVO', 'Consumo negativo'), ('CONTADOR_PARADO', 'Contador parado'), ('PICO_CONSUMO', 'Pico de consumo'), ('QUEDA_CONSUMO', 'Queda de consumo')], max_length=20)),
+                ('consumo', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('consumo_medio', models.DecimalField(blank=True, decimal_places=2, help_text='Média das leituras anteriores', max_digits=10, null=True)),
+                ('pontuacao_z', models.FloatField(blank=True, null=True)),
+                ('leituras_seguidas', models.PositiveIntegerField(default=1, help_text='Leituras seguidas com consumo zero (contador parado)')),
+                ('resolvida', models.BooleanField(default=False)),
+                ('data_detecao', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Anomalia de Consumo',
+                'verbose_name_plural': 'Anomalias de Consumo',
+                'ordering': ['-data_detecao'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='leituraconsumo',
+            index=models.Index(fields=['contador', 'data_leitura'], name='leitura_contador_data_idx'),
+        ),
+        migrations.AddField(
+            model_name='anomaliaconsumo',
+            name='contador',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='anomalias', to='equipamentos.contador'),
+        ),
+        migrations.AddField(
+            model_name='anomaliaconsumo',
+            name='leitura',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='anomalias', to='equipamentos.leituraconsumo'),
+        ),
+        migrations.AddIndex(
+            model_name='anomaliaconsumo',
+            index=models.Index(fields=['resolvida', 'tipo'], name='anomalia_resolvida_tipo_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='anomaliaconsumo',
+            constraint=models.UniqueConstraint(fields=('leitura', 'tipo'), name='anomalia_leitura_tipo_unica'),
+        ),
+    ]
@@ -1,4 +1,7 @@
+from decimal import Decimal
+
 from django.db import models
+from clientes import pesquisa
 from clientes.models import Cliente
 
 class Contador(models.Model):
@@ -40,14 +43,28 @@ class Contador(models.Model):
         verbose_name = 'Contador'
         verbose_name_plural = 'Contadores'
         ordering = ['-data_instalacao']
+        indexes = [
+            models.Index(fields=['status'], name='contador_status_idx'),
+        ]
     
     def __str__(self):
         return f"{self.numero_serie} - {self.cliente.nome if self.cliente else 'Sem Cliente'}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        contador = super().from_db(db, field_names, values)
+        # Para saber, ao gravar, se o texto de pesquisa dos clientes tem de ser atualizado
+        contador._pesquisa = (contador.__dict__.get('cliente_id'), contador.__dict__.get('numero_serie'))
+        return contador
+
     def save(self, *args, **kwargs):
         if self.cliente:
             self.tipo_contador = self.cliente.tipo_cliente
         super().save(*args, **kwargs)
+        anterior = getattr(self, '_pesquisa', (None, None))
+        if anterior != (self.cliente_id, self.numero_serie):
+            pesquisa.atualizar({anterior[0], self.cliente_id})
+            self._pesquisa = (self.cliente_id, self.numero_serie)
 
 
 class LeituraConsumo(models.Model):
@@ -61,11 +78,86 @@ class LeituraConsumo(models.Model):
 
     class Meta:
         ordering = ['-data_leitura']
+        indexes = [
+            # Histórico por contador, lido em bloco pela deteção de anomalias
+            models.Index(fields=['contador', 'data_leitura'], name='leitura_contador_data_idx'),
+        ]
 
     def __str__(self):
         return f"{self.contador.numero_serie} - {self.data_leitura.strftime('%d/%m/%Y')}"
 
 
+class LeituraIntervalo(models.Model):
+    """
+    Energia consumida num intervalo de um contador inteligente (telecontagem).
+
+    Tabela estreita para dezenas de milhões de linhas por mês: sem id (a chave
+    é ``(contador, instante)``), energia inteira em Wh e sem operador nem
+    observações. Em PostgreSQL a tabela é particionada por mês
+    (``equipamentos.intervalos``). As consultas de consumo devem usar os
+    agregados ``ConsumoDiario`` e ``ConsumoMensal``.
+    """
+    pk = models.CompositePrimaryKey('contador', 'instante')
+    # O índice da chave primária começa pelo contador
+    contador = models.ForeignKey(Contador, on_delete=models.CASCADE, related_name='leituras_intervalo', db_index=False)
+    instante = models.DateTimeField(help_text='Início do intervalo')
+    energia_wh = models.PositiveIntegerField(help_text='Energia consumida no intervalo, em Wh')
+
+    class Meta:
+        verbose_name = 'Leitura de Intervalo'
+        verbose_name_plural = 'Leituras de Intervalo'
+
+    def __str__(self):
+        return f"{self.contador_id} - {self.instante:%d/%m/%Y %H:%M} - {self.energia_wh} Wh"
+
+
+class ConsumoDiario(models.Model):
+    contador = models.ForeignKey(Contador, on_delete=models.CASCADE, related_name='consumos_diarios')
+    dia = models.DateField()
+    energia_wh = models.BigIntegerField()
+    intervalos = models.PositiveSmallIntegerField(help_text='Intervalos recebidos (96 num dia completo)')
+
+    class Meta:
+        verbose_name = 'Consumo Diário'
+        verbose_name_plural = 'Consumos Diários'
+        ordering = ['-dia']
+        constraints = [
+            models.UniqueConstraint(fields=['contador', 'dia'], name='consumo_diario_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.contador_id} - {self.dia:%d/%m/%Y} - {self.energia_kwh} kWh"
+
+    @property
+    def energia_kwh(self):
+        return Decimal(self.energia_wh) / 1000
+
+
+class ConsumoMensal(models.Model):
+    contador = models.ForeignKey(Contador, on_delete=models.CASCADE, related_name='consumos_mensais')
+    mes = models.DateField(help_text='Primeiro dia do mês')
+    energia_wh = models.BigIntegerField()
+    intervalos = models.PositiveIntegerField()
+
+    class Meta:
+        verbose_name = 'Consumo Mensal'
+        verbose_name_plural = 'Consumos Mensais'
+        ordering = ['-mes']
+        indexes = [
+            models.Index(fields=['mes'], name='consumo_mensal_mes_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['contador', 'mes'], name='consumo_mensal_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.contador_id} - {self.mes:%m/%Y} - {self.energia_kwh} kWh"
+
+    @property
+    def energia_kwh(self):
+        return Decimal(self.energia_wh) / 1000
+
+
 class HistoricoManutencao(models.Model):
     TIPO_MANUTENCAO_CHOICES = [
         ('PREVENTIVA', 'Preventiva'),
@@ -114,3 +206,43 @@ class CartaoRecarga(models.Model):
     
     def __str__(self):
         return f"{self.codigo_cartao} - {self.valor} Kz"
+
+
+class AnomaliaConsumo(models.Model):
+    """
+    Leitura assinalada pela deteção de anomalias (``equipamentos.anomalias``).
+
+    Cada leitura tem no máximo uma anomalia de cada tipo, pelo que repetir a
+    análise atualiza as existentes em vez de as duplicar. Nas sequências de
+    consumo zero a anomalia fica na primeira leitura da sequência.
+    """
+    TIPO_CHOICES = [
+        ('CONSUMO_NEGATIVO', 'Consumo negativo'),
+        ('CONTADOR_PARADO', 'Contador parado'),
+        ('PICO_CONSUMO', 'Pico de consumo'),
+        ('QUEDA_CONSUMO', 'Queda de consumo'),
+    ]
+
+    contador = models.ForeignKey(Contador, on_delete=models.CASCADE, related_name='anomalias')
+    leitura = models.ForeignKey(LeituraConsumo, on_delete=models.CASCADE, related_name='anomalias')
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    consumo = models.DecimalField(max_digits=10, decimal_places=2)
+    consumo_medio = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, help_text='Média das leituras anteriores')
+    pontuacao_z = models.FloatField(null=True, blank=True)
+    leituras_seguidas = models.PositiveIntegerField(default=1, help_text='Leituras seguidas com consumo zero (contador parado)')
+    resolvida = models.BooleanField(default=False)
+    data_detecao = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Anomalia de Consumo'
+        verbose_name_plural = 'Anomalias de Consumo'
+        ordering = ['-data_detecao']
+        indexes = [
+            models.Index(fields=['resolvida', 'tipo'], name='anomalia_resolvida_tipo_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['leitura', 'tipo'], name='anomalia_leitura_tipo_unica'),
+        ]
+
+    def __str__(self):
+        return f"{self.contador.numero_serie} - {self.get_tipo_display()}"
@@ -0,0 +1,34 @@
+from energia_gestao.api import CamposSerializer
+from rest_framework import serializers
+from .models import ConsumoDiario, ConsumoMensal, Contador, LeituraConsumo
+
+class ContadorSerializer(CamposSerializer):
+    cliente_nome = serializers.CharField(source='cliente.nome', read_only=True, default=None)
+
+    class Meta:
+        model = Contador
+        fields = ['id', 'numero_serie', 'tipo_contador', 'tipo_conexao', 'numero_cartao', 'cliente', 'cliente_nome',
+                  'endereco_instalacao', 'status', 'data_instalacao', 'data_ultima_leitura', 'leitura_atual',
+                  'potencia_maxima', 'data_suspensao']
+
+class LeituraConsumoSerializer(CamposSerializer):
+    contador_numero_serie = serializers.CharField(source='contador.numero_serie', read_only=True)
+
+    class Meta:
+        model = LeituraConsumo
+        fields = ['id', 'contador', 'contador_numero_serie', 'leitura_anterior', 'leitura_atual', 'consumo',
+                  'data_leitura', 'operador', 'observacoes']
+
+class ConsumoDiarioSerializer(CamposSerializer):
+    contador_numero_serie = serializers.CharField(source='contador.numero_serie', read_only=True)
+
+    class Meta:
+        model = ConsumoDiario
+        fields = ['id', 'contador', 'contador_numero_serie', 'dia', 'energia_wh', 'intervalos']
+
+class ConsumoMensalSerializer(CamposSerializer):
+    contador_numero_serie = serializers.CharField(source='contador.numero_serie', read_only=True)
+
+    class Meta:
+        model = ConsumoMensal
+        fields = ['id', 'contador', 'contador_numero_serie', 'mes', 'energia_wh', 'intervalos']
@@ -0,0 +1,28 @@
+"""Processos de equipamentos executados pelo worker (``manage.py processar_fila``)."""
+import io
+
+from django.core.files.storage import default_storage
+
+from processamento.fila import tarefa
+from .importacao import importar_leituras as importar
+
+REJEICOES_NO_RESULTADO = 100
+
+
+@tarefa('IMPORTAR_LEITURAS')
+def importar_leituras(processo, ficheiro, delimitador=','):
+    with default_storage.open(ficheiro, 'rb') as binario:
+        texto = io.TextIOWrapper(binario, encoding='utf-8-sig', newline='')
+        resultado = importar(
+            texto,
+            operador=processo.criado_por,
+            delimitador=delimitador,
+            progresso=processo.atualizar_progresso,
+        )
+    # Só depois do sucesso: com erro o ficheiro fica para o processo ser relançado
+    # (processamento.fila.relancar; os esquecidos são apagados por limpar_ficheiros)
+    default_storage.delete(ficheiro)
+    resultado['rejeicoes'] = resultado['rejeicoes'][:REJEICOES_NO_RESULTADO]
+    resultado['duracao'] = round(resultado['duracao'], 2)
+    resultado['linhas_por_segundo'] = round(resultado['linhas_por_segundo'], 1)
+    return resultado
@@ -7,6 +7,7 @@ urlpatterns = [
     path('editar/<int:pk>/', views.contador_update, name='contador_update'),
     path('historico/<int:pk>/', views.contador_historico, name='contador_historico'),
     path('leitura/<int:pk>/', views.contador_registrar_leitura, name='contador_registrar_leitura'),
+    path('leituras/importar/', views.importar_leituras, name='importar_leituras'),
     path('avariado/<int:pk>/', views.contador_marcar_avariado, name='contador_marcar_avariado'),
     path('toggle-status/<int:pk>/', views.contador_toggle_status, name='contador_toggle_status'),
 ]
\ No newline at end of file
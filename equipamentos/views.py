@@ -1,20 +1,49 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth.decorators import login_required
-from django.db import models
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.contrib import messages
+from django.core.files.storage import default_storage
+from django.http import JsonResponse
 from .models import Contador
-from .forms import ContadorForm
+from .forms import ContadorForm, ImportacaoLeiturasForm
+from clientes import pesquisa
+from energia_gestao.paginacao import PaginaCursor, paginar_por_cursor
+from processamento.fila import enfileirar
+
+def is_operador_ou_admin(user):
+    return user.is_staff or (hasattr(user, 'perfil') and user.perfil.tipo_usuario in ['ADMIN', 'OPERADOR'])
 
 @login_required
 def contador_list(request):
     search_query = request.GET.get('search', '')
+    contadores = Contador.objects.select_related('cliente')
     if hasattr(request.user, 'perfil') and request.user.perfil.tipo_usuario == 'CLIENTE':
-        contadores = Contador.objects.filter(cliente__email=request.user.email)
-    else:
-        if search_query:
-            contadores = Contador.objects.filter(models.Q(numero_serie__icontains=search_query))
-        else:
-            contadores = Contador.objects.all()
-    return render(request, 'equipamentos/contador_list.html', {'contadores': contadores, 'search_query': search_query})
+        contadores = contadores.filter(cliente__email=request.user.email)
+    elif search_query:
+        # O número de série exato, os contadores dos clientes encontrados pelo índice de pesquisa
+        # (clientes.pesquisa, que também inclui o número de série) pela sua relevância e, no fim, os
+        # contadores sem cliente (fora do índice) com o número de série que contém o termo
+        termo = search_query.strip()
+        ids = pesquisa.pesquisar(termo)
+        por_cliente = {contador.cliente_id: contador for contador in contadores.filter(cliente_id__in=ids)}
+        encontrados = list(contadores.filter(numero_serie=termo))
+        for cliente_id in ids:
+            contador = por_cliente.get(cliente_id)
+            if contador and contador not in encontrados:
+                encontrados.append(contador)
+        for contador in contadores.filter(cliente__isnull=True, numero_serie__icontains=termo).order_by('numero_serie')[:pesquisa.LIMITE_RESULTADOS]:
+            if contador not in encontrados:
+                encontrados.append(contador)
+        limite = pesquisa.LIMITE_RESULTADOS if len(encontrados) >= pesquisa.LIMITE_RESULTADOS else None
+        return render(request, 'equipamentos/contador_list.html', {
+            'contadores': PaginaCursor(encontrados[:pesquisa.LIMITE_RESULTADOS]),
+            'search_query': search_query,
+            'limite_pesquisa': limite,
+        })
+    pagina = paginar_por_cursor(
+        contadores, ['-data_instalacao', '-id'],
+        apos=request.GET.get('apos'), antes=request.GET.get('antes'),
+    )
+    return render(request, 'equipamentos/contador_list.html', {'contadores': pagina, 'search_query': search_query})
 
 @login_required
 def contador_create(request):
@@ -92,7 +121,11 @@ def contador_registrar_leitura(request, pk):
             from decimal import Decimal
             leitura_anterior = contador.leitura_atual
             leitura_atual_dec = Decimal(nova_leitura)
-            
+            if leitura_atual_dec < leitura_anterior:
+                # Um consumo negativo indica erro de leitura ou adulteração (ver equipamentos.anomalias)
+                messages.error(request, f'A leitura ({leitura_atual_dec}) não pode ser inferior à leitura atual ({leitura_anterior}).')
+                return render(request, 'equipamentos/contador_leitura.html', {'contador': contador})
+
             # Atualiza o contador
             contador.leitura_atual = leitura_atual_dec
             contador.data_ultima_leitura = timezone.now()
@@ -110,17 +143,15 @@ def contador_registrar_leitura(request, pk):
             
             # Se for POS_PAGO, gera fatura
             if contador.tipo_contador == 'POS_PAGO':
+                from pagamentos import tarifacao
                 from pagamentos.models import Fatura
                 import datetime
                 
                 consumo = leitura_atual_dec - leitura_anterior
                 if consumo > 0:
-                    tarifa = contador.cliente.tarifa
-                    preco_kwh = tarifa.preco_kwh if tarifa else Decimal('50.00')
-                    taxa_fixa = tarifa.taxa_fixa if tarifa else Decimal('0.00')
-                    
-                    valor_consumo = consumo * preco_kwh
-                    valor_total = valor_consumo + taxa_fixa
+                    valor_consumo, outras_taxas, valor_total = tarifacao.calcular(
+                        contador.cliente.tipo_cliente, contador.cliente.tarifa_id, consumo
+                    )
                     
                     Fatura.objects.create(
                         cliente=contador.cliente,
@@ -130,7 +161,7 @@ def contador_registrar_leitura(request, pk):
                         leitura_atual=leitura_atual_dec,
                         consumo_kwh=consumo,
                         valor_consumo=valor_consumo,
-                        outras_taxas=taxa_fixa,
+                        outras_taxas=outras_taxas,
                         valor_total=valor_total,
                         data_emissao=datetime.date.today(),
                         data_vencimento=datetime.date.today() + datetime.timedelta(days=15)
@@ -139,3 +170,29 @@ def contador_registrar_leitura(request, pk):
             return redirect('contador_historico', pk=pk)
             
     return render(request, 'equipamentos/contador_leitura.html', {'contador': contador})
+
+@login_required
+@user_passes_test(is_operador_ou_admin)
+def importar_leituras(request):
+    """
+    Recebe um ficheiro CSV de leituras e enfileira a importação em lote
+    (equipamentos.importacao). Clientes que não aceitam HTML (integrações)
+    recebem o processo em JSON, para consultarem o estado em processo_estado.
+    """
+    form = ImportacaoLeiturasForm(request.POST, request.FILES) if request.method == 'POST' else ImportacaoLeiturasForm()
+    if request.method == 'POST' and form.is_valid():
+        ficheiro = default_storage.save(
+            f"importacoes/leituras_{timezone.now():%Y%m%d%H%M%S}.csv", form.cleaned_data['ficheiro']
+        )
+        processo = enfileirar(
+            'IMPORTAR_LEITURAS', criado_por=request.user,
+            ficheiro=ficheiro, delimitador=form.cleaned_data['delimitador'],
+        )
+        if not request.accepts('text/html'):
+            return JsonResponse(processo.como_dict(), status=202)
+        messages.info(request, "Importação de leituras colocada em fila de processamento.")
+        return redirect('processo_detail', pk=processo.pk)
+    
+    if request.method == 'POST' and not request.accepts('text/html'):
+        return JsonResponse({'erros': form.errors}, status=400)
+    return render(request, 'equipamentos/importar_leituras.html', {'form': form})
@@ -0,0 +1,8 @@
+from django.contrib import admin
+from .models import SerieNumeracao
+
+@admin.register(SerieNumeracao)
+class SerieNumeracaoAdmin(admin.ModelAdmin):
+    list_display = ['serie', 'ano', 'ultimo', 'data_atualizacao']
+    list_filter = ['serie', 'ano']
+    readonly_fields = ['data_atualizacao']
@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+class NumeracaoConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'numeracao'
+
+    def ready(self):
+        from .series import limpar_reservas
+        # flush também emite post_migrate: os blocos reservados deixam de ser válidos
+        post_migrate.connect(limpar_reservas, dispatch_uid='numeracao_limpar_reservas')
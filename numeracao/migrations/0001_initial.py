@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SerieNumeracao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('serie', models.CharField(max_length=20)),
+                ('ano', models.PositiveSmallIntegerField(default=0, help_text='0 nas séries que não reiniciam todos os anos')),
+                ('ultimo', models.PositiveBigIntegerField(default=0, help_text='Último número reservado')),
+                ('data_atualizacao', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Série de Numeração',
+                'verbose_name_plural': 'Séries de Numeração',
+                'ordering': ['serie', '-ano'],
+                'constraints': [models.UniqueConstraint(fields=('serie', 'ano'), name='serie_numeracao_unica')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+from django.db import models
+
+
+class SerieNumeracao(models.Model):
+    serie = models.CharField(max_length=20)
+    ano = models.PositiveSmallIntegerField(default=0, help_text='0 nas séries que não reiniciam todos os anos')
+    ultimo = models.PositiveBigIntegerField(default=0, help_text='Último número reservado')
+    data_atualizacao = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Série de Numeração'
+        verbose_name_plural = 'Séries de Numeração'
+        ordering = ['serie', '-ano']
+        constraints = [
+            models.UniqueConstraint(fields=['serie', 'ano'], name='serie_numeracao_unica'),
+        ]
+
+    def __str__(self):
+        return f"{self.serie}/{self.ano}: {self.ultimo}" if self.ano else f"{self.serie}: {self.ultimo}"
@@ -0,0 +1,130 @@
+"""
+Numeração dos documentos (clientes, faturas, recibos, pagamentos e recargas).
+
+Cada série tem um contador em ``SerieNumeracao`` (por ano, nas séries
+anuais). Para não transformar essa linha num ponto de contenção, cada
+processo reserva blocos de ``TAMANHO_BLOCO`` números de uma vez e vai
+entregando-os da memória; os números de um bloco que não chegue a ser usado
+perdem-se (a numeração pode ter falhas, mas nunca repete).
+
+Em PostgreSQL a reserva é feita e confirmada numa ligação própria
+(``DATABASES['numeracao']``, a mesma base): o bloqueio da linha do contador
+dura só essa pequena transação, mesmo quando os números são pedidos a meio de
+uma transação longa (faturação em lote, reconciliação, pagamentos). Se a
+transação de quem pediu os números for revertida, esses números perdem-se
+(ficam falhas), mas as sobras do bloco continuam reservadas e disponíveis.
+
+Sem essa ligação (SQLite, em que a transação exterior já bloqueia a escrita
+em toda a base) a reserva entra na transação de quem a pede e as sobras só
+ficam disponíveis depois do commit: se a transação for revertida o contador
+também volta atrás e esses números não podem ser reutilizados.
+
+``atribuir`` numera de uma vez uma lista de objetos antes de um
+``bulk_create`` (que não chama ``save``).
+"""
+import threading
+
+from django.apps import apps
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models.functions import Length
+from django.utils import timezone
+
+from .models import SerieNumeracao
+
+TAMANHO_BLOCO = 50
+
+
+def _ultimo_cliente():
+    """Continua a numeração sequencial dos clientes já existentes (CLI-000123)."""
+    Cliente = apps.get_model('clientes', 'Cliente')
+    ultimo = (
+        Cliente.objects.annotate(tamanho=Length('numero_cliente'))
+        .order_by('-tamanho', '-numero_cliente')
+        .values_list('numero_cliente', flat=True)
+        .first()
+    )
+    return int(ultimo.split('-')[1]) if ultimo else 0
+
+
+SERIES = {
+    'CLIENTE': {'formato': 'CLI-{numero:06d}', 'anual': False, 'inicial': _ultimo_cliente},
+    'FATURA': {'formato': 'FAT-{ano}-{numero:07d}', 'anual': True},
+    'RECIBO': {'formato': 'RCB-{ano}-{numero:07d}', 'anual': True},
+    'PAGAMENTO': {'formato': 'PAG-{ano}-{numero:07d}', 'anual': True},
+    'RECARGA': {'formato': 'REC-{ano}-{numero:07d}', 'anual': True},
+}
+
+_trinco = threading.Lock()
+_reservas = {}  # (serie, ano) -> [proximo, limite): números já gravados e ainda não entregues
+
+
+def limpar_reservas(**kwargs):
+    with _trinco:
+        _reservas.clear()
+
+
+def _ligacao():
+    """Alias da ligação usada para reservar os blocos (ver a docstring do módulo)."""
+    return 'numeracao' if 'numeracao' in connections.databases else DEFAULT_DB_ALIAS
+
+
+def _reservar(serie, ano, quantidade, ligacao):
+    """Reserva ``quantidade`` números no contador e devolve o primeiro."""
+    inicial = SERIES[serie].get('inicial')
+    with transaction.atomic(using=ligacao):
+        contador, _ = SerieNumeracao.objects.using(ligacao).select_for_update().get_or_create(
+            serie=serie, ano=ano, defaults={'ultimo': inicial or 0},
+        )
+        primeiro = contador.ultimo + 1
+        contador.ultimo += quantidade
+        contador.save(using=ligacao, update_fields=['ultimo', 'data_atualizacao'])
+    return primeiro
+
+
+def _guardar(chave, inicio, limite):
+    with _trinco:
+        _reservas[chave] = [inicio, limite]
+
+
+def numeros(serie, quantidade=1, ano=None):
+    """Devolve uma lista de ``quantidade`` números formatados da série."""
+    definicao = SERIES[serie]
+    ano = (ano or timezone.localdate().year) if definicao['anual'] else 0
+    chave = (serie, ano)
+
+    obtidos = []
+    with _trinco:
+        bloco = _reservas.get(chave)
+        if bloco:
+            fim = min(bloco[1], bloco[0] + quantidade)
+            obtidos.extend(range(bloco[0], fim))
+            bloco[0] = fim
+
+    em_falta = quantidade - len(obtidos)
+    if em_falta:
+        # Fora do trinco: a reserva pode esperar pelo bloqueio da linha do contador
+        reservados = max(em_falta, TAMANHO_BLOCO)
+        ligacao = _ligacao()
+        primeiro = _reservar(serie, ano, reservados, ligacao)
+        obtidos.extend(range(primeiro, primeiro + em_falta))
+        if reservados > em_falta:
+            sobras = (chave, primeiro + em_falta, primeiro + reservados)
+            if ligacao == DEFAULT_DB_ALIAS:
+                transaction.on_commit(lambda: _guardar(*sobras))
+            else:
+                # Já confirmadas na ligação própria, independentemente da transação atual
+                _guardar(*sobras)
+
+    return [definicao['formato'].format(numero=numero, ano=ano) for numero in obtidos]
+
+
+def proximo(serie, ano=None):
+    """Próximo número formatado da série."""
+    return numeros(serie, 1, ano)[0]
+
+
+def atribuir(objetos, campo, serie, ano=None):
+    """Numera os objetos que ainda não têm ``campo`` preenchido (para ``bulk_create``)."""
+    sem_numero = [objeto for objeto in objetos if not getattr(objeto, campo)]
+    for objeto, numero in zip(sem_numero, numeros(serie, len(sem_numero), ano)):
+        setattr(objeto, campo, numero)
@@ -0,0 +1,59 @@
+from django.db import transaction
+from django.test import TestCase
+from django.utils import timezone
+
+from pagamentos.models import Fatura
+from . import series
+from .models import SerieNumeracao
+
+
+class SeriesTests(TestCase):
+    def setUp(self):
+        # O rollback de cada teste desfaz os contadores: os blocos em memória de outro teste não servem
+        series.limpar_reservas()
+
+    def _ultimo(self, serie='FATURA'):
+        return SerieNumeracao.objects.get(serie=serie, ano=timezone.localdate().year).ultimo
+
+    def test_numeros_seguidos_reservados_em_bloco(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            primeiro = series.proximo('FATURA')
+        numeros = [primeiro] + [series.proximo('FATURA') for _ in range(9)]
+        ano = timezone.localdate().year
+        self.assertEqual(numeros, [f'FAT-{ano}-{numero:07d}' for numero in range(1, 11)])
+        # Um único bloco reservado na base de dados
+        self.assertEqual(self._ultimo(), series.TAMANHO_BLOCO)
+
+    def test_pedido_maior_do_que_o_bloco_nao_repete_numeros(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            numeros = series.numeros('RECIBO', 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            numeros += series.numeros('RECIBO', series.TAMANHO_BLOCO * 2)
+        numeros += series.numeros('RECIBO', 5)
+        self.assertEqual(len(set(numeros)), len(numeros))
+        self.assertEqual(numeros, sorted(numeros))
+
+    def test_transacao_revertida_nao_deixa_sobras(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            confirmado = series.proximo('PAGAMENTO')
+        series.limpar_reservas()
+        try:
+            with transaction.atomic():
+                series.proximo('PAGAMENTO')
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        # Sem a ligação própria (SQLite) o contador volta atrás e as sobras não ficam em memória
+        self.assertEqual(self._ultimo('PAGAMENTO'), series.TAMANHO_BLOCO)
+        ano = timezone.localdate().year
+        self.assertEqual(confirmado, f'PAG-{ano}-0000001')
+        self.assertEqual(series.proximo('PAGAMENTO'), f'PAG-{ano}-{series.TAMANHO_BLOCO + 1:07d}')
+
+    def test_atribuir_so_numera_os_objetos_sem_numero(self):
+        faturas = [Fatura(numero_fatura='MANUAL-1'), Fatura(), Fatura()]
+        series.atribuir(faturas, 'numero_fatura', 'FATURA')
+        ano = timezone.localdate().year
+        self.assertEqual(
+            [fatura.numero_fatura for fatura in faturas],
+            ['MANUAL-1', f'FAT-{ano}-0000001', f'FAT-{ano}-0000002'],
+        )
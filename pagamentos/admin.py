@@ -1,11 +1,20 @@
 from django.contrib import admin
-from .models import Recarga, Fatura, Recibo, Notificacao, Tarifa
+from .models import Recarga, Fatura, Recibo, Notificacao, Tarifa, EscalaoTarifa, PeriodoHorario, MovimentoSaldo
+
+class EscalaoTarifaInline(admin.TabularInline):
+    model = EscalaoTarifa
+    extra = 0
+
+class PeriodoHorarioInline(admin.TabularInline):
+    model = PeriodoHorario
+    extra = 0
 
 @admin.register(Tarifa)
 class TarifaAdmin(admin.ModelAdmin):
     list_display = ('nome', 'tipo', 'preco_kwh', 'taxa_fixa', 'ativa')
     list_filter = ('tipo', 'ativa')
     search_fields = ('nome',)
+    inlines = [EscalaoTarifaInline, PeriodoHorarioInline]
 
 @admin.register(Recarga)
 class RecargaAdmin(admin.ModelAdmin):
@@ -13,7 +22,7 @@ class RecargaAdmin(admin.ModelAdmin):
     list_filter = ['status', 'metodo_pagamento', 'data_recarga']
     search_fields = ['numero_recarga', 'cliente__nome', 'referencia_pagamento']
     readonly_fields = ['numero_recarga', 'data_recarga']
-    raw_id_fields = ['cliente']
+    raw_id_fields = ['cliente', 'cartao']
 
 @admin.register(Fatura)
 class FaturaAdmin(admin.ModelAdmin):
@@ -31,6 +40,17 @@ class ReciboAdmin(admin.ModelAdmin):
     readonly_fields = ['numero_recibo', 'data_emissao']
     raw_id_fields = ['cliente', 'fatura', 'recarga']
 
+@admin.register(MovimentoSaldo)
+class MovimentoSaldoAdmin(admin.ModelAdmin):
+    list_display = ['cliente', 'tipo', 'valor', 'saldo_apos', 'recarga', 'data_movimento']
+    list_filter = ['tipo', 'data_movimento']
+    search_fields = ['cliente__nome', 'cliente__numero_cliente', 'descricao']
+    readonly_fields = ['cliente', 'tipo', 'valor', 'saldo_apos', 'recarga', 'descricao', 'data_movimento']
+
+    def has_add_permission(self, request):
+        # Os movimentos são lançados por pagamentos.recargas, que atualiza também o saldo
+        return False
+
 @admin.register(Notificacao)
 class NotificacaoAdmin(admin.ModelAdmin):
     list_display = ['cliente', 'tipo', 'status', 'data_criacao', 'data_envio']
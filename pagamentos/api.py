@@ -0,0 +1,131 @@
+import django_filters
+from django.db.models import Prefetch
+from rest_framework import mixins, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from energia_gestao.api import ApiViewSet, PermissaoLancamentos
+from .models import Fatura, MovimentoSaldo, Pagamento, Recarga
+from .recargas import RecargaInvalida, cancelar_recarga, confirmar_recarga, registar_recarga, resgatar_cartao
+from .serializers import (
+    FaturaSerializer, MovimentoSaldoSerializer, NovaRecargaSerializer, PagamentoSerializer,
+    RecargaSerializer, ResgateCartaoSerializer,
+)
+
+class FaturaFilter(django_filters.FilterSet):
+    class Meta:
+        model = Fatura
+        fields = {
+            'numero_fatura': ['exact'],
+            'cliente': ['exact'],
+            'contador': ['exact'],
+            'status': ['exact'],
+            'data_emissao': ['gte', 'lt'],
+            'data_vencimento': ['gte', 'lt'],
+        }
+
+class PagamentoFilter(django_filters.FilterSet):
+    cliente = django_filters.NumberFilter(field_name='fatura__cliente')
+
+    class Meta:
+        model = Pagamento
+        fields = {
+            'numero_pagamento': ['exact'],
+            'fatura': ['exact'],
+            'metodo_pagamento': ['exact'],
+            'data_pagamento': ['gte', 'lt'],
+        }
+
+class RecargaFilter(django_filters.FilterSet):
+    class Meta:
+        model = Recarga
+        fields = {
+            'numero_recarga': ['exact'],
+            'cliente': ['exact'],
+            'status': ['exact'],
+            'metodo_pagamento': ['exact'],
+            'data_recarga': ['gte', 'lt'],
+        }
+
+class MovimentoSaldoFilter(django_filters.FilterSet):
+    class Meta:
+        model = MovimentoSaldo
+        fields = {
+            'cliente': ['exact'],
+            'tipo': ['exact'],
+            'recarga': ['exact'],
+            'data_movimento': ['gte', 'lt'],
+        }
+
+class FaturaViewSet(ApiViewSet):
+    # Só os ids dos pagamentos são serializados: uma consulta para a página inteira
+    queryset = Fatura.objects.select_related('cliente', 'contador').prefetch_related(
+        Prefetch('pagamentos', queryset=Pagamento.objects.only('id', 'fatura_id'))
+    )
+    serializer_class = FaturaSerializer
+    filterset_class = FaturaFilter
+    campo_cliente = 'cliente'
+
+class PagamentoViewSet(ApiViewSet):
+    queryset = Pagamento.objects.select_related('fatura')
+    serializer_class = PagamentoSerializer
+    filterset_class = PagamentoFilter
+    campo_cliente = 'fatura__cliente'
+
+class RecargaViewSet(mixins.CreateModelMixin, ApiViewSet):
+    """
+    Além da consulta: ``POST`` regista uma recarga (confirmada por omissão),
+    ``confirmar``/``cancelar`` tratam as pendentes e ``resgatar-cartao``
+    resgata um cartão de recarga. A lógica está em ``pagamentos.recargas``.
+    """
+    queryset = Recarga.objects.select_related('cliente')
+    serializer_class = RecargaSerializer
+    filterset_class = RecargaFilter
+    permission_classes = [IsAuthenticated, PermissaoLancamentos]
+    campo_cliente = 'cliente'
+
+    def _resposta(self, recarga, codigo=status.HTTP_200_OK):
+        return Response(RecargaSerializer(recarga, context=self.get_serializer_context()).data, status=codigo)
+
+    def create(self, request, *args, **kwargs):
+        dados = NovaRecargaSerializer(data=request.data)
+        dados.is_valid(raise_exception=True)
+        try:
+            recarga, criada = registar_recarga(**dados.validated_data)
+        except RecargaInvalida as e:
+            raise ValidationError({'detail': str(e)})
+        # Pedido repetido com a mesma referência: devolve a recarga já registada
+        return self._resposta(recarga, status.HTTP_201_CREATED if criada else status.HTTP_200_OK)
+
+    @action(detail=True, methods=['post'])
+    def confirmar(self, request, pk=None):
+        try:
+            recarga, _ = confirmar_recarga(self.get_object().pk)
+        except RecargaInvalida as e:
+            raise ValidationError({'detail': str(e)})
+        return self._resposta(recarga)
+
+    @action(detail=True, methods=['post'])
+    def cancelar(self, request, pk=None):
+        try:
+            recarga, _ = cancelar_recarga(self.get_object().pk)
+        except RecargaInvalida as e:
+            raise ValidationError({'detail': str(e)})
+        return self._resposta(recarga)
+
+    @action(detail=False, methods=['post'], url_path='resgatar-cartao')
+    def resgatar_cartao(self, request):
+        dados = ResgateCartaoSerializer(data=request.data)
+        dados.is_valid(raise_exception=True)
+        try:
+            recarga = resgatar_cartao(dados.validated_data['codigo_cartao'], dados.validated_data['cliente_id'])
+        except RecargaInvalida as e:
+            raise ValidationError({'detail': str(e)})
+        return self._resposta(recarga, status.HTTP_201_CREATED)
+
+class MovimentoSaldoViewSet(ApiViewSet):
+    queryset = MovimentoSaldo.objects.select_related('recarga')
+    serializer_class = MovimentoSaldoSerializer
+    filterset_class = MovimentoSaldoFilter
+    campo_cliente = 'cliente'
@@ -0,0 +1,108 @@
+"""
+Aplicação de multas/juros e suspensão de contadores por dívida, em lote.
+
+As faturas em atraso são percorridas por blocos de chaves primárias. Em cada
+bloco, multas, juros e total são recalculados por um único UPDATE com
+expressões ``F()``/``Case`` (os dias de atraso dependem apenas da data de
+vencimento) e os contadores envolvidos são suspensos num único UPDATE, sem
+repetir contadores já suspensos.
+"""
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, Value, When
+from django.utils import timezone
+
+from equipamentos.models import Contador
+from relatorios import metricas, resumos
+from .models import Fatura
+
+DIAS_TOLERANCIA = 30
+TAXA_MULTA = Decimal('0.02')        # 2% de multa fixa
+TAXA_JUROS_DIA = Decimal('0.001')   # 0.1% de juros ao dia
+TAMANHO_BLOCO = 1000
+
+_decimal = DecimalField(max_digits=10, decimal_places=2)
+
+
+def faturas_em_atraso(hoje=None, dias_tolerancia=DIAS_TOLERANCIA):
+    """Faturas por pagar vencidas há mais de ``dias_tolerancia`` dias."""
+    hoje = hoje or timezone.localdate()
+    return Fatura.objects.filter(
+        status__in=['PENDENTE', 'VENCIDO'],
+        data_vencimento__lt=hoje - timedelta(days=dias_tolerancia),
+    )
+
+
+def _atualizar_penalidades(pks, vencimentos, hoje):
+    dias_atraso = Case(
+        *[When(data_vencimento=vencimento, then=Value((hoje - vencimento).days)) for vencimento in vencimentos],
+        default=Value(0),
+    )
+    multa = ExpressionWrapper(F('valor_consumo') * TAXA_MULTA, output_field=_decimal)
+    juros = ExpressionWrapper(F('valor_consumo') * TAXA_JUROS_DIA * dias_atraso, output_field=_decimal)
+    return Fatura.objects.filter(pk__in=pks).update(
+        multa_atraso=multa,
+        juros_mora=juros,
+        valor_total=ExpressionWrapper(F('valor_consumo') + F('outras_taxas') + multa + juros, output_field=_decimal),
+        status='VENCIDO',
+    )
+
+
+def processar_devedores(dias_tolerancia=DIAS_TOLERANCIA, tamanho_bloco=TAMANHO_BLOCO, simular=False, progresso=None):
+    """
+    Recalcula multas e juros das faturas em atraso e suspende os respetivos
+    contadores. Com ``simular=True`` apenas conta o que seria alterado.
+
+    ``progresso``, se indicado, é chamado como ``progresso(processados, total)``
+    após cada bloco. Devolve um dicionário com o resumo da execução.
+    """
+    inicio = time.monotonic()
+    hoje = timezone.localdate()
+    agora = timezone.now()
+    faturas = faturas_em_atraso(hoje, dias_tolerancia).order_by('pk')
+    total = faturas.count()
+
+    processadas = 0
+    contadores_vistos = set()
+    contadores_suspensos = 0
+    ultimo_pk = 0
+    dias_emissao = set()
+    while True:
+        bloco = list(
+            faturas.filter(pk__gt=ultimo_pk)
+            .values_list('pk', 'data_vencimento', 'contador_id', 'data_emissao')[:tamanho_bloco]
+        )
+        if not bloco:
+            break
+        ultimo_pk = bloco[-1][0]
+        pks = [linha[0] for linha in bloco]
+        contadores = {linha[2] for linha in bloco if linha[2]} - contadores_vistos
+        contadores_vistos |= contadores
+        a_suspender = Contador.objects.filter(pk__in=contadores).exclude(status='SUSPENSO')
+
+        if simular:
+            contadores_suspensos += a_suspender.count()
+        else:
+            with transaction.atomic():
+                _atualizar_penalidades(pks, {linha[1] for linha in bloco}, hoje)
+                contadores_suspensos += a_suspender.update(status='SUSPENSO', data_suspensao=agora)
+            dias_emissao.update(linha[3] for linha in bloco)
+
+        processadas += len(bloco)
+        if progresso:
+            progresso(processadas, total)
+
+    if processadas and not simular:
+        # update() não emite post_save
+        metricas.invalidar('faturas', 'contadores')
+        resumos.atualizar('faturacao', dias_emissao)
+
+    return {
+        'faturas_em_atraso': processadas,
+        'contadores_suspensos': contadores_suspensos,
+        'simulacao': simular,
+        'duracao': time.monotonic() - inicio,
+    }
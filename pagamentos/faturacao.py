@@ -0,0 +1,228 @@
+"""
+Motor de faturação em lote.
+
+Resolve as leituras pendentes e as faturas já emitidas para o período em
+poucas consultas agregadas, valoriza todas as faturas de uma vez
+(``pagamentos.tarifacao``) e grava as novas faturas com
+``bulk_create`` em blocos, em vez de várias consultas por leitura.
+
+Os contadores inteligentes são faturados pelo total mensal das leituras de
+intervalo (``equipamentos.intervalos``); nesse mês as leituras manuais
+desses contadores não contam. Nas tarifas com períodos horários a energia
+desses contadores é somada por intervalo do dia, numa única consulta, para
+ser valorizada ao preço de cada período.
+
+As faturas geradas aqui ficam marcadas com ``Fatura.faturacao_periodo``: a
+restrição ``fatura_periodo_unica`` faz falhar o bloco de uma segunda
+execução simultânea em vez de faturar o mesmo contador duas vezes.
+"""
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Max, Min, Sum
+from django.db.models.functions import ExtractHour, ExtractMinute
+from django.utils import timezone
+
+from equipamentos.intervalos import INTERVALO_MINUTOS
+from equipamentos.models import ConsumoMensal, LeituraConsumo, LeituraIntervalo
+from numeracao import series
+from relatorios import metricas, resumos
+from . import tarifacao
+from .models import Fatura
+
+DIAS_VENCIMENTO = 15
+TAMANHO_BLOCO = 1000
+
+
+def intervalo_do_mes(dia):
+    """Devolve (inicio, fim) do mês de ``dia`` como datetimes com fuso horário."""
+    inicio = datetime(dia.year, dia.month, 1)
+    if dia.month == 12:
+        fim = datetime(dia.year + 1, 1, 1)
+    else:
+        fim = datetime(dia.year, dia.month + 1, 1)
+    return timezone.make_aware(inicio), timezone.make_aware(fim)
+
+
+def _leituras_por_contador(inicio, fim):
+    """
+    Agrega as leituras do período por contador numa única consulta,
+    já com o cliente, o tipo de cliente e a tarifa associados.
+    """
+    return (
+        LeituraConsumo.objects
+        .filter(data_leitura__gte=inicio, data_leitura__lt=fim, contador__cliente__isnull=False)
+        .order_by()
+        .values(
+            'contador_id',
+            'contador__cliente_id',
+            'contador__cliente__tipo_cliente',
+            'contador__cliente__tarifa_id',
+        )
+        .annotate(
+            primeira_leitura=Min('leitura_anterior'),
+            ultima_leitura=Max('leitura_atual'),
+            consumo_total=Sum('consumo'),
+        )
+    )
+
+
+def _kwh(energia_wh):
+    return (Decimal(energia_wh) / 1000).quantize(Decimal('0.01'))
+
+
+def _telecontagem_por_contador(inicio):
+    """
+    Consumo do mês dos contadores com leituras de intervalo, no mesmo formato
+    de ``_leituras_por_contador``. As leituras de início e fim do período são
+    reconstituídas a partir dos totais mensais anteriores.
+    """
+    mes = timezone.localtime(inicio).date()
+    consumos = list(
+        ConsumoMensal.objects
+        .filter(mes=mes, contador__cliente__isnull=False)
+        .values(
+            'contador_id',
+            'contador__cliente_id',
+            'contador__cliente__tipo_cliente',
+            'contador__cliente__tarifa_id',
+            'energia_wh',
+        )
+    )
+    anteriores = dict(
+        ConsumoMensal.objects
+        .filter(contador_id__in=ConsumoMensal.objects.filter(mes=mes).values('contador_id'), mes__lt=mes)
+        .order_by()
+        .values('contador_id')
+        .annotate(energia=Sum('energia_wh'))
+        .values_list('contador_id', 'energia')
+    )
+    for consumo in consumos:
+        anterior = anteriores.get(consumo['contador_id'], 0)
+        energia_wh = consumo.pop('energia_wh')
+        consumo['primeira_leitura'] = _kwh(anterior)
+        consumo['ultima_leitura'] = _kwh(anterior + energia_wh)
+        consumo['consumo_total'] = _kwh(energia_wh)
+    return consumos
+
+
+def _energia_por_intervalo(tarifas, inicio, fim):
+    """
+    ``{contador_id: {intervalo do dia: Wh}}`` do período para os contadores
+    dos clientes com uma das ``tarifas`` (horas locais).
+    """
+    if not tarifas:
+        return {}
+    linhas = (
+        LeituraIntervalo.objects
+        .filter(contador__cliente__tarifa_id__in=tarifas, instante__gte=inicio, instante__lt=fim)
+        .annotate(hora=ExtractHour('instante'), minuto=ExtractMinute('instante'))
+        .order_by()
+        .values('contador_id', 'hora', 'minuto')
+        .annotate(energia=Sum('energia_wh'))
+        .values_list('contador_id', 'hora', 'minuto', 'energia')
+    )
+    energia = {}
+    for contador_id, hora, minuto, energia_wh in linhas:
+        energia.setdefault(contador_id, {})[(hora * 60 + minuto) // INTERVALO_MINUTOS] = energia_wh
+    return energia
+
+
+def _gravar_bloco(faturas):
+    with transaction.atomic():
+        series.atribuir(faturas, 'numero_fatura', 'FATURA')
+        Fatura.objects.bulk_create(faturas)
+    return len(faturas)
+
+
+def gerar_faturas_periodo(referencia=None, tamanho_bloco=TAMANHO_BLOCO, progresso=None):
+    """
+    Gera as faturas do mês de ``referencia`` (por omissão, o mês corrente)
+    para todos os contadores com cliente que tiveram leituras nesse mês e
+    ainda não têm fatura para o período.
+
+    ``progresso``, se indicado, é chamado como ``progresso(processados, total)``
+    depois de cada bloco gravado. Devolve um dicionário com o resumo da execução.
+    """
+    inicio_execucao = time.monotonic()
+    agora = timezone.localtime()
+    referencia = referencia or agora.date()
+    periodo = referencia.strftime('%B/%Y')
+    inicio, fim = intervalo_do_mes(referencia)
+    data_emissao = agora.date()
+    data_vencimento = data_emissao + timedelta(days=DIAS_VENCIMENTO)
+
+    # A telecontagem substitui as leituras manuais do mesmo contador
+    por_contador = {leitura['contador_id']: leitura for leitura in _leituras_por_contador(inicio, fim)}
+    telecontagem = _telecontagem_por_contador(inicio)
+    por_contador.update((consumo['contador_id'], consumo) for consumo in telecontagem)
+    leituras = list(por_contador.values())
+    ja_faturados = set(
+        Fatura.objects.filter(periodo_referencia=periodo)
+        .values_list('cliente_id', 'contador_id')
+    )
+    pendentes = []
+    negativos = 0
+    for leitura in leituras:
+        if (leitura['contador__cliente_id'], leitura['contador_id']) in ja_faturados:
+            continue
+        leitura['consumo_total'] = leitura['consumo_total'] or Decimal('0.00')
+        if leitura['consumo_total'] < 0:
+            # Leituras antigas com consumo negativo (ver equipamentos.anomalias) não são faturadas
+            negativos += 1
+            continue
+        pendentes.append(leitura)
+    horarias = tarifacao.tarifas_horarias() & {consumo['contador__cliente__tarifa_id'] for consumo in telecontagem}
+    energia = _energia_por_intervalo(horarias, inicio, fim)
+    valores = tarifacao.calcular_lote(
+        (
+            leitura['contador__cliente__tipo_cliente'],
+            leitura['contador__cliente__tarifa_id'],
+            leitura['consumo_total'],
+            energia.get(leitura['contador_id']),
+        )
+        for leitura in pendentes
+    )
+
+    geradas = 0
+    bloco = []
+    for processados, (leitura, (valor_consumo, outras_taxas, valor_total)) in enumerate(zip(pendentes, valores), start=1):
+        bloco.append(Fatura(
+            cliente_id=leitura['contador__cliente_id'],
+            contador_id=leitura['contador_id'],
+            periodo_referencia=periodo,
+            leitura_anterior=leitura['primeira_leitura'],
+            leitura_atual=leitura['ultima_leitura'],
+            consumo_kwh=leitura['consumo_total'],
+            valor_consumo=valor_consumo,
+            outras_taxas=outras_taxas,
+            valor_total=valor_total,
+            status='PENDENTE',
+            data_emissao=data_emissao,
+            data_vencimento=data_vencimento,
+            faturacao_periodo=True,
+        ))
+        if len(bloco) >= tamanho_bloco:
+            geradas += _gravar_bloco(bloco)
+            bloco = []
+            if progresso:
+                progresso(processados, len(pendentes))
+    if bloco:
+        geradas += _gravar_bloco(bloco)
+    if progresso:
+        progresso(len(pendentes), len(pendentes))
+    if geradas:
+        # bulk_create não emite post_save
+        metricas.invalidar('faturas')
+        resumos.marcar('faturacao', data_emissao)
+
+    return {
+        'periodo': periodo,
+        'contadores_com_leitura': len(leituras),
+        'geradas': geradas,
+        'ja_faturados': len(leituras) - geradas - negativos,
+        'consumo_negativo': negativos,
+        'duracao': time.monotonic() - inicio_execucao,
+    }
@@ -1,6 +1,9 @@
+import csv
+
 from django import apps
 from django import forms
 from .models import Tarifa, Fatura, Pagamento
+from .reconciliacao import COLUNAS_OBRIGATORIAS
 
 class FaturaSimplesForm(forms.ModelForm):
     class Meta:
@@ -42,3 +45,32 @@ class PagamentoForm(forms.ModelForm):
             'referencia_multicaixa': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Ex: 1234567890'}),
             'observacoes': forms.Textarea(attrs={'class': 'form-control', 'rows': 3, 'placeholder': 'Observações (opcional)'}),
         }
+
+class ConciliacaoForm(forms.Form):
+    FORMATO_CHOICES = [
+        ('csv', 'CSV com cabeçalho'),
+        ('fixo', 'Largura fixa'),
+    ]
+    DELIMITADOR_CHOICES = [
+        (',', 'Vírgula (,)'),
+        (';', 'Ponto e vírgula (;)'),
+    ]
+
+    ficheiro = forms.FileField(
+        label='Ficheiro de liquidação',
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,.txt,text/csv,text/plain'}),
+    )
+    formato = forms.ChoiceField(choices=FORMATO_CHOICES, widget=forms.Select(attrs={'class': 'form-control'}))
+    delimitador = forms.ChoiceField(choices=DELIMITADOR_CHOICES, label='Separador (CSV)', widget=forms.Select(attrs={'class': 'form-control'}))
+
+    def clean(self):
+        cleaned_data = super().clean()
+        ficheiro = cleaned_data.get('ficheiro')
+        if ficheiro and cleaned_data.get('formato') == 'csv' and cleaned_data.get('delimitador'):
+            # Verifica só o cabeçalho; as linhas são validadas na conciliação
+            cabecalho = ficheiro.readline().decode('utf-8-sig', errors='replace')
+            ficheiro.seek(0)
+            colunas = {coluna.strip() for coluna in next(csv.reader([cabecalho], delimiter=cleaned_data['delimitador']), [])}
+            if not COLUNAS_OBRIGATORIAS <= colunas or not colunas & {'fatura', 'cliente'}:
+                self.add_error('ficheiro', 'O ficheiro tem de ter as colunas referencia, valor e fatura e/ou cliente (verifique o separador).')
+        return cleaned_data
@@ -0,0 +1,79 @@
+import random
+import time
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pagamentos import tarifacao
+from pagamentos.tarifa_models import Tarifa
+
+CENTIMO = Decimal('0.01')
+
+
+def _referencia(tarifa, tipo_cliente, consumo):
+    """Cálculo direto, escalão a escalão em Decimal, para conferir as tabelas compiladas."""
+    if tarifa is None:
+        return (consumo * tarifacao.PRECO_KWH_PADRAO).quantize(CENTIMO, ROUND_HALF_UP), Decimal('0.00')
+    valor = Decimal('0')
+    anterior = Decimal('0')
+    escaloes = sorted(tarifa.escaloes.all(), key=lambda escalao: (escalao.limite_kwh is None, escalao.limite_kwh or 0))
+    for escalao in escaloes:
+        if escalao.limite_kwh is None or consumo <= escalao.limite_kwh:
+            valor += (consumo - anterior) * escalao.preco_kwh
+            break
+        valor += (escalao.limite_kwh - anterior) * escalao.preco_kwh
+        anterior = escalao.limite_kwh
+    else:
+        valor += (consumo - anterior) * tarifa.preco_kwh
+    taxa_cliente = tarifa.preco_cliente_pos if tipo_cliente == 'POS_PAGO' else tarifa.preco_cliente_pre
+    return valor.quantize(CENTIMO, ROUND_HALF_UP), taxa_cliente
+
+
+class Command(BaseCommand):
+    help = 'Mede o desempenho da valorização de consumos (pagamentos.tarifacao) com as tarifas configuradas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--valores', type=int, default=1000000, help='Número de consumos a valorizar')
+        parser.add_argument('--max-kwh', type=int, default=2000, help='Consumo máximo gerado em kWh')
+        parser.add_argument('--conferir', type=int, default=10000, help='Consumos conferidos com o cálculo direto')
+        parser.add_argument('--semente', type=int, default=1, help='Semente dos valores aleatórios')
+
+    def handle(self, *args, **options):
+        if options['valores'] <= 0:
+            raise CommandError('--valores tem de ser positivo.')
+        tarifas = {tarifa.pk: tarifa for tarifa in Tarifa.objects.prefetch_related('escaloes')}
+        ids = list(tarifas) + [None]
+        if not tarifas:
+            self.stdout.write(self.style.WARNING('Sem tarifas configuradas: só é medido o preço por omissão.'))
+
+        aleatorio = random.Random(options['semente'])
+        maximo = options['max_kwh'] * 100
+        itens = [
+            (aleatorio.choice(('POS_PAGO', 'PRE_PAGO')), aleatorio.choice(ids), Decimal(aleatorio.randint(0, maximo)).scaleb(-2))
+            for _ in range(options['valores'])
+        ]
+
+        tarifacao.invalidar()
+        inicio = time.monotonic()
+        tarifacao.tarifas()
+        compilacao = time.monotonic() - inicio
+        inicio = time.monotonic()
+        valores = tarifacao.calcular_lote(itens)
+        duracao = time.monotonic() - inicio
+
+        divergencias = 0
+        for (tipo_cliente, tarifa_id, consumo), (valor_consumo, outras_taxas, _) in list(zip(itens, valores))[:options['conferir']]:
+            if (valor_consumo, outras_taxas) != _referencia(tarifas.get(tarifa_id), tipo_cliente, consumo):
+                divergencias += 1
+
+        self.stdout.write(
+            f"{len(tarifas)} tarifas compiladas em {compilacao * 1000:.1f} ms "
+            f"({sum(1 for tarifa in tarifas.values() if tarifa.escaloes.all())} com escalões)."
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(itens)} consumos valorizados em {duracao:.2f}s ({len(itens) / duracao:.0f} consumos/s)."
+        ))
+        conferidos = min(options['conferir'], len(itens))
+        if divergencias:
+            raise CommandError(f'{divergencias} de {conferidos} valores diferem do cálculo direto.')
+        self.stdout.write(f'{conferidos} valores conferidos com o cálculo direto, sem diferenças.')
@@ -0,0 +1,54 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pagamentos.reconciliacao import TAMANHO_BLOCO, FormatoInvalido, conciliar
+
+class Command(BaseCommand):
+    help = 'Concilia um ficheiro de liquidação Multicaixa/bancário com as faturas em aberto e lança os pagamentos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('ficheiro', help='Caminho do ficheiro de liquidação')
+        parser.add_argument('--formato', choices=['csv', 'fixo'], default='csv', help='CSV com cabeçalho ou registos de largura fixa')
+        parser.add_argument('--batch-size', type=int, default=TAMANHO_BLOCO, help='Linhas gravadas por bloco/transação')
+        parser.add_argument('--delimitador', default=',', help='Separador de colunas do CSV')
+        parser.add_argument('--excecoes', help='Grava as linhas não conciliadas (com o motivo) neste ficheiro CSV')
+
+    def handle(self, *args, **options):
+        def progresso(linhas):
+            if options['verbosity'] >= 2:
+                self.stdout.write(f'  {linhas} linhas processadas')
+
+        try:
+            with open(options['ficheiro'], newline='', encoding='utf-8-sig') as ficheiro:
+                resultado = conciliar(
+                    ficheiro,
+                    formato=options['formato'],
+                    tamanho_bloco=options['batch_size'],
+                    delimitador=options['delimitador'],
+                    progresso=progresso,
+                )
+        except OSError as e:
+            raise CommandError(f'Não foi possível ler o ficheiro: {e}')
+        except FormatoInvalido as e:
+            raise CommandError(str(e))
+
+        if options['excecoes'] and resultado['lista_excecoes']:
+            with open(options['excecoes'], 'w', newline='', encoding='utf-8') as saida:
+                escritor = csv.DictWriter(saida, fieldnames=['linha', 'referencia', 'fatura', 'cliente', 'valor', 'motivo'])
+                escritor.writeheader()
+                escritor.writerows(resultado['lista_excecoes'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Conciliação concluída. {resultado['conciliadas']} pagamentos lançados "
+            f"({resultado['valor_conciliado']} Kz), {resultado['faturas_pagas']} faturas liquidadas, "
+            f"{resultado['ja_lancadas']} linhas já lançadas, {resultado['excecoes']} exceções."
+        ))
+        if options['verbosity'] >= 1:
+            for excecao in resultado['lista_excecoes'][:20]:
+                self.stdout.write(self.style.WARNING(
+                    f"  Linha {excecao['linha']} ({excecao['referencia'] or '-'}): {excecao['motivo']}"
+                ))
+            if resultado['excecoes'] > 20:
+                self.stdout.write(f"  ... e mais {resultado['excecoes'] - 20} (use --excecoes para as gravar em ficheiro)")
+        self.stdout.write(f"Tempo: {resultado['duracao']:.2f}s ({resultado['linhas_por_segundo']:.0f} linhas/s)")
@@ -0,0 +1,47 @@
+import os
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from pagamentos.models import Fatura
+from pagamentos.pdf import TAMANHO_BLOCO, renderizar_faturas
+
+class Command(BaseCommand):
+    help = 'Renderiza em paralelo os PDFs das faturas de um mês e grava-os em Fatura.arquivo_pdf'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--periodo', help='Mês de emissão no formato AAAA-MM (por omissão, o mês corrente)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Número de processos de renderização')
+        parser.add_argument('--batch-size', type=int, default=TAMANHO_BLOCO, help='Faturas enviadas a cada worker de uma vez')
+        parser.add_argument('--refazer', action='store_true', help='Renderiza também as faturas cujo PDF já está em dia')
+
+    def handle(self, *args, **options):
+        if options['periodo']:
+            try:
+                mes = datetime.strptime(options['periodo'], '%Y-%m').date()
+            except ValueError:
+                raise CommandError('Período inválido, use o formato AAAA-MM (ex: 2025-01).')
+        else:
+            mes = timezone.localdate().replace(day=1)
+        fim = (mes + timedelta(days=32)).replace(day=1)
+        if options['workers'] < 1:
+            raise CommandError('--workers tem de ser pelo menos 1.')
+
+        def progresso(paginas, total):
+            if options['verbosity'] >= 2:
+                self.stdout.write(f'  {paginas}/{total} faturas renderizadas')
+
+        resultado = renderizar_faturas(
+            Fatura.objects.filter(data_emissao__gte=mes, data_emissao__lt=fim),
+            workers=options['workers'],
+            tamanho_bloco=options['batch_size'],
+            refazer=options['refazer'],
+            progresso=progresso,
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Renderização de {mes.strftime('%m/%Y')} concluída. {resultado['paginas']} faturas "
+            f"com {resultado['workers']} worker(s), {resultado['ignoradas']} já em dia."
+        ))
+        self.stdout.write(f"Tempo: {resultado['duracao']:.2f}s ({resultado['paginas_por_segundo']:.1f} páginas/s)")
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pagamentos', '0006_fatura_juros_mora_fatura_multa_atraso'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fatura',
+            name='pdf_gerado_em',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='fatura',
+            name='pdf_hash',
+            field=models.CharField(blank=True, default='', editable=False, help_text='Impressão digital dos campos usados no PDF guardado', max_length=64),
+        ),
+    ]
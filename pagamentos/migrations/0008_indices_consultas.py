@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0004_indices_consultas'),
+        ('equipamentos', '0006_indices_consultas'),
+        ('pagamentos', '0007_fatura_pdf_hash'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='fatura',
+            index=models.Index(fields=['status', 'data_vencimento'], name='fatura_status_venc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fatura',
+            index=models.Index(fields=['data_emissao', 'id'], name='fatura_emissao_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fatura',
+            index=models.Index(fields=['periodo_referencia', 'cliente', 'contador'], name='fatura_periodo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pagamento',
+            index=models.Index(fields=['data_pagamento'], name='pagamento_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recarga',
+            index=models.Index(fields=['data_recarga'], name='recarga_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recarga',
+            index=models.Index(fields=['status', 'data_recarga'], name='recarga_status_data_idx'),
+        ),
+    ]
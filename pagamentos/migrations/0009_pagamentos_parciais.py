@@ -0,0 +1,79 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Max, OuterRef, Subquery, Sum
+
+
+def preencher_valor_pago_total(apps, schema_editor):
+    Fatura = apps.get_model('pagamentos', 'Fatura')
+    Pagamento = apps.get_model('pagamentos', 'Pagamento')
+    total = (
+        Pagamento.objects.filter(fatura=OuterRef('pk')).order_by()
+        .values('fatura').annotate(total=Sum('valor_pago')).values('total')
+    )
+    Fatura.objects.filter(pk__in=Pagamento.objects.values('fatura')).update(valor_pago_total=Subquery(total))
+    # Faturas antigas cujos pagamentos parciais já cobrem o total: ficam pagas na data do último pagamento
+    ultimo = (
+        Pagamento.objects.filter(fatura=OuterRef('pk')).order_by()
+        .values('fatura').annotate(ultimo=Max('data_pagamento')).values('ultimo')
+    )
+    Fatura.objects.filter(
+        status__in=['PENDENTE', 'VENCIDO'], valor_pago_total__gt=0, valor_pago_total__gte=F('valor_total'),
+    ).update(status='PAGO', data_pagamento=Subquery(ultimo))
+
+
+def distinguir_referencias_duplicadas(apps, schema_editor):
+    """
+    Antes da restrição de unicidade nada impedia pagamentos com a mesma
+    referência Multicaixa. O mais antigo de cada grupo fica com a referência;
+    os restantes passam a ``<referência>-DUP<n>`` e a referência original fica
+    registada nas observações, para conferência.
+    """
+    Pagamento = apps.get_model('pagamentos', 'Pagamento')
+    tamanho = Pagamento._meta.get_field('referencia_multicaixa').max_length
+    duplicadas = (
+        Pagamento.objects.exclude(referencia_multicaixa__isnull=True).exclude(referencia_multicaixa='')
+        .values('referencia_multicaixa').annotate(total=Count('id')).filter(total__gt=1)
+        .values_list('referencia_multicaixa', flat=True)
+    )
+    for referencia in list(duplicadas):
+        pagamentos = Pagamento.objects.filter(referencia_multicaixa=referencia).order_by('data_pagamento', 'pk')
+        numero = 0
+        for pagamento in list(pagamentos)[1:]:
+            while True:
+                numero += 1
+                sufixo = f'-DUP{numero}'
+                nova = referencia[:tamanho - len(sufixo)] + sufixo
+                if not Pagamento.objects.filter(referencia_multicaixa=nova).exists():
+                    break
+            nota = f'Referência Multicaixa duplicada ({referencia}) renomeada para {nova} na migração 0009.'
+            pagamento.referencia_multicaixa = nova
+            pagamento.observacoes = f'{pagamento.observacoes}\n{nota}' if pagamento.observacoes else nota
+            pagamento.save(update_fields=['referencia_multicaixa', 'observacoes'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pagamentos', '0008_indices_consultas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fatura',
+            name='valor_pago_total',
+            field=models.DecimalField(decimal_places=2, default=0.0, editable=False, help_text='Soma dos pagamentos registados', max_digits=10),
+        ),
+        migrations.RunPython(preencher_valor_pago_total, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='recibo',
+            name='pagamento',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='recibo', to='pagamentos.pagamento'),
+        ),
+        migrations.RunPython(distinguir_referencias_duplicadas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='pagamento',
+            constraint=models.UniqueConstraint(condition=models.Q(('referencia_multicaixa__isnull', False), models.Q(('referencia_multicaixa', ''), _negated=True)), fields=('referencia_multicaixa',), name='pagamento_referencia_unica', violation_error_message='Já existe um pagamento com esta referência Multicaixa.'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def saldos_iniciais(apps, schema_editor):
+    # Abre a conta-corrente com o saldo atual, para que a soma dos movimentos coincida com ele
+    Cliente = apps.get_model('clientes', 'Cliente')
+    MovimentoSaldo = apps.get_model('pagamentos', 'MovimentoSaldo')
+    MovimentoSaldo.objects.bulk_create(
+        MovimentoSaldo(cliente_id=pk, tipo='AJUSTE', valor=saldo, saldo_apos=saldo, descricao='Saldo inicial')
+        for pk, saldo in Cliente.objects.exclude(saldo_atual=0).values_list('pk', 'saldo_atual').iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0004_indices_consultas'),
+        ('equipamentos', '0006_indices_consultas'),
+        ('pagamentos', '0009_pagamentos_parciais'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimentoSaldo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('RECARGA', 'Recarga'), ('CONSUMO', 'Consumo'), ('AJUSTE', 'Ajuste')], max_length=10)),
+                ('valor', models.DecimalField(decimal_places=2, help_text='Positivo nos créditos, negativo nos débitos', max_digits=10)),
+                ('saldo_apos', models.DecimalField(decimal_places=2, help_text='Saldo do cliente depois do movimento', max_digits=10)),
+                ('descricao', models.CharField(blank=True, max_length=200, null=True)),
+                ('data_movimento', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Movimento de Saldo',
+                'verbose_name_plural': 'Movimentos de Saldo',
+                'ordering': ['-data_movimento', '-id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='recarga',
+            name='cartao',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='recarga', to='equipamentos.cartaorecarga'),
+        ),
+        migrations.AddConstraint(
+            model_name='recarga',
+            constraint=models.UniqueConstraint(condition=models.Q(('referencia_pagamento__isnull', False), models.Q(('referencia_pagamento', ''), _negated=True)), fields=('referencia_pagamento',), name='recarga_referencia_unica', violation_error_message='Já existe uma recarga com esta referência de pagamento.'),
+        ),
+        migrations.AddField(
+            model_name='movimentosaldo',
+            name='cliente',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimentos_saldo', to='clientes.cliente'),
+        ),
+        migrations.AddField(
+            model_name='movimentosaldo',
+            name='recarga',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='movimentos', to='pagamentos.recarga'),
+        ),
+        migrations.AddIndex(
+            model_name='movimentosaldo',
+            index=models.Index(fields=['cliente', 'data_movimento'], name='movimento_cliente_data_idx'),
+        ),
+        migrations.RunPython(saldos_iniciais, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pagamentos', '0010_recargas_conta_corrente'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EscalaoTarifa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('limite_kwh', models.DecimalField(blank=True, decimal_places=2, help_text='Limite superior do escalão em kWh (vazio = sem limite)', max_digits=10, null=True)),
+                ('preco_kwh', models.DecimalField(decimal_places=2, help_text='Preço por kWh neste escalão em Kz', max_digits=10)),
+                ('tarifa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='escaloes', to='pagamentos.tarifa')),
+            ],
+            options={
+                'verbose_name': 'Escalão de Tarifa',
+                'verbose_name_plural': 'Escalões de Tarifa',
+                'ordering': ['tarifa', 'limite_kwh'],
+                'constraints': [models.UniqueConstraint(fields=('tarifa', 'limite_kwh'), name='escalao_tarifa_limite_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pagamentos', '0011_escaloes_tarifa'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PeriodoHorario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(choices=[('PONTA', 'Ponta'), ('CHEIA', 'Cheia'), ('VAZIO', 'Vazio')], max_length=10)),
+                ('hora_inicio', models.TimeField()),
+                ('hora_fim', models.TimeField()),
+                ('preco_kwh', models.DecimalField(decimal_places=2, help_text='Preço por kWh neste período em Kz', max_digits=10)),
+                ('tarifa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='periodos', to='pagamentos.tarifa')),
+            ],
+            options={
+                'verbose_name': 'Período Horário',
+                'verbose_name_plural': 'Períodos Horários',
+                'ordering': ['tarifa', 'hora_inicio'],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:24
+
+from django.db import migrations, models
+
+
+def criar_versao(apps, schema_editor):
+    apps.get_model('pagamentos', 'VersaoTarifas').objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pagamentos', '0012_periodos_horarios'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersaoTarifas',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('versao', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Versão das Tarifas',
+                'verbose_name_plural': 'Versão das Tarifas',
+            },
+        ),
+        migrations.RunPython(criar_versao, migrations.RunPython.noop),
+    ]
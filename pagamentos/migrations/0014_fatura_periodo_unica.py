@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0005_pesquisa'),
+        ('equipamentos', '0008_anomalias_consumo'),
+        ('pagamentos', '0013_versao_tarifas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fatura',
+            name='faturacao_periodo',
+            field=models.BooleanField(default=False, editable=False, help_text='Gerada pela faturação mensal (pagamentos.faturacao)'),
+        ),
+        migrations.AddConstraint(
+            model_name='fatura',
+            constraint=models.UniqueConstraint(condition=models.Q(('faturacao_periodo', True), models.Q(('status', 'CANCELADO'), _negated=True)), fields=('cliente', 'contador', 'periodo_referencia'), name='fatura_periodo_unica'),
+        ),
+    ]
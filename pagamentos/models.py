@@ -1,7 +1,17 @@
 from django.db import models
-from .tarifa_models import Tarifa
+from .tarifa_models import EscalaoTarifa, PeriodoHorario, Tarifa, VersaoTarifas
 from clientes.models import Cliente
-from equipamentos.models import Contador
+from equipamentos.models import Contador, CartaoRecarga
+from numeracao import series
+
+
+def _valores_resumo(instancia):
+    """Valores lidos de ``CAMPOS_RESUMO``, para os resumos somarem só a diferença ao gravar (None se algum foi adiado)."""
+    valores = instancia.__dict__
+    if all(campo in valores for campo in instancia.CAMPOS_RESUMO):
+        return {campo: valores[campo] for campo in instancia.CAMPOS_RESUMO}
+    return None
+
 
 class Recarga(models.Model):
     STATUS_RECARGA_CHOICES = [
@@ -25,6 +35,7 @@ class Recarga(models.Model):
     metodo_pagamento = models.CharField(max_length=15, choices=METODO_PAGAMENTO_CHOICES)
     status = models.CharField(max_length=10, choices=STATUS_RECARGA_CHOICES, default='PENDENTE')
     referencia_pagamento = models.CharField(max_length=100, blank=True, null=True)
+    cartao = models.OneToOneField(CartaoRecarga, on_delete=models.PROTECT, null=True, blank=True, related_name='recarga')
     data_recarga = models.DateTimeField(auto_now_add=True)
     data_confirmacao = models.DateTimeField(null=True, blank=True)
     observacoes = models.TextField(blank=True, null=True)
@@ -33,15 +44,26 @@ class Recarga(models.Model):
         verbose_name = 'Recarga'
         verbose_name_plural = 'Recargas'
         ordering = ['-data_recarga']
+        indexes = [
+            models.Index(fields=['data_recarga'], name='recarga_data_idx'),
+            models.Index(fields=['status', 'data_recarga'], name='recarga_status_data_idx'),
+        ]
+        constraints = [
+            # Idempotência: o mesmo pagamento do canal (Multicaixa, USSD, app) só gera uma recarga
+            models.UniqueConstraint(
+                fields=['referencia_pagamento'],
+                condition=models.Q(referencia_pagamento__isnull=False) & ~models.Q(referencia_pagamento=''),
+                name='recarga_referencia_unica',
+                violation_error_message='Já existe uma recarga com esta referência de pagamento.',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.numero_recarga} - {self.cliente.nome} - {self.valor} Kz"
     
     def save(self, *args, **kwargs):
         if not self.numero_recarga:
-            import uuid
-            codigo = str(uuid.uuid4().hex[:6]).upper()
-            self.numero_recarga = f"REC-{codigo}"
+            self.numero_recarga = series.proximo('RECARGA')
         super().save(*args, **kwargs)
 
 
@@ -65,11 +87,15 @@ class Fatura(models.Model):
     juros_mora = models.DecimalField(max_digits=10, decimal_places=2, default=0.00, help_text='Juros de mora acumulados')
     outras_taxas = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     valor_total = models.DecimalField(max_digits=10, decimal_places=2)
+    valor_pago_total = models.DecimalField(max_digits=10, decimal_places=2, default=0.00, editable=False, help_text='Soma dos pagamentos registados')
     status = models.CharField(max_length=10, choices=STATUS_FATURA_CHOICES, default='PENDENTE')
     data_emissao = models.DateField()
     data_vencimento = models.DateField()
     data_pagamento = models.DateTimeField(null=True, blank=True)
     arquivo_pdf = models.FileField(upload_to='faturas/', null=True, blank=True)
+    pdf_hash = models.CharField(max_length=64, blank=True, default='', editable=False, help_text='Impressão digital dos campos usados no PDF guardado')
+    pdf_gerado_em = models.DateTimeField(null=True, blank=True, editable=False)
+    faturacao_periodo = models.BooleanField(default=False, editable=False, help_text='Gerada pela faturação mensal (pagamentos.faturacao)')
     observacoes = models.TextField(blank=True, null=True)
     data_criacao = models.DateTimeField(auto_now_add=True)
     
@@ -77,17 +103,42 @@ class Fatura(models.Model):
         verbose_name = 'Fatura'
         verbose_name_plural = 'Faturas'
         ordering = ['-data_emissao']
+        indexes = [
+            models.Index(fields=['status', 'data_vencimento'], name='fatura_status_venc_idx'),
+            models.Index(fields=['data_emissao', 'id'], name='fatura_emissao_idx'),
+            # Faturas já emitidas num período (faturação mensal)
+            models.Index(fields=['periodo_referencia', 'cliente', 'contador'], name='fatura_periodo_idx'),
+        ]
+        constraints = [
+            # Duas execuções da faturação mensal (um worker atrasado e o seu substituto) não faturam duas vezes
+            models.UniqueConstraint(
+                fields=['cliente', 'contador', 'periodo_referencia'],
+                condition=models.Q(faturacao_periodo=True) & ~models.Q(status='CANCELADO'),
+                name='fatura_periodo_unica',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.numero_fatura} - {self.cliente.nome}"
     
+    @property
+    def saldo(self):
+        """Valor ainda em dívida."""
+        return max(self.valor_total - self.valor_pago_total, 0)
+    
+    # Campos que contam nos resumos de faturação (relatorios.resumos)
+    CAMPOS_RESUMO = ('data_emissao', 'cliente_id', 'consumo_kwh', 'valor_total')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        fatura = super().from_db(db, field_names, values)
+        fatura._resumo = _valores_resumo(fatura)
+        return fatura
+    
     def save(self, *args, **kwargs):
+        # Em lote (bulk_create) a numeração é feita com numeracao.series.atribuir
         if not self.numero_fatura:
-            import uuid
-            from datetime import datetime
-            ano = datetime.now().year
-            codigo = str(uuid.uuid4().hex[:6]).upper()
-            self.numero_fatura = f"FAT-{ano}-{codigo}"
+            self.numero_fatura = series.proximo('FATURA')
         
         if not self.consumo_kwh:
             self.consumo_kwh = self.leitura_atual - self.leitura_anterior
@@ -100,6 +151,7 @@ class Recibo(models.Model):
     cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name='recibos')
     fatura = models.ForeignKey(Fatura, on_delete=models.SET_NULL, null=True, blank=True, related_name='recibos')
     recarga = models.ForeignKey(Recarga, on_delete=models.SET_NULL, null=True, blank=True, related_name='recibos')
+    pagamento = models.OneToOneField('Pagamento', on_delete=models.SET_NULL, null=True, blank=True, related_name='recibo')
     valor = models.DecimalField(max_digits=10, decimal_places=2)
     metodo_pagamento = models.CharField(max_length=50)
     data_emissao = models.DateTimeField(auto_now_add=True)
@@ -116,11 +168,7 @@ class Recibo(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.numero_recibo:
-            import uuid
-            from datetime import datetime
-            ano = datetime.now().year
-            codigo = str(uuid.uuid4().hex[:6]).upper()
-            self.numero_recibo = f"REC-{ano}-{codigo}"
+            self.numero_recibo = series.proximo('RECIBO')
         super().save(*args, **kwargs)
 
 
@@ -142,27 +190,65 @@ class Pagamento(models.Model):
         verbose_name = 'Pagamento'
         verbose_name_plural = 'Pagamentos'
         ordering = ['-data_pagamento']
+        indexes = [
+            models.Index(fields=['data_pagamento'], name='pagamento_data_idx'),
+        ]
+        constraints = [
+            # Idempotência: a mesma referência Multicaixa só pode ser lançada uma vez
+            models.UniqueConstraint(
+                fields=['referencia_multicaixa'],
+                condition=models.Q(referencia_multicaixa__isnull=False) & ~models.Q(referencia_multicaixa=''),
+                name='pagamento_referencia_unica',
+                violation_error_message='Já existe um pagamento com esta referência Multicaixa.',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.numero_pagamento} - {self.fatura.numero_fatura} - {self.valor_pago} Kz"
     
+    # Campos que contam nos resumos de pagamentos (relatorios.resumos)
+    CAMPOS_RESUMO = ('data_pagamento', 'fatura_id', 'valor_pago')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        pagamento = super().from_db(db, field_names, values)
+        pagamento._resumo = _valores_resumo(pagamento)
+        return pagamento
+    
     def save(self, *args, **kwargs):
+        # O saldo e o estado da fatura são atualizados por pagamentos.recebimentos.registar_pagamento
         if not self.numero_pagamento:
-            import uuid
-            from datetime import datetime
-            ano = datetime.now().year
-            codigo = str(uuid.uuid4().hex[:6]).upper()
-            self.numero_pagamento = f"PAG-{ano}-{codigo}"
-        
-        # Atualizar status da fatura
-        if self.valor_pago >= self.fatura.valor_total:
-            self.fatura.status = 'PAGO'
-            self.fatura.data_pagamento = self.data_pagamento
-            self.fatura.save()
-        
+            self.numero_pagamento = series.proximo('PAGAMENTO')
         super().save(*args, **kwargs)
 
 
+class MovimentoSaldo(models.Model):
+    TIPO_CHOICES = [
+        ('RECARGA', 'Recarga'),
+        ('CONSUMO', 'Consumo'),
+        ('AJUSTE', 'Ajuste'),
+    ]
+
+    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name='movimentos_saldo')
+    tipo = models.CharField(max_length=10, choices=TIPO_CHOICES)
+    valor = models.DecimalField(max_digits=10, decimal_places=2, help_text='Positivo nos créditos, negativo nos débitos')
+    saldo_apos = models.DecimalField(max_digits=10, decimal_places=2, help_text='Saldo do cliente depois do movimento')
+    recarga = models.ForeignKey(Recarga, on_delete=models.PROTECT, null=True, blank=True, related_name='movimentos')
+    descricao = models.CharField(max_length=200, blank=True, null=True)
+    data_movimento = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Movimento de Saldo'
+        verbose_name_plural = 'Movimentos de Saldo'
+        ordering = ['-data_movimento', '-id']
+        indexes = [
+            models.Index(fields=['cliente', 'data_movimento'], name='movimento_cliente_data_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.cliente.nome} - {self.get_tipo_display()} - {self.valor} Kz"
+
+
 class Notificacao(models.Model):
     TIPO_CHOICES = [
         ('SALDO_BAIXO', 'Saldo Baixo'),
@@ -0,0 +1,335 @@
+"""
+Renderização das faturas em PDF.
+
+``renderizar_fatura`` desenha uma fatura a partir de um dicionário com os
+campos de ``CAMPOS`` (não acede à base de dados) e é usada tanto pela view
+``fatura_pdf`` como pela renderização em lote. O logótipo é lido e
+descodificado uma única vez por processo (``_logo``).
+
+``obter_pdf`` devolve o PDF guardado em ``Fatura.arquivo_pdf`` e só volta a
+renderizar quando a impressão digital dos campos usados (``CAMPOS``) deixa
+de coincidir com ``Fatura.pdf_hash``: multas, juros, estado ou dados do
+cliente alterados. A impressão digital serve também de ETag. Cada versão
+é gravada com um nome próprio e a fatura só passa a apontar para ela com
+um UPDATE condicional, pelo que dois pedidos simultâneos nunca apagam o
+ficheiro um do outro; o PDF anterior é apagado depois.
+
+``renderizar_faturas`` distribui blocos de faturas por um conjunto de
+processos (``ProcessPoolExecutor``): o processo principal lê as faturas com
+``values()``, os workers desenham e gravam os PDFs no storage e o processo
+principal grava os caminhos em ``Fatura.arquivo_pdf`` com ``bulk_update``.
+"""
+import hashlib
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import lru_cache
+from io import BytesIO
+
+import django
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.utils import timezone
+from reportlab import rl_config
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+
+from .models import Fatura
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_BLOCO = 200
+
+# Streams binários em vez de ASCII85: sem o rl_accel compilado a codificação
+# ASCII85 do logótipo (em Python puro) dominava o tempo de cada fatura.
+rl_config.useA85 = 0
+
+CAMPOS = [
+    'pk', 'numero_fatura', 'data_emissao', 'cliente__nome', 'cliente__nif', 'cliente__morada',
+    'contador__numero_serie', 'consumo_kwh', 'valor_consumo', 'multa_atraso', 'juros_mora', 'outras_taxas',
+    'valor_total', 'status',
+]
+
+# Alterar sempre que o desenho da fatura mudar, para invalidar os PDFs guardados
+VERSAO_LAYOUT = '1'
+
+_ESTADOS = dict(Fatura.STATUS_FATURA_CHOICES)
+
+
+@lru_cache(maxsize=None)
+def _logo():
+    """Logótipo já descodificado, reutilizado por todas as faturas do processo."""
+    caminho = os.path.join(settings.BASE_DIR, 'static', 'images', 'logo_iscat.png')
+    if not os.path.exists(caminho):
+        return None
+    try:
+        return ImageReader(caminho)
+    except Exception:
+        logger.warning("Erro ao carregar o logótipo das faturas", exc_info=True)
+        return None
+
+
+def dados_fatura(fatura):
+    """Dicionário com as chaves de ``CAMPOS`` para uma instância de ``Fatura``."""
+    return {
+        'pk': fatura.pk,
+        'numero_fatura': fatura.numero_fatura,
+        'data_emissao': fatura.data_emissao,
+        'cliente__nome': fatura.cliente.nome,
+        'cliente__nif': fatura.cliente.nif,
+        'cliente__morada': fatura.cliente.morada,
+        'contador__numero_serie': fatura.contador.numero_serie if fatura.contador else None,
+        'consumo_kwh': fatura.consumo_kwh,
+        'valor_consumo': fatura.valor_consumo,
+        'multa_atraso': fatura.multa_atraso,
+        'juros_mora': fatura.juros_mora,
+        'outras_taxas': fatura.outras_taxas,
+        'valor_total': fatura.valor_total,
+        'status': fatura.status,
+    }
+
+
+def desenhar_fatura(p, fatura):
+    """Desenha uma fatura (dicionário de ``CAMPOS``) numa página do canvas ``p``."""
+    width, height = A4
+
+    # Logo no canto superior direito
+    logo = _logo()
+    if logo is not None:
+        p.drawImage(logo, width - 180, height - 90, width=140, height=70, preserveAspectRatio=True)
+
+    # Cabeçalho
+    p.setFont("Helvetica-Bold", 16)
+    p.drawString(50, height - 50, "SISTEMA DE GESTÃO DE ENERGIA")
+    p.setFont("Helvetica", 12)
+    p.drawString(50, height - 70, f"Fatura: {fatura['numero_fatura']}")
+    p.drawString(50, height - 85, f"Data: {fatura['data_emissao'].strftime('%d/%m/%Y')}")
+
+    # Cliente
+    p.setFont("Helvetica-Bold", 12)
+    p.drawString(50, height - 120, "CLIENTE:")
+    p.setFont("Helvetica", 12)
+    p.drawString(50, height - 135, f"Nome: {fatura['cliente__nome']}")
+    p.drawString(50, height - 150, f"NIF: {fatura['cliente__nif']}")
+    p.drawString(50, height - 165, f"Endereço: {fatura['cliente__morada'] or 'N/A'}")
+    if fatura['contador__numero_serie']:
+        p.drawString(50, height - 180, f"Contador: {fatura['contador__numero_serie']}")
+    p.drawString(50, height - 195, f"Consumo do Mês: {fatura['consumo_kwh']} kWh")
+    p.drawString(50, height - 210, f"Valor do Consumo: {fatura['valor_consumo']} Kz")
+    p.drawString(50, height - 225, f"Estado: {_ESTADOS.get(fatura['status'], fatura['status'])}")
+
+    # Detalhes
+    y_offset = 240
+    p.line(50, height - y_offset, 550, height - y_offset)
+    p.drawString(50, height - y_offset - 20, "Descrição")
+    p.drawRightString(540, height - y_offset - 20, "Valor (Kz)")
+    p.line(50, height - y_offset - 30, 550, height - y_offset - 30)
+
+    y_desc = height - y_offset - 50
+    p.drawString(50, y_desc, f"Consumo de Energia ({fatura['consumo_kwh']} kWh)")
+    p.drawRightString(540, y_desc, f"{fatura['valor_consumo']}")
+
+    y = y_offset + 70
+    for descricao, campo in [('Taxas Adicionais', 'outras_taxas'), ('Multa por Atraso', 'multa_atraso'), ('Juros de Mora', 'juros_mora')]:
+        if fatura[campo] > 0:
+            p.drawString(50, height - y, descricao)
+            p.drawRightString(540, height - y, f"{fatura[campo]}")
+            y += 20
+
+    p.line(50, height - y, 550, height - y)
+    y += 20
+    p.setFont("Helvetica-Bold", 14)
+    p.drawString(50, height - y, "TOTAL A PAGAR")
+    p.drawRightString(540, height - y, f"{fatura['valor_total']} Kz")
+
+    # Rodapé
+    p.setFont("Helvetica-Oblique", 10)
+    p.drawCentredString(width / 2.0, 50, "Obrigado por utilizar nossos serviços.")
+    p.showPage()
+
+
+def renderizar_fatura(fatura):
+    """PDF (bytes) de uma fatura, a partir do dicionário de ``CAMPOS``."""
+    buffer = BytesIO()
+    p = canvas.Canvas(buffer, pagesize=A4)
+    desenhar_fatura(p, fatura)
+    p.save()
+    return buffer.getvalue()
+
+
+def impressao_digital(fatura):
+    """SHA-256 dos campos desenhados na fatura (e da versão do layout)."""
+    conteudo = '|'.join([VERSAO_LAYOUT] + [str(fatura[campo]) for campo in CAMPOS])
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+
+def nome_ficheiro(numero_fatura, impressao):
+    # Um nome por versão do PDF: uma nova versão nunca sobrescreve o ficheiro que outro pedido está a servir
+    return f"faturas/fatura_{numero_fatura}_{impressao[:16]}.pdf"
+
+
+def _gravar_pdf(fatura, impressao):
+    """Renderiza e grava o PDF no storage. Devolve o nome do ficheiro (o storage acrescenta um sufixo se já existir)."""
+    return default_storage.save(nome_ficheiro(fatura['numero_fatura'], impressao), ContentFile(renderizar_fatura(fatura)))
+
+
+def _apagar(nome):
+    if nome:
+        try:
+            default_storage.delete(nome)
+        except OSError:
+            logger.warning("Erro ao apagar o PDF antigo %s", nome, exc_info=True)
+
+
+def pdf_atualizado(fatura, impressao=None):
+    """Indica se o PDF guardado de ``fatura`` (instância) corresponde aos dados atuais."""
+    impressao = impressao or impressao_digital(dados_fatura(fatura))
+    return (
+        fatura.pdf_hash == impressao
+        and bool(fatura.arquivo_pdf)
+        and default_storage.exists(fatura.arquivo_pdf.name)
+    )
+
+
+def _atualizar_pdf(fatura, dados, impressao):
+    """
+    Grava um PDF novo e aponta a fatura para ele só se ninguém o tiver feito
+    entretanto (UPDATE condicional ao ficheiro e à impressão lidos); quem
+    perde apaga o seu ficheiro e fica com o do outro pedido.
+    """
+    anterior = fatura.arquivo_pdf.name or ''
+    agora = timezone.now()
+    nome = _gravar_pdf(dados, impressao)
+    lido = Q(arquivo_pdf=anterior) if anterior else Q(arquivo_pdf='') | Q(arquivo_pdf__isnull=True)
+    # update() em vez de save(): não é uma alteração da fatura (sem sinais nem resumos)
+    if Fatura.objects.filter(lido, pk=fatura.pk, pdf_hash=fatura.pdf_hash).update(
+        arquivo_pdf=nome, pdf_hash=impressao, pdf_gerado_em=agora
+    ):
+        _apagar(anterior)
+        fatura.arquivo_pdf = nome
+        fatura.pdf_hash = impressao
+        fatura.pdf_gerado_em = agora
+    else:
+        _apagar(nome)
+        fatura.refresh_from_db(fields=['arquivo_pdf', 'pdf_hash', 'pdf_gerado_em'])
+
+
+def obter_pdf(fatura, impressao=None):
+    """
+    Garante que ``fatura.arquivo_pdf`` está atualizado (renderizando só se os
+    dados mudaram) e devolve o ficheiro aberto.
+    """
+    dados = dados_fatura(fatura)
+    impressao = impressao or impressao_digital(dados)
+    if not pdf_atualizado(fatura, impressao):
+        _atualizar_pdf(fatura, dados, impressao)
+    try:
+        return fatura.arquivo_pdf.open('rb')
+    except FileNotFoundError:
+        # Substituído e apagado por outro pedido entre a leitura da fatura e a abertura
+        fatura.refresh_from_db(fields=['arquivo_pdf', 'pdf_hash', 'pdf_gerado_em'])
+        if not pdf_atualizado(fatura, impressao):
+            _atualizar_pdf(fatura, dados, impressao)
+        return fatura.arquivo_pdf.open('rb')
+
+
+def _renderizar_bloco(bloco):
+    """Executado nos workers: grava os PDFs do bloco e devolve ``[(pk, nome, impressao, anterior), ...]``."""
+    gravados = []
+    for fatura in bloco:
+        impressao = impressao_digital(fatura)
+        gravados.append((fatura['pk'], _gravar_pdf(fatura, impressao), impressao, fatura['arquivo_pdf']))
+    return gravados
+
+
+def _gravar_caminhos(gravados):
+    agora = timezone.now()
+    Fatura.objects.bulk_update(
+        [Fatura(pk=pk, arquivo_pdf=nome, pdf_hash=impressao, pdf_gerado_em=agora) for pk, nome, impressao, _ in gravados],
+        ['arquivo_pdf', 'pdf_hash', 'pdf_gerado_em'],
+        batch_size=TAMANHO_BLOCO,
+    )
+    for _, nome, _, anterior in gravados:
+        if anterior != nome:
+            _apagar(anterior)
+
+
+def _blocos(faturas, tamanho_bloco, refazer):
+    """
+    Gera ``(ignoradas, bloco)``: as faturas a renderizar de cada bloco e quantas
+    foram ignoradas por já terem o PDF em dia (nenhuma, com ``refazer``).
+    """
+    # Blocos por chave primária: cada bloco é uma consulta nova, pelo que as
+    # escritas em arquivo_pdf entre blocos não interferem com a leitura.
+    faturas = faturas.order_by('pk').values(*CAMPOS, 'pdf_hash', 'arquivo_pdf')
+    ultimo_pk = 0
+    while True:
+        linhas = list(faturas.filter(pk__gt=ultimo_pk)[:tamanho_bloco])
+        if not linhas:
+            return
+        ultimo_pk = linhas[-1]['pk']
+        bloco = [
+            fatura for fatura in linhas
+            if refazer or not fatura['arquivo_pdf'] or fatura['pdf_hash'] != impressao_digital(fatura)
+        ]
+        yield len(linhas) - len(bloco), bloco
+
+
+def renderizar_faturas(faturas, workers=None, tamanho_bloco=TAMANHO_BLOCO, refazer=False, progresso=None):
+    """
+    Renderiza as faturas de ``faturas`` (queryset) e grava-as em
+    ``arquivo_pdf``. Sem ``refazer`` são ignoradas as que já têm um PDF
+    com a impressão digital atual.
+
+    ``workers`` é o número de processos (por omissão, um por CPU); com 1 a
+    renderização corre no próprio processo. Cada fatura ocupa uma página.
+    """
+    inicio = time.monotonic()
+    workers = workers or os.cpu_count() or 1
+    total = faturas.count()
+    paginas = 0
+    ignoradas = 0
+
+    def concluido(gravados):
+        nonlocal paginas
+        _gravar_caminhos(gravados)
+        paginas += len(gravados)
+        if progresso:
+            progresso(paginas + ignoradas, total)
+
+    if workers == 1:
+        for ja_em_dia, bloco in _blocos(faturas, tamanho_bloco, refazer):
+            ignoradas += ja_em_dia
+            concluido(_renderizar_bloco(bloco))
+    else:
+        # 'spawn' para os workers não herdarem as ligações à base de dados do processo principal
+        contexto = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=contexto, initializer=django.setup) as executor:
+            pendentes = set()
+            for ja_em_dia, bloco in _blocos(faturas, tamanho_bloco, refazer):
+                ignoradas += ja_em_dia
+                if not bloco:
+                    continue
+                # Limita os blocos em memória a dois por worker
+                if len(pendentes) >= workers * 2:
+                    feitos, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+                    for futuro in feitos:
+                        concluido(futuro.result())
+                pendentes.add(executor.submit(_renderizar_bloco, bloco))
+            for futuro in wait(pendentes).done:
+                concluido(futuro.result())
+
+    duracao = time.monotonic() - inicio
+    return {
+        'faturas': total,
+        'paginas': paginas,
+        'ignoradas': ignoradas,
+        'workers': workers,
+        'duracao': duracao,
+        'paginas_por_segundo': paginas / duracao if duracao > 0 else 0,
+    }
@@ -0,0 +1,194 @@
+"""
+Recargas dos clientes pré-pagos e conta-corrente do saldo.
+
+O saldo do cliente (``Cliente.saldo_atual``) só muda através de
+``lancar_movimento``: cada crédito ou débito é uma atualização com ``F()``
+feita pela base de dados (sem ler, somar e gravar em Python, pelo que
+recargas simultâneas do mesmo cliente não se perdem) e fica registado em
+``MovimentoSaldo`` com o saldo resultante.
+
+As mudanças de estado são atualizações condicionais, que só alteram a linha
+se ela ainda estiver no estado esperado: uma recarga só é confirmada (e o
+saldo creditado) uma vez e um cartão de recarga só é resgatado uma vez,
+mesmo com pedidos concorrentes e sem bloqueios explícitos.
+
+Tal como nos pagamentos de faturas, a referência de pagamento do canal só
+gera uma recarga: repetir o pedido devolve a recarga já registada.
+"""
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from clientes.models import Cliente
+from equipamentos.models import CartaoRecarga
+from relatorios import metricas
+from .models import MovimentoSaldo, Recarga, Recibo
+
+
+class RecargaInvalida(ValueError):
+    pass
+
+
+def lancar_movimento(cliente_id, valor, tipo, recarga=None, descricao=None):
+    """
+    Soma ``valor`` (negativo nos débitos) ao saldo do cliente e regista o
+    movimento na conta-corrente. Devolve o ``MovimentoSaldo``.
+    """
+    with transaction.atomic():
+        if not Cliente.objects.filter(pk=cliente_id).update(saldo_atual=F('saldo_atual') + valor):
+            raise RecargaInvalida('Cliente inexistente.')
+        # A atualização deixa a linha do cliente bloqueada até ao fim da transação
+        saldo = Cliente.objects.filter(pk=cliente_id).values_list('saldo_atual', flat=True).get()
+        return MovimentoSaldo.objects.create(
+            cliente_id=cliente_id, tipo=tipo, valor=valor, saldo_apos=saldo, recarga=recarga, descricao=descricao,
+        )
+
+
+def _validar_cliente(cliente_id):
+    tipo_cliente = Cliente.objects.filter(pk=cliente_id).values_list('tipo_cliente', flat=True).first()
+    if tipo_cliente is None:
+        raise RecargaInvalida('Cliente inexistente.')
+    if tipo_cliente != 'PRE_PAGO':
+        raise RecargaInvalida('Só os clientes pré-pagos podem fazer recargas.')
+
+
+def _creditar(recarga):
+    """Credita no saldo uma recarga acabada de confirmar e emite o recibo."""
+    lancar_movimento(recarga.cliente_id, recarga.valor, 'RECARGA', recarga=recarga, descricao=f'Recarga {recarga.numero_recarga}')
+    Recibo.objects.create(
+        cliente_id=recarga.cliente_id,
+        recarga=recarga,
+        valor=recarga.valor,
+        metodo_pagamento=recarga.metodo_pagamento,
+    )
+
+
+def _recarga_existente(referencia, cliente_id):
+    existente = Recarga.objects.filter(referencia_pagamento=referencia).first()
+    if existente and existente.cliente_id != cliente_id:
+        raise RecargaInvalida(f'A referência {referencia} já foi usada na recarga {existente.numero_recarga}.')
+    return existente
+
+
+def registar_recarga(cliente_id, valor, metodo_pagamento, referencia_pagamento=None, observacoes=None, confirmar=True):
+    """
+    Regista uma recarga do cliente. Com ``confirmar`` (pagamento já garantido
+    pelo canal) a recarga fica logo confirmada e o saldo creditado; sem ele
+    fica pendente até ``confirmar_recarga``.
+
+    Devolve ``(recarga, criada)``; ``criada`` é falso quando a referência de
+    pagamento já tinha sido registada para este cliente.
+    """
+    valor = Decimal(valor)
+    if valor <= 0:
+        raise RecargaInvalida('O valor da recarga tem de ser positivo.')
+    if metodo_pagamento not in dict(Recarga.METODO_PAGAMENTO_CHOICES):
+        raise RecargaInvalida(f'Método de pagamento inválido: {metodo_pagamento}.')
+    if metodo_pagamento == 'CARTAO':
+        raise RecargaInvalida('As recargas por cartão são feitas com o código do cartão.')
+    referencia = (referencia_pagamento or '').strip() or None
+    if referencia:
+        existente = _recarga_existente(referencia, cliente_id)
+        if existente:
+            return existente, False
+    _validar_cliente(cliente_id)
+
+    try:
+        with transaction.atomic():
+            recarga = Recarga.objects.create(
+                cliente_id=cliente_id,
+                valor=valor,
+                metodo_pagamento=metodo_pagamento,
+                status='CONFIRMADO' if confirmar else 'PENDENTE',
+                referencia_pagamento=referencia,
+                data_confirmacao=timezone.now() if confirmar else None,
+                observacoes=observacoes,
+            )
+            if confirmar:
+                _creditar(recarga)
+    except IntegrityError:
+        # Outro pedido com a mesma referência foi gravado entretanto
+        existente = _recarga_existente(referencia, cliente_id) if referencia else None
+        if existente is None:
+            raise
+        return existente, False
+    return recarga, True
+
+
+def confirmar_recarga(recarga_id):
+    """
+    Confirma uma recarga pendente e credita o saldo. Devolve
+    ``(recarga, confirmada)``; ``confirmada`` é falso se já estava confirmada.
+    """
+    agora = timezone.now()
+    with transaction.atomic():
+        confirmada = Recarga.objects.filter(pk=recarga_id, status='PENDENTE').update(status='CONFIRMADO', data_confirmacao=agora)
+        recarga = Recarga.objects.filter(pk=recarga_id).first()
+        if recarga is None:
+            raise RecargaInvalida('Recarga inexistente.')
+        if confirmada:
+            _creditar(recarga)
+    if recarga.status == 'CANCELADO':
+        raise RecargaInvalida(f'A recarga {recarga.numero_recarga} está cancelada.')
+    if confirmada:
+        # update() não emite post_save
+        metricas.invalidar('recargas')
+    return recarga, bool(confirmada)
+
+
+def cancelar_recarga(recarga_id):
+    """
+    Cancela uma recarga pendente. Devolve ``(recarga, cancelada)``; levanta
+    ``RecargaInvalida`` se a recarga já tiver sido confirmada.
+    """
+    cancelada = Recarga.objects.filter(pk=recarga_id, status='PENDENTE').update(status='CANCELADO')
+    recarga = Recarga.objects.filter(pk=recarga_id).first()
+    if recarga is None:
+        raise RecargaInvalida('Recarga inexistente.')
+    if recarga.status == 'CONFIRMADO':
+        raise RecargaInvalida(f'A recarga {recarga.numero_recarga} já foi confirmada e creditada.')
+    if cancelada:
+        metricas.invalidar('recargas')
+    return recarga, bool(cancelada)
+
+
+def _motivo_cartao(codigo):
+    estado = CartaoRecarga.objects.filter(codigo_cartao=codigo).values_list('status', flat=True).first()
+    if estado is None:
+        return 'Código de cartão de recarga inválido.'
+    if estado == 'USADO':
+        return 'Este cartão de recarga já foi utilizado.'
+    if estado == 'CANCELADO':
+        return 'Este cartão de recarga foi cancelado.'
+    return 'Este cartão de recarga expirou.'
+
+
+def resgatar_cartao(codigo_cartao, cliente_id):
+    """
+    Resgata o cartão de recarga ``codigo_cartao`` para o cliente: marca o
+    cartão como usado (uma única atualização condicional, pelo que o mesmo
+    cartão nunca é resgatado duas vezes) e regista a recarga confirmada.
+    Devolve a ``Recarga``.
+    """
+    codigo = (codigo_cartao or '').strip()
+    _validar_cliente(cliente_id)
+    agora = timezone.now()
+    with transaction.atomic():
+        resgatado = CartaoRecarga.objects.filter(
+            codigo_cartao=codigo, status='ATIVO', data_expiracao__gt=agora,
+        ).update(status='USADO', data_uso=agora, cliente_uso_id=cliente_id)
+        if not resgatado:
+            raise RecargaInvalida(_motivo_cartao(codigo))
+        cartao_id, valor = CartaoRecarga.objects.filter(codigo_cartao=codigo).values_list('pk', 'valor').get()
+        recarga = Recarga.objects.create(
+            cliente_id=cliente_id,
+            valor=valor,
+            metodo_pagamento='CARTAO',
+            status='CONFIRMADO',
+            cartao_id=cartao_id,
+            data_confirmacao=agora,
+        )
+        _creditar(recarga)
+    return recarga
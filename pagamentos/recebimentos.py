@@ -0,0 +1,96 @@
+"""
+Lançamento de pagamentos de faturas.
+
+Cada pagamento é lançado numa transação que bloqueia a fatura
+(``select_for_update``), pelo que dois caixas a pagar a mesma fatura são
+serializados: o segundo já vê o saldo atualizado pelo primeiro. O total pago
+fica em ``Fatura.valor_pago_total`` (pagamentos parciais somam-se), a fatura
+passa a PAGO quando o saldo chega a zero e o recibo é emitido na mesma
+transação.
+
+Uma referência Multicaixa só é lançada uma vez: repetir o lançamento devolve o
+pagamento já existente em vez de o contar de novo (há também uma restrição
+única na base de dados para os lançamentos concorrentes).
+"""
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import Fatura, Pagamento, Recibo
+
+# Valor em dívida de cada fatura, para as agregações (Sum(SALDO))
+SALDO = F('valor_total') - F('valor_pago_total')
+
+
+class PagamentoInvalido(ValueError):
+    pass
+
+
+def _pagamento_existente(referencia, fatura_id):
+    existente = Pagamento.objects.filter(referencia_multicaixa=referencia).first()
+    if existente and existente.fatura_id != fatura_id:
+        raise PagamentoInvalido(f'A referência {referencia} já foi usada no pagamento {existente.numero_pagamento}.')
+    return existente
+
+
+def _lancar(fatura_id, valor_pago, metodo_pagamento, referencia, observacoes):
+    with transaction.atomic():
+        fatura = Fatura.objects.select_for_update().get(pk=fatura_id)
+        if referencia:
+            existente = _pagamento_existente(referencia, fatura.pk)
+            if existente:
+                return existente, False
+        if fatura.status == 'PAGO':
+            raise PagamentoInvalido(f'A fatura {fatura.numero_fatura} já está paga.')
+        if fatura.status == 'CANCELADO':
+            raise PagamentoInvalido(f'A fatura {fatura.numero_fatura} está cancelada.')
+        if valor_pago > fatura.saldo:
+            raise PagamentoInvalido(f'O valor pago ({valor_pago} Kz) excede o saldo em dívida ({fatura.saldo} Kz).')
+
+        pagamento = Pagamento.objects.create(
+            fatura=fatura,
+            valor_pago=valor_pago,
+            metodo_pagamento=metodo_pagamento,
+            referencia_multicaixa=referencia,
+            observacoes=observacoes,
+        )
+        fatura.valor_pago_total += valor_pago
+        campos = ['valor_pago_total']
+        if fatura.saldo == 0:
+            fatura.status = 'PAGO'
+            fatura.data_pagamento = pagamento.data_pagamento
+            campos += ['status', 'data_pagamento']
+        fatura.save(update_fields=campos)
+
+        Recibo.objects.create(
+            cliente_id=fatura.cliente_id,
+            fatura=fatura,
+            pagamento=pagamento,
+            valor=valor_pago,
+            metodo_pagamento=metodo_pagamento,
+        )
+    return pagamento, True
+
+
+def registar_pagamento(fatura_id, valor_pago, metodo_pagamento, referencia_multicaixa=None, observacoes=None):
+    """
+    Lança um pagamento (total ou parcial) na fatura ``fatura_id``.
+
+    Devolve ``(pagamento, criado)``; ``criado`` é falso quando a referência
+    Multicaixa já tinha sido lançada nesta fatura. Levanta
+    ``PagamentoInvalido`` se a fatura já estiver paga ou cancelada, se o
+    valor exceder o saldo ou se a referência pertencer a outra fatura.
+    """
+    valor_pago = Decimal(valor_pago)
+    if valor_pago <= 0:
+        raise PagamentoInvalido('O valor pago tem de ser positivo.')
+    referencia = (referencia_multicaixa or '').strip() or None
+    try:
+        return _lancar(fatura_id, valor_pago, metodo_pagamento, referencia, observacoes)
+    except IntegrityError:
+        # Outro lançamento com a mesma referência foi gravado entretanto
+        existente = _pagamento_existente(referencia, fatura_id) if referencia else None
+        if existente is None:
+            raise
+        return existente, False
@@ -0,0 +1,310 @@
+"""
+Conciliação em lote dos ficheiros de liquidação Multicaixa / bancários.
+
+No início é carregado, numa única consulta, um índice em memória das faturas
+em aberto (PENDENTE e VENCIDO), por número de fatura e por cliente. O
+ficheiro é lido em fluxo, por blocos de linhas; em cada bloco:
+
+* as faturas candidatas são bloqueadas (``select_for_update``) e o índice é
+  atualizado com o saldo bloqueado, para contar com os pagamentos lançados
+  entretanto nos caixas;
+* cada linha é associada a uma fatura: pelo número da fatura ou, na falta
+  dele, pela fatura em aberto mais antiga do cliente (de preferência a que
+  tiver saldo igual ao valor pago);
+* os pagamentos e recibos são gravados com ``bulk_create`` e os totais das
+  faturas com atualizações agrupadas, numa única transação.
+
+Tal como em ``recebimentos.registar_pagamento``, uma referência Multicaixa só
+é lançada uma vez: voltar a importar o mesmo ficheiro não duplica pagamentos
+(as linhas já lançadas são apenas contadas). As restantes linhas que não
+podem ser lançadas (fatura desconhecida ou já paga, valor inválido ou acima
+do saldo, referência repetida) são devolvidas como exceções, com o motivo.
+
+Formatos aceites:
+
+* CSV com cabeçalho: ``referencia,valor`` e ``fatura`` (número da fatura)
+  e/ou ``cliente`` (número do cliente), opcionalmente ``data``;
+* largura fixa (``LAYOUT_FIXO``), com o valor em cêntimos e a data em
+  AAAAMMDD.
+"""
+import csv
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from numeracao import series
+from relatorios import metricas, resumos
+from .models import Fatura, Pagamento, Recibo
+
+TAMANHO_BLOCO = 1000
+MAX_EXCECOES = 1000  # exceções devolvidas em detalhe (as restantes são apenas contadas)
+COLUNAS_OBRIGATORIAS = {'referencia', 'valor'}
+ESTADOS_EM_ABERTO = ('PENDENTE', 'VENCIDO')
+
+# Registo de largura fixa: (campo, início, fim), posições a contar de 0
+LAYOUT_FIXO = [
+    ('referencia', 0, 20),
+    ('fatura', 20, 40),
+    ('cliente', 40, 52),
+    ('valor', 52, 67),
+    ('data', 67, 75),
+]
+
+
+class FormatoInvalido(ValueError):
+    pass
+
+
+def _indice():
+    """Faturas em aberto, por número de fatura e por cliente (mais antigas primeiro)."""
+    por_numero = {}
+    por_cliente = {}
+    faturas = (
+        Fatura.objects.filter(status__in=ESTADOS_EM_ABERTO)
+        .order_by('data_vencimento', 'id')
+        .values_list('id', 'numero_fatura', 'cliente__numero_cliente', 'cliente_id', 'valor_total', 'valor_pago_total')
+    )
+    for pk, numero, numero_cliente, cliente_id, valor_total, valor_pago_total in faturas.iterator(chunk_size=5000):
+        entrada = {
+            'id': pk, 'numero': numero, 'cliente_id': cliente_id,
+            'valor_total': valor_total, 'valor_pago_total': valor_pago_total, 'aberta': True,
+        }
+        por_numero[numero] = entrada
+        por_cliente.setdefault(numero_cliente, []).append(entrada)
+    return por_numero, por_cliente
+
+
+def _linhas_csv(ficheiro, delimitador):
+    leitor = csv.DictReader(ficheiro, delimiter=delimitador)
+    colunas = {coluna.strip() for coluna in leitor.fieldnames or []}
+    if not COLUNAS_OBRIGATORIAS <= colunas or not colunas & {'fatura', 'cliente'}:
+        raise FormatoInvalido('O ficheiro tem de ter as colunas referencia, valor e fatura e/ou cliente.')
+    leitor.fieldnames = [coluna.strip() for coluna in leitor.fieldnames]
+    # A linha 1 é o cabeçalho
+    for numero_linha, linha in enumerate(leitor, start=2):
+        yield numero_linha, {campo: (valor or '').strip() for campo, valor in linha.items() if campo}
+
+
+def _linhas_fixas(ficheiro):
+    for numero_linha, registo in enumerate(ficheiro, start=1):
+        registo = registo.rstrip('\r\n')
+        if not registo.strip():
+            continue
+        linha = {campo: registo[inicio:fim].strip() for campo, inicio, fim in LAYOUT_FIXO}
+        if linha['valor'].isdigit():
+            linha['valor'] = str(Decimal(linha['valor']) / 100)
+        yield numero_linha, linha
+
+
+def _valor(texto):
+    try:
+        valor = Decimal(texto.replace(',', '.'))
+    except InvalidOperation:
+        return None
+    if not valor.is_finite() or valor <= 0 or valor != valor.quantize(Decimal('0.01')):
+        return None
+    return valor
+
+
+def _saldo(entrada):
+    return entrada['valor_total'] - entrada['valor_pago_total'] if entrada['aberta'] else Decimal('0')
+
+
+def _candidatas(linha, por_numero, por_cliente):
+    if linha.get('fatura'):
+        entrada = por_numero.get(linha['fatura'])
+        return [entrada] if entrada else []
+    return por_cliente.get(linha.get('cliente'), [])
+
+
+def _bloquear(entradas):
+    """Bloqueia as faturas do bloco e atualiza o índice com os valores bloqueados."""
+    por_id = {entrada['id']: entrada for entrada in entradas}
+    bloqueadas = (
+        Fatura.objects.select_for_update()
+        .filter(pk__in=por_id)
+        .values_list('id', 'valor_total', 'valor_pago_total', 'status')
+    )
+    for pk, valor_total, valor_pago_total, status in bloqueadas:
+        por_id.pop(pk).update(valor_total=valor_total, valor_pago_total=valor_pago_total, aberta=status in ESTADOS_EM_ABERTO)
+    for entrada in por_id.values():
+        entrada['aberta'] = False  # apagada entretanto
+
+
+def _associar(linha, valor, candidatas):
+    """Fatura em que a linha é lançada, ou ``(None, motivo)``."""
+    abertas = [entrada for entrada in candidatas if _saldo(entrada) > 0]
+    if linha.get('fatura'):
+        if not abertas:
+            return None, 'Fatura inexistente, já paga ou cancelada'
+        entrada = abertas[0]
+    else:
+        if not abertas:
+            return None, 'Cliente sem faturas em aberto'
+        entrada = next((e for e in abertas if _saldo(e) == valor), abertas[0])
+    if valor > _saldo(entrada):
+        return None, f'O valor pago ({valor} Kz) excede o saldo em dívida de {entrada["numero"]} ({_saldo(entrada)} Kz)'
+    return entrada, None
+
+
+def _gravar_bloco(bloco, indice, vistas, agora, resultado):
+    """
+    Concilia e grava um bloco de ``(numero_linha, linha)``; acumula os totais
+    em ``resultado``. ``vistas`` são as referências dos blocos anteriores.
+    """
+    por_numero, por_cliente = indice
+    excecoes = []
+    pagamentos = []
+    recibos = []
+
+    with transaction.atomic():
+        referencias = {linha['referencia'] for _, linha in bloco if linha.get('referencia')}
+        lancadas = set(
+            Pagamento.objects.filter(referencia_multicaixa__in=referencias)
+            .values_list('referencia_multicaixa', flat=True)
+        )
+        _bloquear({id(e): e for _, linha in bloco for e in _candidatas(linha, por_numero, por_cliente)}.values())
+
+        no_bloco = set()
+        ja_lancadas = 0
+        alteradas = {}  # fatura -> valor pago antes do bloco
+        por_id = {}
+        for numero_linha, linha in bloco:
+            referencia = linha.get('referencia')
+            if not referencia:
+                excecoes.append((numero_linha, linha, 'Referência em falta'))
+                continue
+            if referencia in vistas or referencia in no_bloco:
+                excecoes.append((numero_linha, linha, 'Referência repetida no ficheiro'))
+                continue
+            if referencia in lancadas:
+                ja_lancadas += 1
+                continue
+            valor = _valor(linha.get('valor') or '')
+            if valor is None:
+                excecoes.append((numero_linha, linha, f"Valor inválido: {linha.get('valor')!r}"))
+                continue
+            if not linha.get('fatura') and not linha.get('cliente'):
+                excecoes.append((numero_linha, linha, 'Sem número de fatura nem de cliente'))
+                continue
+            entrada, motivo = _associar(linha, valor, _candidatas(linha, por_numero, por_cliente))
+            if entrada is None:
+                excecoes.append((numero_linha, linha, motivo))
+                continue
+
+            no_bloco.add(referencia)
+            observacoes = f"Conciliação Multicaixa ({linha['data']})" if linha.get('data') else 'Conciliação Multicaixa'
+            pagamento = Pagamento(
+                fatura_id=entrada['id'],
+                valor_pago=valor,
+                metodo_pagamento='MULTICAIXA',
+                referencia_multicaixa=referencia,
+                observacoes=observacoes,
+            )
+            pagamentos.append(pagamento)
+            recibos.append(Recibo(
+                cliente_id=entrada['cliente_id'],
+                fatura_id=entrada['id'],
+                pagamento=pagamento,
+                valor=valor,
+                metodo_pagamento='MULTICAIXA',
+            ))
+            # Várias linhas da mesma fatura no ficheiro somam-se
+            alteradas.setdefault(entrada['id'], entrada['valor_pago_total'])
+            por_id[entrada['id']] = entrada
+            entrada['valor_pago_total'] += valor
+
+        series.atribuir(pagamentos, 'numero_pagamento', 'PAGAMENTO')
+        Pagamento.objects.bulk_create(pagamentos)
+        series.atribuir(recibos, 'numero_recibo', 'RECIBO')
+        Recibo.objects.bulk_create(recibos)
+
+        # As faturas estão bloqueadas: as liquidadas fecham-se numa única atualização
+        # e as restantes somam o valor pago, agrupadas pelo valor (em vez de um
+        # bulk_update com um CASE por fatura)
+        pagas = []
+        parciais = {}
+        for pk, valor_pago_antes in alteradas.items():
+            entrada = por_id[pk]
+            if _saldo(entrada) == 0:
+                entrada['aberta'] = False
+                pagas.append(pk)
+            else:
+                parciais.setdefault(entrada['valor_pago_total'] - valor_pago_antes, []).append(pk)
+        Fatura.objects.filter(pk__in=pagas).update(valor_pago_total=F('valor_total'), status='PAGO', data_pagamento=agora)
+        for valor, pks in parciais.items():
+            Fatura.objects.filter(pk__in=pks).update(valor_pago_total=F('valor_pago_total') + valor)
+
+    vistas |= no_bloco
+    resultado['conciliadas'] += len(pagamentos)
+    resultado['valor_conciliado'] += sum((pagamento.valor_pago for pagamento in pagamentos), Decimal('0'))
+    resultado['faturas_pagas'] += len(pagas)
+    resultado['ja_lancadas'] += ja_lancadas
+    resultado['excecoes'] += len(excecoes)
+    for numero_linha, linha, motivo in excecoes[:MAX_EXCECOES - len(resultado['lista_excecoes'])]:
+        resultado['lista_excecoes'].append({
+            'linha': numero_linha,
+            'referencia': linha.get('referencia', ''),
+            'fatura': linha.get('fatura', ''),
+            'cliente': linha.get('cliente', ''),
+            'valor': linha.get('valor', ''),
+            'motivo': motivo,
+        })
+
+
+def _gravar(bloco, indice, vistas, agora, resultado):
+    try:
+        _gravar_bloco(bloco, indice, vistas, agora, resultado)
+    except IntegrityError:
+        # Uma referência do bloco foi lançada entretanto noutro sítio (restrição única):
+        # o bloco foi revertido e é repetido linha a linha, que a deteta como já lançada
+        if len(bloco) == 1:
+            raise
+        for item in bloco:
+            _gravar([item], indice, vistas, agora, resultado)
+
+
+def conciliar(ficheiro, formato='csv', tamanho_bloco=TAMANHO_BLOCO, delimitador=',', progresso=None):
+    """
+    Concilia o ficheiro de liquidação ``ficheiro`` (objeto de texto ou
+    iterável de linhas) no ``formato`` 'csv' ou 'fixo'. ``progresso``, se
+    indicado, é chamado como ``progresso(linhas)`` após cada bloco. Devolve um
+    dicionário com o resumo e a lista das exceções.
+    """
+    inicio = time.monotonic()
+    agora = timezone.now()
+    linhas = _linhas_fixas(ficheiro) if formato == 'fixo' else _linhas_csv(ficheiro, delimitador)
+    indice = _indice()
+    vistas = set()
+
+    resultado = {
+        'linhas': 0, 'conciliadas': 0, 'valor_conciliado': Decimal('0'), 'faturas_pagas': 0,
+        'ja_lancadas': 0, 'excecoes': 0, 'lista_excecoes': [],
+    }
+    bloco = []
+    for item in linhas:
+        bloco.append(item)
+        if len(bloco) >= tamanho_bloco:
+            _gravar(bloco, indice, vistas, agora, resultado)
+            resultado['linhas'] += len(bloco)
+            bloco = []
+            if progresso:
+                progresso(resultado['linhas'])
+    if bloco:
+        _gravar(bloco, indice, vistas, agora, resultado)
+        resultado['linhas'] += len(bloco)
+        if progresso:
+            progresso(resultado['linhas'])
+
+    # bulk_create/bulk_update não emitem post_save
+    if resultado['conciliadas']:
+        metricas.invalidar('faturas')
+        resumos.marcar('pagamentos', timezone.localdate(agora))
+
+    duracao = time.monotonic() - inicio
+    resultado['duracao'] = duracao
+    resultado['linhas_por_segundo'] = resultado['linhas'] / duracao if duracao > 0 else 0
+    return resultado
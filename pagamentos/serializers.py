@@ -0,0 +1,54 @@
+from decimal import Decimal
+from energia_gestao.api import CamposSerializer
+from rest_framework import serializers
+from .models import Fatura, MovimentoSaldo, Pagamento, Recarga
+
+class FaturaSerializer(CamposSerializer):
+    cliente_nome = serializers.CharField(source='cliente.nome', read_only=True)
+    contador_numero_serie = serializers.CharField(source='contador.numero_serie', read_only=True, default=None)
+    pagamentos = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+
+    class Meta:
+        model = Fatura
+        fields = ['id', 'numero_fatura', 'cliente', 'cliente_nome', 'contador', 'contador_numero_serie',
+                  'periodo_referencia', 'leitura_anterior', 'leitura_atual', 'consumo_kwh', 'valor_consumo',
+                  'multa_atraso', 'juros_mora', 'outras_taxas', 'valor_total', 'valor_pago_total', 'status', 'data_emissao',
+                  'data_vencimento', 'data_pagamento', 'pagamentos']
+
+class PagamentoSerializer(CamposSerializer):
+    fatura_numero = serializers.CharField(source='fatura.numero_fatura', read_only=True)
+    cliente = serializers.IntegerField(source='fatura.cliente_id', read_only=True)
+
+    class Meta:
+        model = Pagamento
+        fields = ['id', 'numero_pagamento', 'fatura', 'fatura_numero', 'cliente', 'valor_pago', 'metodo_pagamento',
+                  'referencia_multicaixa', 'data_pagamento']
+
+class RecargaSerializer(CamposSerializer):
+    cliente_nome = serializers.CharField(source='cliente.nome', read_only=True)
+
+    class Meta:
+        model = Recarga
+        fields = ['id', 'numero_recarga', 'cliente', 'cliente_nome', 'valor', 'metodo_pagamento', 'status',
+                  'referencia_pagamento', 'data_recarga', 'data_confirmacao']
+
+class NovaRecargaSerializer(serializers.Serializer):
+    cliente = serializers.IntegerField(source='cliente_id')
+    valor = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'))
+    metodo_pagamento = serializers.ChoiceField(
+        choices=[escolha for escolha in Recarga.METODO_PAGAMENTO_CHOICES if escolha[0] != 'CARTAO']
+    )
+    referencia_pagamento = serializers.CharField(max_length=100, required=False, allow_blank=True, allow_null=True)
+    observacoes = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    confirmar = serializers.BooleanField(default=True)
+
+class ResgateCartaoSerializer(serializers.Serializer):
+    cliente = serializers.IntegerField(source='cliente_id')
+    codigo_cartao = serializers.CharField(max_length=20)
+
+class MovimentoSaldoSerializer(CamposSerializer):
+    recarga_numero = serializers.CharField(source='recarga.numero_recarga', read_only=True, default=None)
+
+    class Meta:
+        model = MovimentoSaldo
+        fields = ['id', 'cliente', 'tipo', 'valor', 'saldo_apos', 'recarga', 'recarga_numero', 'descricao', 'data_movimento']
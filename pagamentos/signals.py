@@ -0,0 +1,14 @@
+"""Invalidação das tarifas compiladas (``pagamentos.tarifacao``) quando uma tarifa, um escalão ou um período muda."""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import tarifacao
+from .tarifa_models import EscalaoTarifa, PeriodoHorario, Tarifa
+
+
+@receiver([post_save, post_delete], sender=Tarifa)
+@receiver([post_save, post_delete], sender=EscalaoTarifa)
+@receiver([post_save, post_delete], sender=PeriodoHorario)
+def invalidar_tarifas(sender, **kwargs):
+    # Na mesma transação: os outros processos veem a nova versão ao mesmo tempo que as novas tarifas
+    tarifacao.invalidar()
@@ -0,0 +1,45 @@
+"""Processos de pagamentos executados pelo worker (``manage.py processar_fila``)."""
+import io
+
+from django.core.files.storage import default_storage
+
+from processamento.fila import tarefa
+from .cobranca import processar_devedores
+from .faturacao import gerar_faturas_periodo
+from .reconciliacao import conciliar
+
+EXCECOES_NO_RESULTADO = 100
+
+
+@tarefa('GERAR_FATURAS')
+def gerar_faturas(processo):
+    resultado = gerar_faturas_periodo(progresso=processo.atualizar_progresso)
+    resultado['duracao'] = round(resultado['duracao'], 2)
+    return resultado
+
+
+@tarefa('SUSPENDER_DEVEDORES')
+def suspender_devedores(processo):
+    resultado = processar_devedores(progresso=processo.atualizar_progresso)
+    resultado['duracao'] = round(resultado['duracao'], 2)
+    return resultado
+
+
+@tarefa('CONCILIAR_PAGAMENTOS')
+def conciliar_pagamentos(processo, ficheiro, formato='csv', delimitador=','):
+    with default_storage.open(ficheiro, 'rb') as binario:
+        texto = io.TextIOWrapper(binario, encoding='utf-8-sig', newline='')
+        resultado = conciliar(
+            texto,
+            formato=formato,
+            delimitador=delimitador,
+            progresso=processo.atualizar_progresso,
+        )
+    # Só depois do sucesso: com erro o ficheiro fica para o processo ser relançado
+    # (processamento.fila.relancar; os esquecidos são apagados por limpar_ficheiros)
+    default_storage.delete(ficheiro)
+    resultado['lista_excecoes'] = resultado['lista_excecoes'][:EXCECOES_NO_RESULTADO]
+    resultado['valor_conciliado'] = str(resultado['valor_conciliado'])
+    resultado['duracao'] = round(resultado['duracao'], 2)
+    resultado['linhas_por_segundo'] = round(resultado['linhas_por_segundo'], 1)
+    return resultado
@@ -1,5 +1,8 @@
+from django.core.exceptions import ValidationError
 from django.db import models
 
+from equipamentos.intervalos import INTERVALO_MINUTOS
+
 class Tarifa(models.Model):
     TIPO_TARIFA_CHOICES = [
         ('DOMESTICA', 'Doméstica'),
@@ -23,3 +26,78 @@ class Tarifa(models.Model):
 
     def __str__(self):
         return f"{self.nome} ({self.preco_kwh} Kz/kWh)"
+
+
+class EscalaoTarifa(models.Model):
+    """
+    Escalão de consumo de uma tarifa (tarifa por blocos): os kWh do mês até
+    ``limite_kwh`` que excedam o escalão anterior são cobrados a
+    ``preco_kwh``. O consumo acima do último escalão paga o preço base da
+    tarifa; um escalão sem limite cobre todo o consumo restante.
+    """
+    tarifa = models.ForeignKey(Tarifa, on_delete=models.CASCADE, related_name='escaloes')
+    limite_kwh = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, help_text="Limite superior do escalão em kWh (vazio = sem limite)")
+    preco_kwh = models.DecimalField(max_digits=10, decimal_places=2, help_text="Preço por kWh neste escalão em Kz")
+
+    class Meta:
+        verbose_name = 'Escalão de Tarifa'
+        verbose_name_plural = 'Escalões de Tarifa'
+        ordering = ['tarifa', 'limite_kwh']
+        constraints = [
+            models.UniqueConstraint(fields=['tarifa', 'limite_kwh'], name='escalao_tarifa_limite_unico'),
+        ]
+
+    def __str__(self):
+        limite = f"até {self.limite_kwh} kWh" if self.limite_kwh is not None else "sem limite"
+        return f"{self.tarifa.nome}: {limite} a {self.preco_kwh} Kz/kWh"
+
+
+class PeriodoHorario(models.Model):
+    """
+    Período horário de uma tarifa bi/tri-horária: a energia consumida entre
+    ``hora_inicio`` e ``hora_fim`` (exclusive; um fim anterior ao início
+    passa a meia-noite) é cobrada a ``preco_kwh``. Só se aplica aos
+    contadores com telecontagem, que têm o consumo de cada intervalo; as
+    horas sem período pagam o preço base da tarifa.
+    """
+    NOME_CHOICES = [
+        ('PONTA', 'Ponta'),
+        ('CHEIA', 'Cheia'),
+        ('VAZIO', 'Vazio'),
+    ]
+
+    tarifa = models.ForeignKey(Tarifa, on_delete=models.CASCADE, related_name='periodos')
+    nome = models.CharField(max_length=10, choices=NOME_CHOICES)
+    hora_inicio = models.TimeField()
+    hora_fim = models.TimeField()
+    preco_kwh = models.DecimalField(max_digits=10, decimal_places=2, help_text="Preço por kWh neste período em Kz")
+
+    class Meta:
+        verbose_name = 'Período Horário'
+        verbose_name_plural = 'Períodos Horários'
+        ordering = ['tarifa', 'hora_inicio']
+
+    def clean(self):
+        # O consumo de cada período é somado por intervalos de telecontagem
+        for hora in (self.hora_inicio, self.hora_fim):
+            if hora and (hora.minute % INTERVALO_MINUTOS or hora.second or hora.microsecond):
+                raise ValidationError(f'As horas dos períodos têm de ser múltiplos de {INTERVALO_MINUTOS} minutos.')
+
+    def __str__(self):
+        return f"{self.tarifa.nome}: {self.get_nome_display()} {self.hora_inicio:%H:%M}-{self.hora_fim:%H:%M}"
+
+
+class VersaoTarifas(models.Model):
+    """
+    Linha única com a versão das tarifas: muda na mesma transação que grava
+    uma tarifa, um escalão ou um período, e cada processo recompila as suas
+    tarifas quando a lê diferente (``pagamentos.tarifacao``).
+    """
+    versao = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Versão das Tarifas'
+        verbose_name_plural = 'Versão das Tarifas'
+
+    def __str__(self):
+        return f"Tarifas v{self.versao}"
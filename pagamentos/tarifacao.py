@@ -0,0 +1,217 @@
+"""
+Cálculo do valor das faturas a partir das tarifas.
+
+Todas as faturas (geração em lote, importação de leituras, registo de
+leitura de um contador e fatura manual) são valorizadas aqui, com a mesma
+regra:
+
+* consumo: os kWh a ``Tarifa.preco_kwh`` ou, nas tarifas por escalões
+  (``EscalaoTarifa``), cada bloco de kWh ao preço do seu escalão; nas
+  tarifas com períodos horários (``PeriodoHorario``) e quando há consumo por
+  intervalo (telecontagem), a energia de cada intervalo ao preço do seu
+  período;
+* outras taxas: a taxa do tipo de cliente (``preco_cliente_pos`` /
+  ``preco_cliente_pre``), como sempre na faturação em lote e nas faturas
+  manuais (``taxa_fixa`` é informativa e não entra no valor);
+* clientes sem tarifa pagam ``PRECO_KWH_PADRAO`` por kWh, sem taxas.
+
+As tarifas são carregadas de uma vez e compiladas em tabelas de inteiros
+(``TarifaCompilada``): os limites dos escalões em centésimos de kWh com o
+custo acumulado no início de cada escalão, pelo que valorizar um consumo é
+uma pesquisa binária (``bisect``) e uma multiplicação, e o preço de cada um
+dos intervalos do dia. As contas são exatas (inteiros) e o valor é
+arredondado ao cêntimo uma única vez; o consumo conta ao centésimo de kWh,
+a precisão com que fica na fatura.
+
+As tarifas compiladas são reutilizadas por todos os cálculos do processo.
+Gravar ou apagar uma tarifa, um escalão ou um período incrementa, na mesma
+transação, a versão em ``VersaoTarifas`` (``pagamentos.signals``); cada
+processo (servidor web ou worker) lê a versão da base de dados e recompila
+as suas tarifas quando muda. ``calcular_lote`` valoriza muitas faturas com
+uma única leitura da versão.
+"""
+import threading
+from bisect import bisect_left
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db.models import F
+
+from equipamentos.intervalos import INTERVALO_MINUTOS
+from .tarifa_models import EscalaoTarifa, PeriodoHorario, Tarifa, VersaoTarifas
+
+PRECO_KWH_PADRAO = Decimal('50.00')
+INTERVALOS_POR_DIA = 24 * 60 // INTERVALO_MINUTOS
+SEM_LIMITE = float('inf')
+
+_trinco = threading.Lock()
+_cache = {'versao': None, 'tarifas': None}
+
+
+def _centesimos(valor):
+    """``Decimal`` com duas casas (kWh ou Kz) em centésimos inteiros."""
+    return int(Decimal(valor).scaleb(2).to_integral_value(ROUND_HALF_UP))
+
+
+def _decimal(centesimos):
+    return Decimal(centesimos).scaleb(-2)
+
+
+def _intervalo(hora):
+    return (hora.hour * 60 + hora.minute) // INTERVALO_MINUTOS
+
+
+class TarifaCompilada:
+    """
+    Tarifa pronta a valorizar consumos. Unidades: consumo em centésimos de
+    kWh, preços em cêntimos por kWh e custos em décimas de milésima de Kz
+    (centésimos de kWh × cêntimos), arredondados ao cêntimo no fim.
+    """
+    __slots__ = ('limites', 'inferiores', 'acumulados', 'precos', 'taxas_pos', 'taxas_pre', 'precos_intervalo')
+
+    def __init__(self, preco_kwh, taxa_pos=0, taxa_pre=0, escaloes=(), periodos=()):
+        preco_base = _centesimos(preco_kwh)
+        self.limites, self.inferiores, self.acumulados, self.precos = [], [], [], []
+        inferior = acumulado = 0
+        for limite, preco in escaloes:
+            preco = _centesimos(preco)
+            limite = SEM_LIMITE if limite is None else _centesimos(limite)
+            self._escalao(limite, inferior, acumulado, preco)
+            if limite == SEM_LIMITE:
+                break
+            acumulado += (limite - inferior) * preco
+            inferior = limite
+        else:
+            # Acima do último escalão (ou sem escalões) paga-se o preço base
+            self._escalao(SEM_LIMITE, inferior, acumulado, preco_base)
+
+        self.taxas_pos = _centesimos(taxa_pos)
+        self.taxas_pre = _centesimos(taxa_pre)
+
+        self.precos_intervalo = None
+        if periodos:
+            self.precos_intervalo = [preco_base] * INTERVALOS_POR_DIA
+            for hora_inicio, hora_fim, preco in sorted(periodos):
+                inicio, fim = _intervalo(hora_inicio), _intervalo(hora_fim)
+                # Um período que termina antes de começar passa a meia-noite
+                for intervalo in range(inicio, fim if fim > inicio else fim + INTERVALOS_POR_DIA):
+                    self.precos_intervalo[intervalo % INTERVALOS_POR_DIA] = _centesimos(preco)
+
+    def _escalao(self, limite, inferior, acumulado, preco):
+        self.limites.append(limite)
+        self.inferiores.append(inferior)
+        self.acumulados.append(acumulado)
+        self.precos.append(preco)
+
+    def valor_consumo(self, consumo):
+        """Custo de ``consumo`` (centésimos de kWh) em cêntimos."""
+        escalao = bisect_left(self.limites, consumo)
+        custo = self.acumulados[escalao] + (consumo - self.inferiores[escalao]) * self.precos[escalao]
+        return (custo + 50) // 100
+
+    def valor_por_intervalo(self, energia_por_intervalo):
+        """Custo, em cêntimos, de ``{intervalo do dia: Wh}``."""
+        precos = self.precos_intervalo
+        # Wh × cêntimos/kWh = milésimas de cêntimo
+        custo = sum(energia_wh * precos[intervalo] for intervalo, energia_wh in energia_por_intervalo.items())
+        return (custo + 500) // 1000
+
+
+SEM_TARIFA = TarifaCompilada(PRECO_KWH_PADRAO)
+
+
+def _compilar():
+    """Devolve ``{tarifa_id: TarifaCompilada}`` de todas as tarifas."""
+    escaloes = {}
+    for tarifa_id, limite, preco in EscalaoTarifa.objects.values_list('tarifa_id', 'limite_kwh', 'preco_kwh'):
+        escaloes.setdefault(tarifa_id, []).append((limite, preco))
+    periodos = {}
+    for tarifa_id, inicio, fim, preco in PeriodoHorario.objects.values_list('tarifa_id', 'hora_inicio', 'hora_fim', 'preco_kwh'):
+        periodos.setdefault(tarifa_id, []).append((inicio, fim, preco))
+    # Inclui as tarifas inativas: deixam de ser oferecidas, mas os clientes que as têm continuam a ser faturados por elas
+    return {
+        tarifa_id: TarifaCompilada(
+            preco_kwh, taxa_pos, taxa_pre,
+            # O escalão sem limite fica em último
+            escaloes=sorted(escaloes.get(tarifa_id, []), key=lambda escalao: (escalao[0] is None, escalao[0] or 0)),
+            periodos=periodos.get(tarifa_id, []),
+        )
+        for tarifa_id, preco_kwh, taxa_pos, taxa_pre in Tarifa.objects.values_list(
+            'id', 'preco_kwh', 'preco_cliente_pos', 'preco_cliente_pre'
+        )
+    }
+
+
+def _versao():
+    return VersaoTarifas.objects.filter(pk=1).values_list('versao', flat=True).first() or 0
+
+
+def tarifas():
+    """Devolve as tarifas compiladas, recompilando-as se tiverem mudado (uma consulta à versão)."""
+    versao = _versao()
+    with _trinco:
+        if _cache['versao'] == versao:
+            return _cache['tarifas']
+    # Lida a versão antes das tarifas: uma alteração gravada entretanto obriga a recompilar na próxima chamada
+    compiladas = _compilar()
+    with _trinco:
+        _cache.update(versao=versao, tarifas=compiladas)
+    return compiladas
+
+
+def invalidar():
+    """
+    Obriga todos os processos a recompilar as tarifas. Chamada dentro da
+    transação que altera as tarifas, a nova versão só é vista depois do commit.
+    """
+    if not VersaoTarifas.objects.filter(pk=1).update(versao=F('versao') + 1):
+        VersaoTarifas.objects.get_or_create(pk=1, defaults={'versao': 1})
+    with _trinco:
+        _cache.update(versao=None, tarifas=None)
+
+
+def tarifas_horarias():
+    """Ids das tarifas com períodos horários (que precisam do consumo por intervalo)."""
+    return {tarifa_id for tarifa_id, tarifa in tarifas().items() if tarifa.precos_intervalo}
+
+
+def valorizador():
+    """
+    Devolve uma função que valoriza um item de ``calcular_lote`` de cada vez,
+    com as tarifas obtidas uma única vez (para quem precisa do valor de uma
+    linha antes de decidir a seguinte, como a importação de leituras).
+    """
+    compiladas = tarifas()
+
+    def valorizar(item):
+        tipo_cliente, tarifa_id, consumo = item[:3]
+        consumo = _centesimos(consumo)
+        if consumo < 0:
+            raise ValueError(f'Consumo negativo: {_decimal(consumo)} kWh')
+        tarifa = compiladas.get(tarifa_id, SEM_TARIFA) if tarifa_id else SEM_TARIFA
+        if len(item) > 3 and item[3] and tarifa.precos_intervalo:
+            valor_consumo = tarifa.valor_por_intervalo(item[3])
+        else:
+            valor_consumo = tarifa.valor_consumo(consumo)
+        outras_taxas = tarifa.taxas_pos if tipo_cliente == 'POS_PAGO' else tarifa.taxas_pre
+        valor_consumo, outras_taxas = _decimal(valor_consumo), _decimal(outras_taxas)
+        return valor_consumo, outras_taxas, valor_consumo + outras_taxas
+
+    return valorizar
+
+
+def calcular_lote(itens):
+    """
+    Valoriza ``itens``: iterável de ``(tipo_cliente, tarifa_id, consumo_kwh)``
+    ou ``(tipo_cliente, tarifa_id, consumo_kwh, energia_por_intervalo)``, em
+    que ``tarifa_id`` pode ser ``None`` e ``energia_por_intervalo`` é
+    ``{intervalo do dia: Wh}`` (telecontagem, usado nas tarifas com períodos
+    horários). Devolve uma lista, pela mesma ordem, de
+    ``(valor_consumo, outras_taxas, valor_total)``.
+    """
+    valorizar = valorizador()
+    return [valorizar(item) for item in itens]
+
+
+def calcular(tipo_cliente, tarifa_id, consumo, energia_por_intervalo=None):
+    """Valoriza uma fatura; devolve ``(valor_consumo, outras_taxas, valor_total)``."""
+    return calcular_lote([(tipo_cliente, tarifa_id, consumo, energia_por_intervalo)])[0]
@@ -1,3 +1,266 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
 from django.test import TestCase
+from django.utils import timezone
+
+from clientes.models import Cliente
+from equipamentos.models import CartaoRecarga, Contador, LeituraConsumo
+from . import faturacao, tarifacao
+from .models import EscalaoTarifa, Fatura, MovimentoSaldo, Pagamento, Recarga, Recibo, Tarifa, VersaoTarifas
+from .recargas import RecargaInvalida, confirmar_recarga, lancar_movimento, registar_recarga, resgatar_cartao
+from .recebimentos import PagamentoInvalido, registar_pagamento
+
+
+def valor_original(tipo_cliente, tarifa, consumo):
+    """
+    Fórmula da faturação original (antes de ``tarifacao``): consumo ao preço
+    da tarifa, ou 50 Kz/kWh sem tarifa, mais a taxa do tipo de cliente.
+    """
+    preco_kwh, taxa = Decimal('50.00'), Decimal('0.00')
+    if tarifa:
+        preco_kwh = tarifa.preco_kwh
+        taxa = tarifa.preco_cliente_pos if tipo_cliente == 'POS_PAGO' else tarifa.preco_cliente_pre
+    valor_consumo = consumo * preco_kwh
+    return valor_consumo, taxa, valor_consumo + taxa
+
+
+class TarifacaoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.simples = Tarifa.objects.create(
+            nome='Doméstica', preco_kwh=Decimal('10.00'), taxa_fixa=Decimal('100.00'),
+            preco_cliente_pos=Decimal('5.00'), preco_cliente_pre=Decimal('2.00'),
+        )
+        cls.escaloes = Tarifa.objects.create(
+            nome='Social', preco_kwh=Decimal('30.00'), taxa_fixa=Decimal('250.00'),
+            preco_cliente_pos=Decimal('7.50'), preco_cliente_pre=Decimal('3.25'),
+        )
+        EscalaoTarifa.objects.create(tarifa=cls.escaloes, limite_kwh=Decimal('50'), preco_kwh=Decimal('10.00'))
+        EscalaoTarifa.objects.create(tarifa=cls.escaloes, limite_kwh=Decimal('200'), preco_kwh=Decimal('20.00'))
+
+    def setUp(self):
+        # O rollback de cada teste também desfaz a versão: as tarifas compiladas noutro teste não servem
+        tarifacao._cache.update(versao=None, tarifas=None)
+
+    def test_tarifa_simples_igual_a_formula_original(self):
+        for tipo_cliente in ('POS_PAGO', 'PRE_PAGO'):
+            for consumo in (Decimal('0'), Decimal('1'), Decimal('150'), Decimal('12345')):
+                with self.subTest(tipo_cliente=tipo_cliente, consumo=consumo):
+                    self.assertEqual(
+                        tarifacao.calcular(tipo_cliente, self.simples.pk, consumo),
+                        valor_original(tipo_cliente, self.simples, consumo),
+                    )
+
+    def test_sem_tarifa_igual_a_formula_original(self):
+        for tipo_cliente in ('POS_PAGO', 'PRE_PAGO'):
+            with self.subTest(tipo_cliente=tipo_cliente):
+                self.assertEqual(
+                    tarifacao.calcular(tipo_cliente, None, Decimal('150')),
+                    valor_original(tipo_cliente, None, Decimal('150')),
+                )
+
+    def test_escaloes_cobram_cada_bloco_ao_seu_preco(self):
+        # 50 kWh a 10, 150 kWh a 20 e o restante ao preço base (30)
+        casos = {
+            Decimal('40'): Decimal('400.00'),
+            Decimal('50'): Decimal('500.00'),
+            Decimal('120'): Decimal('1900.00'),
+            Decimal('200'): Decimal('3500.00'),
+            Decimal('250'): Decimal('5000.00'),
+        }
+        for consumo, valor_consumo in casos.items():
+            for tipo_cliente, taxa in (('POS_PAGO', Decimal('7.50')), ('PRE_PAGO', Decimal('3.25'))):
+                with self.subTest(consumo=consumo, tipo_cliente=tipo_cliente):
+                    self.assertEqual(
+                        tarifacao.calcular(tipo_cliente, self.escaloes.pk, consumo),
+                        (valor_consumo, taxa, valor_consumo + taxa),
+                    )
+
+    def test_taxa_fixa_nao_entra_no_valor(self):
+        _, outras_taxas, _ = tarifacao.calcular('POS_PAGO', self.simples.pk, Decimal('10'))
+        self.assertEqual(outras_taxas, self.simples.preco_cliente_pos)
+
+    def test_faturacao_em_lote_igual_a_formula_original(self):
+        for numero, (tipo_cliente, tarifa) in enumerate([
+            ('POS_PAGO', self.simples), ('PRE_PAGO', self.simples),
+            ('POS_PAGO', None), ('PRE_PAGO', None),
+        ]):
+            cliente = Cliente.objects.create(
+                nome=f'Cliente {numero}', nif=f'NIF{numero}', bi=f'BI{numero}', morada='Luanda',
+                telefone='923456789', tipo_cliente=tipo_cliente, tarifa=tarifa,
+            )
+            contador = Contador.objects.create(
+                numero_serie=f'SN{numero}', tipo_contador=tipo_cliente, cliente=cliente,
+                endereco_instalacao='Luanda', data_instalacao=date.today(), potencia_maxima=Decimal('5'),
+            )
+            LeituraConsumo.objects.create(
+                contador=contador, leitura_anterior=Decimal('0'), leitura_atual=Decimal('100'), consumo=Decimal('100'),
+            )
+            LeituraConsumo.objects.create(
+                contador=contador, leitura_anterior=Decimal('100'), leitura_atual=Decimal('150'), consumo=Decimal('50'),
+            )
+
+        resultado = faturacao.gerar_faturas_periodo()
+
+        self.assertEqual(resultado['geradas'], 4)
+        for fatura in Fatura.objects.select_related('cliente__tarifa'):
+            with self.subTest(cliente=fatura.cliente.nome):
+                self.assertEqual(fatura.consumo_kwh, Decimal('150'))
+                self.assertEqual(
+                    (fatura.valor_consumo, fatura.outras_taxas, fatura.valor_total),
+                    valor_original(fatura.cliente.tipo_cliente, fatura.cliente.tarifa, fatura.consumo_kwh),
+                )
+
+    def test_versao_na_base_de_dados_invalida_outros_processos(self):
+        self.assertEqual(tarifacao.calcular('PRE_PAGO', self.simples.pk, Decimal('10'))[0], Decimal('100.00'))
+        # Outro processo altera a tarifa: aqui só muda a linha da versão, sem sinais nem cache local
+        Tarifa.objects.filter(pk=self.simples.pk).update(preco_kwh=Decimal('12.00'))
+        self.assertEqual(tarifacao.calcular('PRE_PAGO', self.simples.pk, Decimal('10'))[0], Decimal('100.00'))
+        VersaoTarifas.objects.filter(pk=1).update(versao=VersaoTarifas.objects.get(pk=1).versao + 1)
+        self.assertEqual(tarifacao.calcular('PRE_PAGO', self.simples.pk, Decimal('10'))[0], Decimal('120.00'))
+
+    def test_gravar_tarifa_recompila(self):
+        tarifacao.calcular('PRE_PAGO', self.simples.pk, Decimal('10'))
+        self.simples.preco_kwh = Decimal('11.00')
+        self.simples.save()
+        self.assertEqual(tarifacao.calcular('PRE_PAGO', self.simples.pk, Decimal('10'))[0], Decimal('110.00'))
+
+
+class FaturaPeriodoUnicaTests(TestCase):
+    def test_segunda_fatura_mensal_do_mesmo_contador_e_recusada(self):
+        cliente = Cliente.objects.create(nome='Cliente', nif='NIF1', bi='BI1', morada='Luanda', telefone='923456789')
+        contador = Contador.objects.create(
+            numero_serie='SN1', tipo_contador='POS_PAGO', cliente=cliente,
+            endereco_instalacao='Luanda', data_instalacao=date.today(), potencia_maxima=Decimal('5'),
+        )
+        dados = dict(
+            cliente=cliente, contador=contador, periodo_referencia='Janeiro/2026',
+            leitura_anterior=Decimal('0'), leitura_atual=Decimal('10'), consumo_kwh=Decimal('10'),
+            valor_consumo=Decimal('500'), valor_total=Decimal('500'),
+            data_emissao=date(2026, 1, 31), data_vencimento=date(2026, 2, 15),
+        )
+        Fatura.objects.create(faturacao_periodo=True, **dados)
+        # As faturas de cada leitura (registo de leitura, importação) não contam
+        Fatura.objects.create(**dados)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Fatura.objects.create(faturacao_periodo=True, **dados)
+
+
+class RecebimentosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = Cliente.objects.create(nome='Cliente', nif='NIF1', bi='BI1', morada='Luanda', telefone='923456789')
+
+    def _fatura(self, valor_total='1000.00'):
+        return Fatura.objects.create(
+            cliente=self.cliente, periodo_referencia='Janeiro/2026',
+            leitura_anterior=Decimal('0'), leitura_atual=Decimal('20'), consumo_kwh=Decimal('20'),
+            valor_consumo=Decimal(valor_total), valor_total=Decimal(valor_total),
+            data_emissao=date(2026, 1, 31), data_vencimento=date(2026, 2, 15),
+        )
+
+    def test_mesma_referencia_devolve_o_pagamento_existente(self):
+        fatura = self._fatura()
+        pagamento, criado = registar_pagamento(fatura.pk, '400.00', 'MULTICAIXA', 'MCX-1')
+        repetido, repetido_criado = registar_pagamento(fatura.pk, '400.00', 'MULTICAIXA', 'MCX-1')
+        self.assertTrue(criado)
+        self.assertFalse(repetido_criado)
+        self.assertEqual(repetido, pagamento)
+        fatura.refresh_from_db()
+        self.assertEqual(fatura.valor_pago_total, Decimal('400.00'))
+        self.assertEqual(Pagamento.objects.filter(fatura=fatura).count(), 1)
+        self.assertEqual(Recibo.objects.filter(fatura=fatura).count(), 1)
+
+    def test_referencia_de_outra_fatura_e_recusada(self):
+        registar_pagamento(self._fatura().pk, '100.00', 'MULTICAIXA', 'MCX-2')
+        with self.assertRaises(PagamentoInvalido):
+            registar_pagamento(self._fatura().pk, '100.00', 'MULTICAIXA', 'MCX-2')
+
+    def test_pagamentos_parciais_passam_a_fatura_a_paga(self):
+        fatura = self._fatura()
+        registar_pagamento(fatura.pk, '300.00', 'DINHEIRO')
+        fatura.refresh_from_db()
+        self.assertEqual((fatura.status, fatura.saldo), ('PENDENTE', Decimal('700.00')))
+
+        pagamento, _ = registar_pagamento(fatura.pk, '700.00', 'MULTICAIXA', 'MCX-3')
+        fatura.refresh_from_db()
+        self.assertEqual((fatura.status, fatura.saldo), ('PAGO', Decimal('0.00')))
+        self.assertEqual(fatura.data_pagamento, pagamento.data_pagamento)
+        with self.assertRaises(PagamentoInvalido):
+            registar_pagamento(fatura.pk, '1.00', 'DINHEIRO')
+
+    def test_valor_acima_do_saldo_e_recusado(self):
+        fatura = self._fatura()
+        with self.assertRaises(PagamentoInvalido):
+            registar_pagamento(fatura.pk, '1000.01', 'DINHEIRO')
+        self.assertFalse(Pagamento.objects.filter(fatura=fatura).exists())
+
+
+class RecargasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = Cliente.objects.create(
+            nome='Cliente', nif='NIF1', bi='BI1', morada='Luanda', telefone='923456789', tipo_cliente='PRE_PAGO',
+        )
+
+    def _saldo(self):
+        return Cliente.objects.values_list('saldo_atual', flat=True).get(pk=self.cliente.pk)
+
+    def test_mesma_referencia_devolve_a_recarga_existente(self):
+        recarga, criada = registar_recarga(self.cliente.pk, '500.00', 'MULTICAIXA', 'REF-1')
+        repetida, repetida_criada = registar_recarga(self.cliente.pk, '500.00', 'MULTICAIXA', 'REF-1')
+        self.assertTrue(criada)
+        self.assertFalse(repetida_criada)
+        self.assertEqual(repetida, recarga)
+        self.assertEqual(self._saldo(), Decimal('500.00'))
+        self.assertEqual(MovimentoSaldo.objects.filter(cliente=self.cliente).count(), 1)
+
+    def test_confirmar_duas_vezes_credita_uma_vez(self):
+        recarga, _ = registar_recarga(self.cliente.pk, '200.00', 'USSD', confirmar=False)
+        self.assertEqual(self._saldo(), Decimal('0.00'))
+        self.assertTrue(confirmar_recarga(recarga.pk)[1])
+        self.assertFalse(confirmar_recarga(recarga.pk)[1])
+        self.assertEqual(self._saldo(), Decimal('200.00'))
+
+    def test_cartao_so_e_resgatado_uma_vez(self):
+        cartao = CartaoRecarga.objects.create(
+            codigo_cartao='CARTAO-1', valor=Decimal('1000.00'), data_expiracao=timezone.now() + timedelta(days=30),
+        )
+        recarga = resgatar_cartao('CARTAO-1', self.cliente.pk)
+        self.assertEqual(recarga.cartao_id, cartao.pk)
+        with self.assertRaises(RecargaInvalida):
+            resgatar_cartao('CARTAO-1', self.cliente.pk)
+        cartao.refresh_from_db()
+        self.assertEqual((cartao.status, cartao.cliente_uso_id), ('USADO', self.cliente.pk))
+        self.assertEqual(Recarga.objects.filter(cartao=cartao).count(), 1)
+        self.assertEqual(self._saldo(), Decimal('1000.00'))
+
+    def test_cartao_expirado_e_recusado(self):
+        CartaoRecarga.objects.create(
+            codigo_cartao='CARTAO-2', valor=Decimal('1000.00'), data_expiracao=timezone.now() - timedelta(days=1),
+        )
+        with self.assertRaises(RecargaInvalida):
+            resgatar_cartao('CARTAO-2', self.cliente.pk)
+        self.assertEqual(self._saldo(), Decimal('0.00'))
+
+    def test_saldo_e_conta_corrente_coincidem(self):
+        registar_recarga(self.cliente.pk, '500.00', 'MULTICAIXA', 'REF-2')
+        lancar_movimento(self.cliente.pk, Decimal('-120.50'), 'CONSUMO')
+        registar_recarga(self.cliente.pk, '250.00', 'APP')
+        lancar_movimento(self.cliente.pk, Decimal('-29.50'), 'AJUSTE')
+
+        saldo = Decimal('0.00')
+        for movimento in MovimentoSaldo.objects.filter(cliente=self.cliente).order_by('pk'):
+            saldo += movimento.valor
+            self.assertEqual(movimento.saldo_apos, saldo)
+        self.assertEqual(self._saldo(), saldo)
+        self.assertEqual(saldo, Decimal('600.00'))
 
-# Create your tests here.
+    def test_cliente_pos_pago_nao_faz_recargas(self):
+        pos_pago = Cliente.objects.create(
+            nome='Pós', nif='NIF2', bi='BI2', morada='Luanda', telefone='923456780', tipo_cliente='POS_PAGO',
+        )
+        with self.assertRaises(RecargaInvalida):
+            registar_recarga(pos_pago.pk, '100.00', 'MULTICAIXA')
@@ -8,7 +8,9 @@ urlpatterns = [
     path('faturas/<int:pk>/pagamento/', views.registrar_pagamento, name='registrar_pagamento'),
     path('faturas/novo/', views.fatura_create, name='fatura_create'),
     path('faturas/gerar-auto/', views.gerar_faturas_automaticas, name='gerar_faturas_auto'),
+    path('conciliacao/', views.conciliar_pagamentos, name='conciliar_pagamentos'),
     path('divida/', views.controlo_divida, name='controlo_divida'),
+    path('divida/cliente/<int:pk>/faturas/', views.divida_cliente_faturas, name='divida_cliente_faturas'),
     path('suspensao-automatica/', views.acionar_suspensao_automatica, name='acionar_suspensao_automatica'),
     path('contador/<int:pk>/suspender/', views.suspender_contador, name='suspender_contador'),
     path('contador/<int:pk>/reativar/', views.reativar_contador, name='reativar_contador'),
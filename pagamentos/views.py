@@ -1,152 +1,93 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth.decorators import login_required
+from django.contrib.auth.decorators import login_required, user_passes_test
 from django.views.decorators.csrf import csrf_protect
 from django.contrib import messages
 from django.utils import timezone
 from .models import Tarifa, Pagamento, Fatura
-from .forms import TarifaForm, PagamentoForm, FaturaSimplesForm
-from equipamentos.models import LeituraConsumo, Contador
+from .forms import TarifaForm, PagamentoForm, FaturaSimplesForm, ConciliacaoForm
+from .pdf import dados_fatura, impressao_digital, obter_pdf
+from .recebimentos import SALDO, PagamentoInvalido, registar_pagamento
+from . import tarifacao
+from processamento.fila import enfileirar
+from energia_gestao.paginacao import paginar_por_cursor
+from energia_gestao.db_routers import fixar_principal, replica_exceto_apos_escrita
+from equipamentos.models import Contador
+from equipamentos.views import is_operador_ou_admin
 from decimal import Decimal
-from datetime import timedelta, date
-from django.http import HttpResponse
-from django.conf import settings
-import os
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from django.db.models import Sum, Count, Q, F
+from datetime import date
+from django.core.files.storage import default_storage
+from django.http import FileResponse, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.db.models import Sum, Count, Min, Q
+from django.core.paginator import Paginator
 
 @login_required
 def gerar_faturas_automaticas(request):
     """
-    Gera faturas automaticamente para todos os clientes que tiveram leituras
-    no último mês e ainda não têm fatura para esse período.
+    Enfileira a geração automática de faturas do mês corrente para todos os
+    clientes com leituras e sem fatura nesse período. A faturação corre no
+    worker (manage.py processar_fila); aqui apenas se acompanha o progresso.
     """
-    leituras_pendentes = LeituraConsumo.objects.all() # Simplificado para demonstração
-    faturas_geradas = 0
-    
-    # Período de referência (mês anterior ou atual)
-    hoje = timezone.now()
-    periodo = hoje.strftime('%B/%Y')
-    
-    for leitura in leituras_pendentes:
-        # Verifica se já existe fatura para este cliente, contador e período
-        existe = Fatura.objects.filter(
-            cliente=leitura.contador.cliente,
-            contador=leitura.contador,
-            periodo_referencia=periodo
-        ).exists()
-        
-        if not existe and leitura.contador.cliente:
-            cliente = leitura.contador.cliente
-            preco_kwh = Decimal('50.00')
-            taxa_adicional = Decimal('0.00')
-            
-            if cliente.tarifa:
-                preco_kwh = cliente.tarifa.preco_kwh
-                if cliente.tipo_cliente == 'POS_PAGO':
-                    taxa_adicional = cliente.tarifa.preco_cliente_pos
-                else:
-                    taxa_adicional = cliente.tarifa.preco_cliente_pre
-            
-            # Criar fatura
-            valor_consumo = leitura.consumo * preco_kwh
-            Fatura.objects.create(
-                cliente=cliente,
-                contador=leitura.contador,
-                periodo_referencia=periodo,
-                leitura_anterior=leitura.leitura_anterior,
-                leitura_atual=leitura.leitura_atual,
-                consumo_kwh=leitura.consumo,
-                valor_consumo=valor_consumo,
-                outras_taxas=taxa_adicional,
-                valor_total=valor_consumo + taxa_adicional,
-                status='PENDENTE',
-                data_emissao=hoje.date(),
-                data_vencimento=(hoje + timedelta(days=15)).date()
-            )
-            faturas_geradas += 1
-    
-    if faturas_geradas > 0:
-        messages.success(request, f"Foram geradas {faturas_geradas} faturas com sucesso!")
-    else:
-        messages.info(request, "Nenhuma nova fatura precisou ser gerada.")
-            
-    return render(request, 'pagamentos/fatura_gerada_status.html', {
-        'total': faturas_geradas,
-        'periodo': periodo
-    })
+    processo = enfileirar('GERAR_FATURAS', criado_por=request.user, unico=True)
+    messages.info(request, "Geração automática de faturas colocada em fila de processamento.")
+    return redirect('processo_detail', pk=processo.pk)
 
 @login_required
-def fatura_pdf(request, pk):
-    fatura = get_object_or_404(Fatura, pk=pk)
-    
-    # Create the HttpResponse object with the appropriate PDF headers.
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="fatura_{fatura.numero_fatura}.pdf"'
-
-    # Create the PDF object, using the response object as its "file."
-    p = canvas.Canvas(response, pagesize=A4)
-    width, height = A4
-
-    # Add logo at the top right
-    logo_path = os.path.join(settings.BASE_DIR, 'static', 'images', 'logo_iscat.png')
-    try:
-        if os.path.exists(logo_path):
-            p.drawImage(logo_path, width - 180, height - 90, width=140, height=70, preserveAspectRatio=True)
-    except Exception as e:
-        print(f"Erro ao adicionar logo: {e}")
-
-    # Header
-    p.setFont("Helvetica-Bold", 16)
-    p.drawString(50, height - 50, "SISTEMA DE GESTÃO DE ENERGIA")
-    p.setFont("Helvetica", 12)
-    p.drawString(50, height - 70, f"Fatura: {fatura.numero_fatura}")
-    p.drawString(50, height - 85, f"Data: {fatura.data_emissao.strftime('%d/%m/%Y')}")
-
-    # Cliente
-    p.setFont("Helvetica-Bold", 12)
-    p.drawString(50, height - 120, "CLIENTE:")
-    p.setFont("Helvetica", 12)
-    p.drawString(50, height - 135, f"Nome: {fatura.cliente.nome}")
-    p.drawString(50, height - 150, f"NIF: {fatura.cliente.nif}")
-    p.drawString(50, height - 165, f"Endereço: {fatura.cliente.morada or 'N/A'}")
-    if fatura.contador:
-        p.drawString(50, height - 180, f"Contador: {fatura.contador.numero_serie}")
-    p.drawString(50, height - 195, f"Consumo do Mês: {fatura.consumo_kwh} kWh")
-    p.drawString(50, height - 210, f"Valor do Consumo: {fatura.valor_consumo} Kz")
-    p.drawString(50, height - 225, f"Estado: {fatura.get_status_display()}")
-
-    # Detalhes
-    y_offset = 240
-    p.line(50, height - y_offset, 550, height - y_offset)
-    p.drawString(50, height - y_offset - 20, "Descrição")
-    p.drawRightString(540, height - y_offset - 20, "Valor (Kz)")
-    p.line(50, height - y_offset - 30, 550, height - y_offset - 30)
-
-    y_desc = height - y_offset - 50
-    p.drawString(50, y_desc, f"Consumo de Energia ({fatura.consumo_kwh} kWh)")
-    p.drawRightString(540, y_desc, f"{fatura.valor_consumo}")
-
-    y = y_offset + 50
-    if fatura.outras_taxas > 0:
-        p.drawString(50, height - y, "Taxas Adicionais")
-        p.drawRightString(540, height - y, f"{fatura.outras_taxas}")
-        y += 20
-
-    p.line(50, height - y, 550, height - y)
-    y += 20
-    p.setFont("Helvetica-Bold", 14)
-    p.drawString(50, height - y, "TOTAL A PAGAR")
-    p.drawRightString(540, height - y, f"{fatura.valor_total} Kz")
+@user_passes_test(is_operador_ou_admin)
+def conciliar_pagamentos(request):
+    """
+    Recebe um ficheiro de liquidação Multicaixa/bancário e enfileira a
+    conciliação com as faturas em aberto (pagamentos.reconciliacao). Clientes
+    que não aceitam HTML (integrações) recebem o processo em JSON.
+    """
+    form = ConciliacaoForm(request.POST, request.FILES) if request.method == 'POST' else ConciliacaoForm()
+    if request.method == 'POST' and form.is_valid():
+        ficheiro = default_storage.save(
+            f"importacoes/liquidacao_{timezone.now():%Y%m%d%H%M%S}.txt", form.cleaned_data['ficheiro']
+        )
+        processo = enfileirar(
+            'CONCILIAR_PAGAMENTOS', criado_por=request.user,
+            ficheiro=ficheiro, formato=form.cleaned_data['formato'], delimitador=form.cleaned_data['delimitador'],
+        )
+        if not request.accepts('text/html'):
+            return JsonResponse(processo.como_dict(), status=202)
+        messages.info(request, "Conciliação de pagamentos colocada em fila de processamento.")
+        return redirect('processo_detail', pk=processo.pk)
 
-    # Footer
-    p.setFont("Helvetica-Oblique", 10)
-    p.drawCentredString(width / 2.0, 50, "Obrigado por utilizar nossos serviços.")
+    if request.method == 'POST' and not request.accepts('text/html'):
+        return JsonResponse({'erros': form.errors}, status=400)
+    return render(request, 'pagamentos/conciliar_pagamentos.html', {'form': form})
 
-    # Close the PDF object cleanly, and we're done.
-    p.showPage()
-    p.save()
+@login_required
+def fatura_pdf(request, pk):
+    """
+    Serve o PDF guardado da fatura, renderizando-o só quando os dados usados
+    no PDF mudaram. A impressão digital desses dados é o ETag, pelo que um
+    navegador ou portal com a versão atual recebe 304 sem novo download.
+    """
+    fatura = get_object_or_404(Fatura.objects.select_related('cliente', 'contador'), pk=pk)
+    impressao = impressao_digital(dados_fatura(fatura))
+    etag = quote_etag(impressao)
+    gerado_em = fatura.pdf_gerado_em if fatura.pdf_hash == impressao else None
+    
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(gerado_em.timestamp()) if gerado_em else None
+    )
+    if response is None:
+        response = FileResponse(
+            obter_pdf(fatura, impressao),
+            as_attachment=True,
+            filename=f"fatura_{fatura.numero_fatura}.pdf",
+            content_type='application/pdf',
+        )
+        gerado_em = fatura.pdf_gerado_em
+    
+    response['ETag'] = etag
+    if gerado_em:
+        response['Last-Modified'] = http_date(gerado_em.timestamp())
+    # O navegador pode guardar o PDF mas revalida sempre (If-None-Match)
+    patch_cache_control(response, private=True, no_cache=True)
     return response
 
 @login_required
@@ -163,15 +104,20 @@ def registrar_pagamento(request, pk):
     if request.method == 'POST':
         form = PagamentoForm(request.POST)
         if form.is_valid():
-            pagamento = form.save(commit=False)
-            pagamento.fatura = fatura
-            pagamento.save()
-            messages.success(request, f"Pagamento de {pagamento.valor_pago} Kz registrado com sucesso!")
-            return redirect('fatura_detail', pk=fatura.pk)
+            try:
+                pagamento, criado = registar_pagamento(fatura.pk, **form.cleaned_data)
+            except PagamentoInvalido as e:
+                messages.error(request, str(e))
+            else:
+                if criado:
+                    messages.success(request, f"Pagamento de {pagamento.valor_pago} Kz registrado com sucesso!")
+                else:
+                    messages.info(request, f"O pagamento {pagamento.numero_pagamento} com esta referência já estava registado.")
+                return redirect('fatura_detail', pk=fatura.pk)
         else:
             messages.error(request, "Erro ao registrar pagamento. Verifique os dados inseridos.")
     else:
-        form = PagamentoForm(initial={'valor_pago': fatura.valor_total})
+        form = PagamentoForm(initial={'valor_pago': fatura.saldo})
     
     return render(request, 'pagamentos/registrar_pagamento.html', {
         'fatura': fatura, 
@@ -180,11 +126,14 @@ def registrar_pagamento(request, pk):
 
 @login_required
 def fatura_list(request):
+    faturas = Fatura.objects.select_related('cliente', 'contador')
     if hasattr(request.user, 'perfil') and request.user.perfil.tipo_usuario == 'CLIENTE':
-        faturas = Fatura.objects.filter(cliente__email=request.user.email) # Filtro simples por email para exemplo
-    else:
-        faturas = Fatura.objects.all()
-    return render(request, 'pagamentos/fatura_list.html', {'faturas': faturas})
+        faturas = faturas.filter(cliente__email=request.user.email) # Filtro simples por email para exemplo
+    pagina = paginar_por_cursor(
+        faturas, ['-data_emissao', '-id'],
+        apos=request.GET.get('apos'), antes=request.GET.get('antes'),
+    )
+    return render(request, 'pagamentos/fatura_list.html', {'faturas': pagina})
 
 @login_required
 def fatura_create(request):
@@ -193,18 +142,6 @@ def fatura_create(request):
         if form.is_valid():
             fatura = form.save(commit=False)
             
-            # Lógica simples de cálculo baseada na tarifa do cliente
-            # Se o cliente não tiver tarifa, usamos um valor padrão
-            preco_kwh = Decimal('50.00') # Padrão
-            taxa_adicional = Decimal('0.00')
-            
-            if fatura.cliente.tarifa:
-                preco_kwh = fatura.cliente.tarifa.preco_kwh
-                if fatura.cliente.tipo_cliente == 'POS_PAGO':
-                    taxa_adicional = fatura.cliente.tarifa.preco_cliente_pos
-                else:
-                    taxa_adicional = fatura.cliente.tarifa.preco_cliente_pre
-            
             consumo = fatura.leitura_atual - fatura.leitura_anterior
             
             if consumo < 0:
@@ -212,9 +149,9 @@ def fatura_create(request):
                 return render(request, 'pagamentos/fatura_form.html', {'form': form})
 
             fatura.consumo_kwh = consumo
-            fatura.valor_consumo = consumo * preco_kwh
-            fatura.outras_taxas = taxa_adicional
-            fatura.valor_total = fatura.valor_consumo + taxa_adicional
+            fatura.valor_consumo, fatura.outras_taxas, fatura.valor_total = tarifacao.calcular(
+                fatura.cliente.tipo_cliente, fatura.cliente.tarifa_id, consumo
+            )
             
             fatura.save()
             messages.success(request, "Fatura manual criada com sucesso!")
@@ -227,7 +164,7 @@ def fatura_create(request):
 
 @login_required
 def tarifa_list(request):
-    tarifas = Tarifa.objects.all()
+    tarifas = Tarifa.objects.prefetch_related('escaloes', 'periodos')
     return render(request, 'pagamentos/tarifa_list.html', {'tarifas': tarifas})
 
 @login_required
@@ -260,6 +197,8 @@ def suspender_contador(request, pk):
     contador.status = 'SUSPENSO'
     contador.data_suspensao = timezone.now()
     contador.save()
+    # O controlo de dívida lê da réplica, que pode ainda não ter a alteração
+    fixar_principal(request)
     return redirect('controlo_divida')
 
 @login_required
@@ -269,80 +208,90 @@ def reativar_contador(request, pk):
     contador.status = 'ATIVO'
     contador.data_suspensao = None
     contador.save()
+    fixar_principal(request)
     return redirect('controlo_divida')
 
 @login_required
 def acionar_suspensao_automatica(request):
-    """Aciona manualmente o comando de suspensão automática"""
-    from django.core.management import call_command
-    
-    try:
-        call_command('suspender_devedores')
-        messages.success(request, "Processo de suspensão automática executado com sucesso.")
-    except Exception as e:
-        messages.error(request, f"Erro ao executar suspensão: {str(e)}")
-        
-    return redirect('controlo_divida')
+    """Enfileira o processo de suspensão automática de devedores"""
+    processo = enfileirar('SUSPENDER_DEVEDORES', criado_por=request.user, unico=True)
+    messages.info(request, "Suspensão automática colocada em fila de processamento.")
+    return redirect('processo_detail', pk=processo.pk)
 
 @login_required
+@replica_exceto_apos_escrita
 def controlo_divida(request):
     """
-    Dashboard de controle de dívidas - mostra clientes com faturas pendentes/vencidas
+    Dashboard de controle de dívidas - mostra clientes com faturas pendentes/vencidas.
+    Os totais por cliente são agregados na base de dados e paginados; as faturas
+    de cada cliente só são carregadas quando a linha é expandida.
     """
     hoje = date.today()
     
     # Faturas não pagas
-    faturas_pendentes = Fatura.objects.filter(
-        status__in=['PENDENTE', 'VENCIDO']
-    ).select_related('cliente').order_by('-data_vencimento')
+    faturas_pendentes = Fatura.objects.filter(status__in=['PENDENTE', 'VENCIDO'])
+    vencida = Q(data_vencimento__lt=hoje)
     
-    # Separar faturas vencidas
-    faturas_vencidas = [f for f in faturas_pendentes if f.data_vencimento < hoje]
+    resumo = faturas_pendentes.aggregate(
+        total_divida=Sum(SALDO),
+        total_faturas=Count('id'),
+        total_clientes=Count('cliente', distinct=True),
+    )
+    total_divida = resumo['total_divida'] or Decimal('0.00')
+    total_clientes = resumo['total_clientes']
     
-    # Agrupar por cliente para calcular dívida total
-    clientes_divida = {}
-    total_divida = Decimal('0.00')
+    # Dívida por cliente, ordenada por valor (maior para menor)
+    clientes_divida = faturas_pendentes.order_by().values(
+        'cliente_id',
+        'cliente__nome',
+        'cliente__nif',
+        'cliente__contador__id',
+        'cliente__contador__status',
+        'cliente__contador__data_suspensao',
+    ).annotate(
+        total_divida=Sum(SALDO),
+        faturas_vencidas=Count('id', filter=vencida),
+        faturas_pendentes=Count('id', filter=~vencida),
+        vencimento_mais_antigo=Min('data_vencimento', filter=vencida),
+    ).order_by('-total_divida', 'cliente_id')
     
-    for fatura in faturas_pendentes:
-        cliente = fatura.cliente
-        if cliente not in clientes_divida:
-            clientes_divida[cliente] = {
-                'total_divida': Decimal('0.00'),
-                'faturas_vencidas': 0,
-                'faturas_pendentes': 0,
-                'dias_vencimento': 0,
-                'faturas': []
-            }
-        
-        clientes_divida[cliente]['total_divida'] += fatura.valor_total
-        clientes_divida[cliente]['faturas'].append(fatura)
-        total_divida += fatura.valor_total
-        
-        if fatura.data_vencimento < hoje:
-            clientes_divida[cliente]['faturas_vencidas'] += 1
-            dias = (hoje - fatura.data_vencimento).days
-            if dias > clientes_divida[cliente]['dias_vencimento']:
-                clientes_divida[cliente]['dias_vencimento'] = dias
-        else:
-            clientes_divida[cliente]['faturas_pendentes'] += 1
+    paginator = Paginator(clientes_divida, 25)
+    pagina = paginator.get_page(request.GET.get('page'))
+    status_contador = dict(Contador.STATUS_CHOICES)
+    for dados in pagina:
+        vencimento = dados['vencimento_mais_antigo']
+        dados['dias_vencimento'] = (hoje - vencimento).days if vencimento else 0
+        dados['contador_status_display'] = status_contador.get(dados['cliente__contador__status'])
     
-    # Ordenar por valor de dívida (maior para menor)
-    clientes_divida_ordenados = sorted(
-        clientes_divida.items(),
-        key=lambda x: x[1]['total_divida'],
-        reverse=True
+    # Faturas vencidas há mais tempo (ação imediata)
+    faturas_vencidas = list(
+        faturas_pendentes.filter(vencida).select_related('cliente').order_by('data_vencimento', 'pk')[:20]
     )
+    for fatura in faturas_vencidas:
+        fatura.dias_atraso = (hoje - fatura.data_vencimento).days
     
     # Contar contadores suspensos
     contadores_suspensos = Contador.objects.filter(status='SUSPENSO').count()
     
     context = {
-        'clientes_divida': clientes_divida_ordenados,
+        'clientes_divida': pagina,
         'faturas_vencidas': faturas_vencidas,
+        'total_faturas_vencidas': faturas_pendentes.filter(vencida).count(),
         'total_divida': total_divida,
-        'total_clientes_devendo': len(clientes_divida),
-        'total_faturas_pendentes': faturas_pendentes.count(),
+        'media_divida': total_divida / total_clientes if total_clientes else Decimal('0.00'),
+        'total_clientes_devendo': total_clientes,
+        'total_faturas_pendentes': resumo['total_faturas'],
         'contadores_suspensos': contadores_suspensos,
     }
     
     return render(request, 'pagamentos/controlo_divida.html', context)
+
+@login_required
+def divida_cliente_faturas(request, pk):
+    """Faturas em dívida de um cliente, carregadas ao expandir a linha no controlo de dívida"""
+    faturas = Fatura.objects.filter(
+        cliente_id=pk, status__in=['PENDENTE', 'VENCIDO']
+    ).only(
+        'numero_fatura', 'data_vencimento', 'valor_total', 'valor_pago_total', 'status'
+    ).order_by('-data_vencimento')
+    return render(request, 'pagamentos/divida_cliente_faturas.html', {'faturas': faturas})
@@ -0,0 +1,9 @@
+from django.contrib import admin
+from .models import Processo
+
+@admin.register(Processo)
+class ProcessoAdmin(admin.ModelAdmin):
+    list_display = ['id', 'tipo', 'status', 'processados', 'total', 'criado_por', 'data_criacao', 'data_fim']
+    list_filter = ['tipo', 'status', 'data_criacao']
+    readonly_fields = ['data_criacao', 'data_inicio', 'data_batimento', 'data_fim']
+    raw_id_fields = ['criado_por']
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class ProcessamentoConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'processamento'
+
+    def ready(self):
+        # Cada app regista os seus processos em <app>/tarefas.py
+        from django.utils.module_loading import autodiscover_modules
+        autodiscover_modules('tarefas')
@@ -0,0 +1,216 @@
+"""
+Fila de processos em segundo plano guardada na base de dados.
+
+As views enfileiram um ``Processo`` e respondem de imediato; o comando
+``python manage.py processar_fila`` reserva e executa os processos pendentes.
+Cada app regista as suas funções em ``<app>/tarefas.py`` com o decorador
+``@tarefa('TIPO')``. A função recebe o processo e os parâmetros e devolve
+um dicionário (serializável em JSON) com o resultado.
+
+Enquanto executa um processo, o worker grava ``data_batimento`` a cada
+``INTERVALO_BATIMENTO``. Um processo em execução sem batimento há mais de
+``PRAZO_BATIMENTO`` (worker terminado ou bloqueado) é dado como falhado por
+``recuperar_abandonados``, chamado antes de cada reserva, o que também
+liberta os processos únicos desse tipo. Se o worker afinal só estava
+atrasado, o fim do processo já não é gravado (fica em ``ERRO``); a
+faturação mensal não cria faturas em duplicado porque as faturas do período
+têm uma restrição de unicidade (``fatura_periodo_unica``).
+
+Os processos que trabalham sobre um ficheiro carregado recebem o seu nome no
+storage no parâmetro ``ficheiro`` e só o apagam quando terminam com sucesso:
+um processo com erro pode ser relançado (``relancar``) com o mesmo ficheiro.
+``limpar_ficheiros`` apaga os ficheiros dos processos com erro há mais de
+``RETENCAO_FICHEIROS`` que não tenham sido relançados.
+"""
+import logging
+import threading
+import traceback
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Processo
+
+logger = logging.getLogger(__name__)
+
+_tarefas = {}
+
+INTERVALO_BATIMENTO = 30  # segundos
+PRAZO_BATIMENTO = timedelta(minutes=5)
+RETENCAO_FICHEIROS = timedelta(days=7)
+
+
+def tarefa(tipo):
+    """Regista ``funcao`` como executora dos processos do ``tipo`` indicado."""
+    def registar(funcao):
+        _tarefas[tipo] = funcao
+        return funcao
+    return registar
+
+
+def tipos_registados():
+    return sorted(_tarefas)
+
+
+def enfileirar(tipo, criado_por=None, unico=False, **parametros):
+    """
+    Cria um processo pendente. Com ``unico=True`` devolve o processo do mesmo
+    tipo que ainda esteja pendente ou em execução, em vez de criar outro.
+    """
+    if tipo not in _tarefas:
+        raise ValueError(f"Tipo de processo desconhecido: {tipo}")
+    if not unico:
+        return Processo.objects.create(tipo=tipo, parametros=parametros, criado_por=criado_por)
+    ativos = Processo.objects.filter(tipo=tipo, unico=True, status__in=['PENDENTE', 'EM_EXECUCAO'])
+    while True:
+        existente = ativos.first()
+        if existente:
+            return existente
+        try:
+            # A restrição processo_unico_ativo recusa o segundo de dois pedidos simultâneos
+            with transaction.atomic():
+                return Processo.objects.create(tipo=tipo, parametros=parametros, criado_por=criado_por, unico=True)
+        except IntegrityError:
+            continue
+
+
+def relancar(processo, criado_por=None):
+    """Enfileira de novo, com os mesmos parâmetros, um processo que terminou com erro."""
+    if processo.status != 'ERRO':
+        raise ValueError(f"Só os processos com erro podem ser relançados (o processo {processo.pk} está {processo.get_status_display()}).")
+    ficheiro = processo.parametros.get('ficheiro')
+    if ficheiro and not default_storage.exists(ficheiro):
+        raise ValueError(f"O ficheiro do processo {processo.pk} já foi apagado; carregue-o de novo.")
+    return enfileirar(processo.tipo, criado_por=criado_por, unico=processo.unico, **processo.parametros)
+
+
+def limpar_ficheiros(retencao=RETENCAO_FICHEIROS):
+    """
+    Apaga os ficheiros carregados dos processos com erro há mais de
+    ``retencao``, exceto os que um processo mais recente (relançado) ainda
+    usa. Devolve quantos foram apagados.
+    """
+    limite = timezone.now() - retencao
+    ficheiros = {
+        parametros.get('ficheiro')
+        for parametros in Processo.objects.filter(status='ERRO', data_fim__lt=limite).values_list('parametros', flat=True)
+        if isinstance(parametros, dict)
+    }
+    ficheiros.discard(None)
+    if not ficheiros:
+        return 0
+    em_uso = {
+        parametros.get('ficheiro')
+        for parametros in Processo.objects.exclude(status='ERRO', data_fim__lt=limite).values_list('parametros', flat=True)
+        if isinstance(parametros, dict)
+    }
+    apagados = 0
+    for ficheiro in ficheiros - em_uso:
+        if default_storage.exists(ficheiro):
+            default_storage.delete(ficheiro)
+            apagados += 1
+    if apagados:
+        logger.info("%s ficheiro(s) de processos com erro apagado(s)", apagados)
+    return apagados
+
+
+def recuperar_abandonados():
+    """
+    Marca como ``ERRO`` os processos em execução cujo worker deixou de dar
+    sinal de vida há mais de ``PRAZO_BATIMENTO``. Devolve quantos foram.
+    Não são repostos em ``PENDENTE``: podem ter ficado a meio e devem ser
+    relançados por quem os pediu.
+    """
+    agora = timezone.now()
+    limite = agora - PRAZO_BATIMENTO
+    abandonados = Processo.objects.filter(
+        Q(data_batimento__lt=limite) | Q(data_batimento__isnull=True, data_inicio__lt=limite),
+        status='EM_EXECUCAO',
+    ).update(
+        status='ERRO', data_fim=agora,
+        mensagem_erro=f'O worker deixou de responder durante a execução (sem sinal de vida há mais de {PRAZO_BATIMENTO}).',
+    )
+    if abandonados:
+        logger.warning("%s processo(s) abandonado(s) marcado(s) como erro", abandonados)
+    return abandonados
+
+
+def reservar_proximo():
+    """
+    Reserva o processo pendente mais antigo. A reserva é um UPDATE condicional
+    ao estado, pelo que dois workers nunca executam o mesmo processo.
+    """
+    recuperar_abandonados()
+    while True:
+        candidato = (
+            Processo.objects.filter(status='PENDENTE')
+            .order_by('data_criacao', 'pk')
+            .values_list('pk', flat=True)
+            .first()
+        )
+        if candidato is None:
+            return None
+        agora = timezone.now()
+        reservado = Processo.objects.filter(pk=candidato, status='PENDENTE').update(
+            status='EM_EXECUCAO', data_inicio=agora, data_batimento=agora
+        )
+        if reservado:
+            return Processo.objects.get(pk=candidato)
+
+
+class _Batimento(threading.Thread):
+    """Grava ``data_batimento`` do processo a cada ``INTERVALO_BATIMENTO`` até ser parado."""
+
+    def __init__(self, processo_id):
+        super().__init__(name=f'batimento-{processo_id}', daemon=True)
+        self.processo_id = processo_id
+        self.parar = threading.Event()
+
+    def run(self):
+        try:
+            while not self.parar.wait(INTERVALO_BATIMENTO):
+                try:
+                    Processo.objects.filter(pk=self.processo_id, status='EM_EXECUCAO').update(
+                        data_batimento=timezone.now()
+                    )
+                except Exception:
+                    # Base de dados ocupada ou indisponível: tenta no próximo batimento
+                    logger.warning("Falha ao gravar o batimento do processo %s", self.processo_id, exc_info=True)
+        finally:
+            connection.close()
+
+
+def executar(processo):
+    """Executa um processo já reservado e grava o resultado ou o erro."""
+    funcao = _tarefas.get(processo.tipo)
+    batimento = _Batimento(processo.pk)
+    batimento.start()
+    try:
+        if funcao is None:
+            raise ValueError(f"Tipo de processo desconhecido: {processo.tipo}")
+        processo.resultado = funcao(processo, **processo.parametros)
+        processo.status = 'CONCLUIDO'
+    except Exception:
+        logger.exception("Erro ao executar o processo %s", processo.pk)
+        processo.status = 'ERRO'
+        processo.mensagem_erro = traceback.format_exc()
+    finally:
+        batimento.parar.set()
+        batimento.join()
+        close_old_connections()
+    processo.data_fim = timezone.now()
+    # Condicional: um processo dado como abandonado (recuperar_abandonados) fica em ERRO
+    gravado = Processo.objects.filter(pk=processo.pk, status='EM_EXECUCAO').update(
+        status=processo.status, resultado=processo.resultado,
+        mensagem_erro=processo.mensagem_erro, data_fim=processo.data_fim,
+    )
+    if not gravado:
+        logger.error(
+            "O processo %s terminou (%s) depois de ter sido dado como abandonado; o resultado não foi gravado: %s",
+            processo.pk, processo.status, processo.resultado,
+        )
+        processo.refresh_from_db()
+    return processo
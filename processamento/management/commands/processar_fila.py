@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from processamento.fila import executar, limpar_ficheiros, reservar_proximo
+
+INTERVALO_LIMPEZA = 3600  # segundos entre limpezas dos ficheiros de processos com erro
+
+
+class Command(BaseCommand):
+    help = 'Worker da fila de processos em segundo plano (faturação, suspensões, relatórios)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--uma-vez', action='store_true', help='Processa os pendentes e termina (útil em cron)')
+        parser.add_argument('--intervalo', type=float, default=2.0, help='Segundos de espera quando a fila está vazia')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Worker iniciado. À espera de processos...'))
+        ultima_limpeza = None
+        try:
+            while True:
+                if ultima_limpeza is None or time.monotonic() - ultima_limpeza >= INTERVALO_LIMPEZA:
+                    limpar_ficheiros()
+                    ultima_limpeza = time.monotonic()
+                processo = reservar_proximo()
+                if processo is None:
+                    if options['uma_vez']:
+                        break
+                    time.sleep(options['intervalo'])
+                    continue
+
+                self.stdout.write(f'A executar {processo}...')
+                executar(processo)
+                if processo.status == 'CONCLUIDO':
+                    self.stdout.write(self.style.SUCCESS(
+                        f'{processo} em {processo.duracao:.1f}s '
+                        f'({processo.processados} itens, {processo.itens_por_segundo:.1f}/s)'
+                    ))
+                else:
+                    self.stdout.write(self.style.ERROR(f'{processo}: {processo.mensagem_erro}'))
+        except KeyboardInterrupt:
+            self.stdout.write('Worker interrompido.')
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('processamento', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processo',
+            name='data_batimento',
+            field=models.DateTimeField(blank=True, help_text='Último sinal de vida do worker que executa o processo', null=True),
+        ),
+        migrations.AddField(
+            model_name='processo',
+            name='unico',
+            field=models.BooleanField(default=False, help_text='Só pode haver um processo ativo deste tipo'),
+        ),
+        migrations.AddConstraint(
+            model_name='processo',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['PENDENTE', 'EM_EXECUCAO']), ('unico', True)), fields=('tipo',), name='processo_unico_ativo'),
+        ),
+    ]
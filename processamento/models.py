@@ -0,0 +1,97 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Processo(models.Model):
+    STATUS_CHOICES = [
+        ('PENDENTE', 'Pendente'),
+        ('EM_EXECUCAO', 'Em Execução'),
+        ('CONCLUIDO', 'Concluído'),
+        ('ERRO', 'Erro'),
+    ]
+
+    tipo = models.CharField(max_length=50)
+    parametros = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=15, choices=STATUS_CHOICES, default='PENDENTE')
+    total = models.PositiveIntegerField(default=0, help_text='Total de itens a processar (0 se desconhecido)')
+    processados = models.PositiveIntegerField(default=0)
+    resultado = models.JSONField(null=True, blank=True)
+    mensagem_erro = models.TextField(blank=True, null=True)
+    criado_por = models.ForeignKey('auth.User', on_delete=models.SET_NULL, null=True, blank=True, related_name='processos')
+    data_criacao = models.DateTimeField(auto_now_add=True)
+    data_inicio = models.DateTimeField(null=True, blank=True)
+    data_fim = models.DateTimeField(null=True, blank=True)
+    data_batimento = models.DateTimeField(
+        null=True, blank=True, help_text='Último sinal de vida do worker que executa o processo'
+    )
+    unico = models.BooleanField(default=False, help_text='Só pode haver um processo ativo deste tipo')
+
+    class Meta:
+        verbose_name = 'Processo em Segundo Plano'
+        verbose_name_plural = 'Processos em Segundo Plano'
+        ordering = ['-data_criacao']
+        indexes = [
+            models.Index(fields=['status', 'data_criacao'], name='processo_fila_idx'),
+        ]
+        constraints = [
+            # Garante na base de dados que dois pedidos simultâneos não enfileiram dois processos únicos
+            models.UniqueConstraint(
+                fields=['tipo'], condition=models.Q(unico=True, status__in=['PENDENTE', 'EM_EXECUCAO']),
+                name='processo_unico_ativo',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} #{self.pk} - {self.get_status_display()}"
+
+    @property
+    def terminado(self):
+        return self.status in ('CONCLUIDO', 'ERRO')
+
+    @property
+    def duracao(self):
+        """Duração em segundos (até agora, se ainda estiver em execução)."""
+        if not self.data_inicio:
+            return 0.0
+        fim = self.data_fim or timezone.now()
+        return (fim - self.data_inicio).total_seconds()
+
+    @property
+    def itens_por_segundo(self):
+        duracao = self.duracao
+        return self.processados / duracao if duracao > 0 else 0.0
+
+    @property
+    def percentagem(self):
+        if self.status == 'CONCLUIDO':
+            return 100
+        if not self.total:
+            return 0
+        return min(100, int(self.processados * 100 / self.total))
+
+    def atualizar_progresso(self, processados, total=None):
+        """Grava os contadores de progresso sem tocar no resto da linha."""
+        self.processados = processados
+        campos = {'processados': processados}
+        if total is not None:
+            self.total = total
+            campos['total'] = total
+        Processo.objects.filter(pk=self.pk).update(**campos)
+
+    def como_dict(self):
+        return {
+            'id': self.pk,
+            'tipo': self.tipo,
+            'status': self.status,
+            'status_display': self.get_status_display(),
+            'total': self.total,
+            'processados': self.processados,
+            'percentagem': self.percentagem,
+            'duracao': round(self.duracao, 2),
+            'itens_por_segundo': round(self.itens_por_segundo, 1),
+            'resultado': self.resultado,
+            'mensagem_erro': self.mensagem_erro,
+            'data_criacao': self.data_criacao.isoformat(),
+            'data_inicio': self.data_inicio.isoformat() if self.data_inicio else None,
+            'data_fim': self.data_fim.isoformat() if self.data_fim else None,
+        }
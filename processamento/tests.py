@@ -0,0 +1,88 @@
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import fila
+from .models import Processo
+
+
+def _tarefa_teste(processo, **parametros):
+    return {'ok': True}
+
+
+@mock.patch.dict(fila._tarefas, {'TESTE': _tarefa_teste})
+class FilaTests(TestCase):
+    def test_enfileirar_unico_devolve_o_processo_ativo(self):
+        primeiro = fila.enfileirar('TESTE', unico=True)
+        self.assertEqual(fila.enfileirar('TESTE', unico=True), primeiro)
+        Processo.objects.filter(pk=primeiro.pk).update(status='EM_EXECUCAO')
+        self.assertEqual(fila.enfileirar('TESTE', unico=True), primeiro)
+        self.assertEqual(Processo.objects.filter(tipo='TESTE').count(), 1)
+
+    def test_enfileirar_unico_depois_de_terminado_cria_outro(self):
+        primeiro = fila.enfileirar('TESTE', unico=True)
+        Processo.objects.filter(pk=primeiro.pk).update(status='CONCLUIDO')
+        self.assertNotEqual(fila.enfileirar('TESTE', unico=True), primeiro)
+
+    def test_executar_grava_o_resultado(self):
+        fila.enfileirar('TESTE')
+        processo = fila.executar(fila.reservar_proximo())
+        processo.refresh_from_db()
+        self.assertEqual(processo.status, 'CONCLUIDO')
+        self.assertEqual(processo.resultado, {'ok': True})
+
+    def test_processo_abandonado_nao_passa_a_concluido(self):
+        def atrasada(processo, **parametros):
+            # Entretanto outro worker deu o processo como abandonado
+            Processo.objects.filter(pk=processo.pk).update(status='ERRO', mensagem_erro='Abandonado')
+            return {'ok': True}
+
+        fila.enfileirar('TESTE')
+        with mock.patch.dict(fila._tarefas, {'TESTE': atrasada}), self.assertLogs(fila.logger, 'ERROR'):
+            processo = fila.executar(fila.reservar_proximo())
+        self.assertEqual(processo.status, 'ERRO')
+        self.assertEqual(Processo.objects.get(pk=processo.pk).mensagem_erro, 'Abandonado')
+
+
+
+@mock.patch.dict(fila._tarefas, {'TESTE': _tarefa_teste})
+class FicheirosTests(TestCase):
+    def setUp(self):
+        pasta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, pasta)
+        configuracao = override_settings(MEDIA_ROOT=pasta)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.ficheiro = default_storage.save('importacoes/teste.csv', ContentFile(b'numero_serie,leitura\n'))
+
+    def _com_erro(self, data_fim=None):
+        processo = fila.enfileirar('TESTE', ficheiro=self.ficheiro)
+        Processo.objects.filter(pk=processo.pk).update(status='ERRO', data_fim=data_fim or timezone.now())
+        processo.refresh_from_db()
+        return processo
+
+    def test_relancar_reutiliza_o_ficheiro(self):
+        novo = fila.relancar(self._com_erro())
+        self.assertEqual(novo.status, 'PENDENTE')
+        self.assertEqual(novo.parametros, {'ficheiro': self.ficheiro})
+
+    def test_relancar_so_processos_com_erro(self):
+        with self.assertRaises(ValueError):
+            fila.relancar(fila.enfileirar('TESTE', ficheiro=self.ficheiro))
+
+    def test_limpar_ficheiros_apaga_so_os_antigos_sem_relancamento(self):
+        antigo = timezone.now() - fila.RETENCAO_FICHEIROS - timedelta(days=1)
+        processo = self._com_erro(data_fim=antigo)
+        relancado = fila.relancar(processo)
+        self.assertEqual(fila.limpar_ficheiros(), 0)
+        self.assertTrue(default_storage.exists(self.ficheiro))
+
+        relancado.delete()
+        self.assertEqual(fila.limpar_ficheiros(), 1)
+        self.assertFalse(default_storage.exists(self.ficheiro))
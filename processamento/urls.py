@@ -0,0 +1,9 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('', views.processo_list, name='processo_list'),
+    path('<int:pk>/', views.processo_detail, name='processo_detail'),
+    path('<int:pk>/estado/', views.processo_estado, name='processo_estado'),
+    path('<int:pk>/relancar/', views.processo_relancar, name='processo_relancar'),
+]
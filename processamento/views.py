@@ -0,0 +1,39 @@
+from django.shortcuts import render, redirect, get_object_or_404
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
+from .fila import relancar
+from .models import Processo
+
+@login_required
+def processo_list(request):
+    processos = Processo.objects.select_related('criado_por')[:50]
+    return render(request, 'processamento/processo_list.html', {'processos': processos})
+
+@login_required
+def processo_detail(request, pk):
+    processo = get_object_or_404(Processo, pk=pk)
+    return render(request, 'processamento/processo_detail.html', {'processo': processo})
+
+@login_required
+def processo_estado(request, pk):
+    """Estado do processo em JSON, consultado periodicamente pela página de detalhe."""
+    processo = get_object_or_404(Processo, pk=pk)
+    return JsonResponse(processo.como_dict())
+
+@login_required
+@require_POST
+def processo_relancar(request, pk):
+    """Relança um processo com erro (por exemplo, uma importação interrompida por uma falha da base de dados)."""
+    processo = get_object_or_404(Processo, pk=pk)
+    if not (request.user.is_staff or processo.criado_por_id == request.user.pk):
+        messages.error(request, "Só quem pediu o processo pode relançá-lo.")
+        return redirect('processo_detail', pk=pk)
+    try:
+        novo = relancar(processo, criado_por=request.user)
+    except ValueError as erro:
+        messages.error(request, str(erro))
+        return redirect('processo_detail', pk=pk)
+    messages.info(request, f"Processo #{processo.pk} relançado.")
+    return redirect('processo_detail', pk=novo.pk)
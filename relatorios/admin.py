@@ -1,9 +1,21 @@
 from django.contrib import admin
-from .models import RelatorioGerado
+from .models import RelatorioGerado, ResumoFaturacao, ResumoPagamentos
 
 @admin.register(RelatorioGerado)
 class RelatorioGeradoAdmin(admin.ModelAdmin):
-    list_display = ['titulo', 'tipo_relatorio', 'periodo_inicio', 'periodo_fim', 'data_geracao', 'gerado_por']
-    list_filter = ['tipo_relatorio', 'data_geracao']
+    list_display = ['titulo', 'tipo_relatorio', 'periodo_inicio', 'periodo_fim', 'status', 'data_geracao', 'gerado_por']
+    list_filter = ['tipo_relatorio', 'status', 'data_geracao']
     search_fields = ['titulo', 'gerado_por']
     readonly_fields = ['data_geracao']
+
+@admin.register(ResumoFaturacao)
+class ResumoFaturacaoAdmin(admin.ModelAdmin):
+    list_display = ['granularidade', 'data', 'tipo_tarifa', 'tipo_cliente', 'num_faturas', 'total_kwh', 'total_faturado']
+    list_filter = ['granularidade', 'tipo_tarifa', 'tipo_cliente']
+    date_hierarchy = 'data'
+
+@admin.register(ResumoPagamentos)
+class ResumoPagamentosAdmin(admin.ModelAdmin):
+    list_display = ['granularidade', 'data', 'tipo_tarifa', 'tipo_cliente', 'num_pagamentos', 'total_recebido']
+    list_filter = ['granularidade', 'tipo_tarifa', 'tipo_cliente']
+    date_hierarchy = 'data'
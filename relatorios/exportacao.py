@@ -0,0 +1,158 @@
+"""
+Exportação em fluxo (CSV/XLSX) de faturas, pagamentos e leituras.
+
+As linhas são lidas com ``values_list(...).iterator(chunk_size=...)`` e
+escritas à medida que chegam, pelo que a memória usada não depende do número
+de linhas exportadas. O CSV começa a ser enviado de imediato; o XLSX é escrito
+em modo ``write_only`` para um ficheiro temporário e servido a partir daí.
+
+O XLSX só é enviado depois de escrito por inteiro, dentro do pedido (cerca
+de 5000 linhas por segundo), pelo que está limitado a ``LIMITE_LINHAS_XLSX``
+linhas (bem abaixo do máximo de 1 048 576 linhas de uma folha do Excel):
+``ExportacaoForm`` recusa os períodos maiores e propõe o CSV, que não tem limite.
+"""
+import csv
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
+
+import openpyxl
+from django.utils import timezone
+
+from energia_gestao.db_routers import usar_replica
+from equipamentos.models import LeituraConsumo
+from pagamentos.models import Fatura, Pagamento
+from .resumos import intervalo_dias
+
+TAMANHO_BLOCO = 2000
+# Cerca de 10 segundos de escrita, abaixo do tempo limite dos workers web
+LIMITE_LINHAS_XLSX = 50000
+
+
+def _faturas(inicio, fim):
+    return Fatura.objects.filter(data_emissao__gte=inicio, data_emissao__lte=fim)
+
+
+def _pagamentos(inicio, fim):
+    de, ate = intervalo_dias(inicio, fim)
+    return Pagamento.objects.filter(data_pagamento__gte=de, data_pagamento__lt=ate)
+
+
+def _leituras(inicio, fim):
+    de, ate = intervalo_dias(inicio, fim)
+    return LeituraConsumo.objects.filter(data_leitura__gte=de, data_leitura__lt=ate)
+
+
+EXPORTACOES = {
+    'faturas': {
+        'titulo': 'Faturas',
+        'queryset': _faturas,
+        'colunas': [
+            ('Número', 'numero_fatura'),
+            ('Cliente', 'cliente__nome'),
+            ('NIF', 'cliente__nif'),
+            ('Contador', 'contador__numero_serie'),
+            ('Período', 'periodo_referencia'),
+            ('Leitura Anterior', 'leitura_anterior'),
+            ('Leitura Atual', 'leitura_atual'),
+            ('Consumo (kWh)', 'consumo_kwh'),
+            ('Valor Consumo (Kz)', 'valor_consumo'),
+            ('Multa (Kz)', 'multa_atraso'),
+            ('Juros (Kz)', 'juros_mora'),
+            ('Outras Taxas (Kz)', 'outras_taxas'),
+            ('Total (Kz)', 'valor_total'),
+            ('Estado', 'status'),
+            ('Emissão', 'data_emissao'),
+            ('Vencimento', 'data_vencimento'),
+            ('Data Pagamento', 'data_pagamento'),
+        ],
+    },
+    'pagamentos': {
+        'titulo': 'Pagamentos',
+        'queryset': _pagamentos,
+        'colunas': [
+            ('Número', 'numero_pagamento'),
+            ('Fatura', 'fatura__numero_fatura'),
+            ('Cliente', 'fatura__cliente__nome'),
+            ('NIF', 'fatura__cliente__nif'),
+            ('Valor Pago (Kz)', 'valor_pago'),
+            ('Método', 'metodo_pagamento'),
+            ('Referência Multicaixa', 'referencia_multicaixa'),
+            ('Data', 'data_pagamento'),
+        ],
+    },
+    'leituras': {
+        'titulo': 'Leituras',
+        'queryset': _leituras,
+        'colunas': [
+            ('Contador', 'contador__numero_serie'),
+            ('Cliente', 'contador__cliente__nome'),
+            ('Leitura Anterior', 'leitura_anterior'),
+            ('Leitura Atual', 'leitura_atual'),
+            ('Consumo (kWh)', 'consumo'),
+            ('Data', 'data_leitura'),
+            ('Operador', 'operador__username'),
+        ],
+    },
+}
+
+
+def contar(tipo, inicio, fim):
+    """Número de linhas (sem o cabeçalho) da exportação ``tipo`` entre ``inicio`` e ``fim``."""
+    with usar_replica():
+        return EXPORTACOES[tipo]['queryset'](inicio, fim).count()
+
+
+def _valor_local(valor):
+    if isinstance(valor, datetime) and timezone.is_aware(valor):
+        return timezone.localtime(valor).replace(tzinfo=None)
+    return valor
+
+
+def linhas(tipo, inicio, fim, tamanho_bloco=TAMANHO_BLOCO):
+    """Gera o cabeçalho e depois as linhas da exportação ``tipo`` entre ``inicio`` e ``fim`` (datas, inclusivas)."""
+    definicao = EXPORTACOES[tipo]
+    yield [titulo for titulo, _ in definicao['colunas']]
+    campos = [campo for _, campo in definicao['colunas']]
+    queryset = definicao['queryset'](inicio, fim).order_by('pk').values_list(*campos)
+    with usar_replica():
+        # Fixa já a base de dados: o gerador é consumido depois de a vista terminar
+        queryset = queryset.using(queryset.db)
+    for linha in queryset.iterator(chunk_size=tamanho_bloco):
+        yield [_valor_local(valor) for valor in linha]
+
+
+class _Eco:
+    """Pseudo-ficheiro cujo ``write`` devolve o texto, para o csv.writer produzir pedaços para o StreamingHttpResponse."""
+    def write(self, valor):
+        return valor
+
+
+def _texto_csv(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, datetime):
+        return valor.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(valor, (date, Decimal)):
+        return str(valor)
+    return valor
+
+
+def gerar_csv(tipo, inicio, fim):
+    """Gera o CSV linha a linha (com BOM para o Excel reconhecer UTF-8)."""
+    escritor = csv.writer(_Eco())
+    yield '\ufeff'
+    for linha in linhas(tipo, inicio, fim):
+        yield escritor.writerow([_texto_csv(valor) for valor in linha])
+
+
+def gerar_xlsx(tipo, inicio, fim):
+    """Escreve o XLSX em modo write_only num ficheiro temporário e devolve-o aberto, no início."""
+    livro = openpyxl.Workbook(write_only=True)
+    folha = livro.create_sheet(EXPORTACOES[tipo]['titulo'])
+    for linha in linhas(tipo, inicio, fim):
+        folha.append(linha)
+    ficheiro = tempfile.TemporaryFile()
+    livro.save(ficheiro)
+    ficheiro.seek(0)
+    return ficheiro
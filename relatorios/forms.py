@@ -0,0 +1,58 @@
+from django import forms
+from .exportacao import EXPORTACOES, LIMITE_LINHAS_XLSX, contar
+from .geradores import tipos_disponiveis
+from .models import RelatorioGerado
+
+class ExportacaoForm(forms.Form):
+    FORMATO_CHOICES = [
+        ('csv', 'CSV'),
+        ('xlsx', 'Excel (XLSX)'),
+    ]
+
+    tipo = forms.ChoiceField(
+        choices=[(tipo, definicao['titulo']) for tipo, definicao in EXPORTACOES.items()],
+        widget=forms.Select(attrs={'class': 'form-control'}),
+    )
+    formato = forms.ChoiceField(choices=FORMATO_CHOICES, widget=forms.Select(attrs={'class': 'form-control'}))
+    data_inicio = forms.DateField(widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
+    data_fim = forms.DateField(widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
+
+    def clean(self):
+        cleaned_data = super().clean()
+        inicio = cleaned_data.get('data_inicio')
+        fim = cleaned_data.get('data_fim')
+        if inicio and fim and inicio > fim:
+            self.add_error('data_fim', 'A data fim não pode ser anterior à data início.')
+        elif inicio and fim and cleaned_data.get('tipo') and cleaned_data.get('formato') == 'xlsx':
+            total = contar(cleaned_data['tipo'], inicio, fim)
+            if total > LIMITE_LINHAS_XLSX:
+                self.add_error(
+                    'formato',
+                    f'O período tem {total} linhas; a exportação em Excel está limitada a {LIMITE_LINHAS_XLSX}. '
+                    'Reduza o período ou escolha CSV.',
+                )
+        return cleaned_data
+
+
+class RelatorioForm(forms.ModelForm):
+    class Meta:
+        model = RelatorioGerado
+        fields = ['tipo_relatorio', 'periodo_inicio', 'periodo_fim']
+        widgets = {
+            'tipo_relatorio': forms.Select(attrs={'class': 'form-control'}),
+            'periodo_inicio': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
+            'periodo_fim': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Só os tipos com gerador registado em relatorios.geradores
+        self.fields['tipo_relatorio'].choices = tipos_disponiveis()
+
+    def clean(self):
+        cleaned_data = super().clean()
+        inicio = cleaned_data.get('periodo_inicio')
+        fim = cleaned_data.get('periodo_fim')
+        if inicio and fim and inicio > fim:
+            self.add_error('periodo_fim', 'A data fim não pode ser anterior à data início.')
+        return cleaned_data
@@ -0,0 +1,315 @@
+"""
+Motor de geração dos relatórios (``RelatorioGerado``).
+
+Cada tipo de relatório é uma subclasse de ``Relatorio`` registada com
+``@registar``: define as colunas e o método ``linhas()``, que faz as consultas
+agregadas para ``periodo_inicio..periodo_fim``. ``gerar()`` executa o
+relatório uma única vez, escreve o PDF e o XLSX e guarda-os em
+``arquivo_pdf``/``arquivo_excel``; os downloads seguintes servem os ficheiros
+guardados. A geração corre no worker (tarefa ``GERAR_RELATORIO``).
+
+Os relatórios financeiros e de consumo leem das tabelas de resumo diárias
+(``relatorios.resumos``), pelo que o custo depende do número de dias do
+período e não do número de faturas ou pagamentos.
+"""
+from decimal import Decimal
+from io import BytesIO
+
+import openpyxl
+from django.core.files.base import ContentFile
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from clientes.models import Cliente
+from energia_gestao.db_routers import usar_replica
+from pagamentos.models import Fatura, Pagamento, Tarifa
+from .models import RelatorioGerado, ResumoFaturacao, ResumoPagamentos
+from .resumos import intervalo_dias
+
+RELATORIOS = {}
+
+
+def registar(classe):
+    """Regista ``classe`` como gerador do seu ``tipo`` de relatório."""
+    RELATORIOS[classe.tipo] = classe
+    return classe
+
+
+def tipos_disponiveis():
+    """Escolhas de ``TIPO_RELATORIO_CHOICES`` que têm gerador registado."""
+    return [(tipo, rotulo) for tipo, rotulo in RelatorioGerado.TIPO_RELATORIO_CHOICES if tipo in RELATORIOS]
+
+
+def _media(total, quantidade):
+    return (Decimal(total) / quantidade).quantize(Decimal('0.01')) if quantidade else Decimal('0.00')
+
+
+class Relatorio:
+    """
+    Base dos geradores. ``colunas`` é uma lista de ``(rotulo, chave)`` e
+    ``linhas()`` devolve dicionários com essas chaves; ``totais`` indica as
+    chaves somadas na linha final.
+    """
+    tipo = None
+    colunas = []
+    totais = []
+
+    def __init__(self, inicio, fim):
+        self.inicio = inicio
+        self.fim = fim
+
+    def linhas(self):
+        raise NotImplementedError
+
+    def tabela(self):
+        """Cabeçalho, linhas e (se houver) a linha de totais, como listas de valores."""
+        linhas = list(self.linhas())
+        chaves = [chave for _, chave in self.colunas]
+        tabela = [[rotulo for rotulo, _ in self.colunas]]
+        tabela += [[linha.get(chave) for chave in chaves] for linha in linhas]
+        if self.totais and linhas:
+            tabela.append([
+                'Total' if indice == 0 else (sum(linha[chave] or 0 for linha in linhas) if chave in self.totais else None)
+                for indice, chave in enumerate(chaves)
+            ])
+        return tabela
+
+
+@registar
+class ClientesAtivos(Relatorio):
+    tipo = 'CLIENTES_ATIVOS'
+    colunas = [
+        ('Tipo de Cliente', 'tipo_cliente'),
+        ('Estado', 'status'),
+        ('Clientes', 'total'),
+        ('Novos no Período', 'novos'),
+    ]
+    totais = ['total', 'novos']
+
+    def linhas(self):
+        de, ate = intervalo_dias(self.inicio, self.fim)
+        tipos = dict(Cliente.TIPO_CLIENTE_CHOICES)
+        estados = dict(Cliente.STATUS_CHOICES)
+        for linha in (
+            Cliente.objects.filter(data_cadastro__lt=ate)
+            .values('tipo_cliente', 'status')
+            .annotate(total=Count('id'), novos=Count('id', filter=Q(data_cadastro__gte=de)))
+            .order_by('tipo_cliente', 'status')
+        ):
+            yield dict(linha, tipo_cliente=tipos.get(linha['tipo_cliente']), status=estados.get(linha['status']))
+
+
+@registar
+class ConsumoPorArea(Relatorio):
+    """A área é o tipo de tarifa do cliente (doméstica, comercial, industrial)."""
+    tipo = 'CONSUMO_AREA'
+    colunas = [
+        ('Área (Tarifa)', 'area'),
+        ('Faturas', 'num_faturas'),
+        ('Consumo (kWh)', 'total_kwh'),
+        ('Consumo Médio (kWh)', 'media_kwh'),
+        ('Faturado (Kz)', 'total_faturado'),
+    ]
+    totais = ['num_faturas', 'total_kwh', 'total_faturado']
+
+    def linhas(self):
+        areas = dict(Tarifa.TIPO_TARIFA_CHOICES)
+        for linha in (
+            ResumoFaturacao.objects.filter(granularidade='DIA', data__range=(self.inicio, self.fim))
+            .values('tipo_tarifa')
+            .annotate(num_faturas=Sum('num_faturas'), total_kwh=Sum('total_kwh'), total_faturado=Sum('total_faturado'))
+            .order_by('tipo_tarifa')
+        ):
+            yield {
+                'area': areas.get(linha['tipo_tarifa'], 'Sem tarifa'),
+                'num_faturas': linha['num_faturas'],
+                'total_kwh': linha['total_kwh'],
+                'media_kwh': _media(linha['total_kwh'], linha['num_faturas']),
+                'total_faturado': linha['total_faturado'],
+            }
+
+
+@registar
+class PagamentosRecebidosPendentes(Relatorio):
+    tipo = 'PAGAMENTOS'
+    colunas = [
+        ('Categoria', 'categoria'),
+        ('Descrição', 'descricao'),
+        ('Quantidade', 'quantidade'),
+        ('Valor (Kz)', 'valor'),
+    ]
+
+    def linhas(self):
+        estados = dict(Fatura.STATUS_FATURA_CHOICES)
+        for linha in (
+            Fatura.objects.filter(data_emissao__range=(self.inicio, self.fim))
+            .values('status')
+            .annotate(quantidade=Count('id'), valor=Sum('valor_total'))
+            .order_by('status')
+        ):
+            yield {'categoria': 'Faturas emitidas', 'descricao': estados.get(linha['status']),
+                   'quantidade': linha['quantidade'], 'valor': linha['valor']}
+
+        de, ate = intervalo_dias(self.inicio, self.fim)
+        metodos = dict(Pagamento.METODO_PAGAMENTO_CHOICES)
+        for linha in (
+            Pagamento.objects.filter(data_pagamento__gte=de, data_pagamento__lt=ate)
+            .values('metodo_pagamento')
+            .annotate(quantidade=Count('id'), valor=Sum('valor_pago'))
+            .order_by('metodo_pagamento')
+        ):
+            yield {'categoria': 'Pagamentos recebidos', 'descricao': metodos.get(linha['metodo_pagamento']),
+                   'quantidade': linha['quantidade'], 'valor': linha['valor']}
+
+
+class _Financeiro(Relatorio):
+    """Faturado e recebido por dia (ou por mês, com ``por_mes``) a partir dos resumos diários."""
+    por_mes = False
+    colunas = [
+        ('Data', 'data'),
+        ('Faturas', 'num_faturas'),
+        ('Faturado (Kz)', 'total_faturado'),
+        ('Pagamentos', 'num_pagamentos'),
+        ('Recebido (Kz)', 'total_recebido'),
+    ]
+    totais = ['num_faturas', 'total_faturado', 'num_pagamentos', 'total_recebido']
+
+    def _por_data(self, modelo, medidas):
+        resumos = modelo.objects.filter(granularidade='DIA', data__range=(self.inicio, self.fim))
+        if self.por_mes:
+            resumos = resumos.annotate(periodo=TruncMonth('data'))
+        else:
+            resumos = resumos.annotate(periodo=F('data'))
+        return {
+            linha['periodo']: linha
+            for linha in resumos.values('periodo').annotate(**{medida: Sum(medida) for medida in medidas}).order_by('periodo')
+        }
+
+    def linhas(self):
+        faturacao = self._por_data(ResumoFaturacao, ['num_faturas', 'total_faturado'])
+        pagamentos = self._por_data(ResumoPagamentos, ['num_pagamentos', 'total_recebido'])
+        formato = '%m/%Y' if self.por_mes else '%d/%m/%Y'
+        for data in sorted(set(faturacao) | set(pagamentos)):
+            f = faturacao.get(data, {})
+            p = pagamentos.get(data, {})
+            yield {
+                'data': data.strftime(formato),
+                'num_faturas': f.get('num_faturas', 0),
+                'total_faturado': f.get('total_faturado', Decimal('0.00')),
+                'num_pagamentos': p.get('num_pagamentos', 0),
+                'total_recebido': p.get('total_recebido', Decimal('0.00')),
+            }
+
+
+@registar
+class FinanceiroDiario(_Financeiro):
+    tipo = 'FINANCEIRO_DIARIO'
+
+
+@registar
+class FinanceiroMensal(_Financeiro):
+    tipo = 'FINANCEIRO_MENSAL'
+    por_mes = True
+
+
+@registar
+class ConsumoMensal(Relatorio):
+    tipo = 'CONSUMO_MENSAL'
+    colunas = [
+        ('Mês', 'mes'),
+        ('Tarifa', 'tarifa'),
+        ('Tipo de Cliente', 'tipo_cliente'),
+        ('Faturas', 'num_faturas'),
+        ('Consumo (kWh)', 'total_kwh'),
+        ('Consumo Médio (kWh)', 'media_kwh'),
+        ('Faturado (Kz)', 'total_faturado'),
+    ]
+    totais = ['num_faturas', 'total_kwh', 'total_faturado']
+
+    def linhas(self):
+        tarifas = dict(Tarifa.TIPO_TARIFA_CHOICES)
+        tipos = dict(Cliente.TIPO_CLIENTE_CHOICES)
+        for linha in (
+            ResumoFaturacao.objects.filter(granularidade='DIA', data__range=(self.inicio, self.fim))
+            .annotate(mes=TruncMonth('data'))
+            .values('mes', 'tipo_tarifa', 'tipo_cliente')
+            .annotate(num_faturas=Sum('num_faturas'), total_kwh=Sum('total_kwh'), total_faturado=Sum('total_faturado'))
+            .order_by('mes', 'tipo_tarifa', 'tipo_cliente')
+        ):
+            yield {
+                'mes': linha['mes'].strftime('%m/%Y'),
+                'tarifa': tarifas.get(linha['tipo_tarifa'], 'Sem tarifa'),
+                'tipo_cliente': tipos.get(linha['tipo_cliente'], linha['tipo_cliente']),
+                'num_faturas': linha['num_faturas'],
+                'total_kwh': linha['total_kwh'],
+                'media_kwh': _media(linha['total_kwh'], linha['num_faturas']),
+                'total_faturado': linha['total_faturado'],
+            }
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, Decimal):
+        return f"{valor:,.2f}"
+    return str(valor)
+
+
+def _pdf(relatorio, tabela):
+    buffer = BytesIO()
+    documento = SimpleDocTemplate(buffer, pagesize=landscape(A4), title=relatorio.titulo)
+    estilos = getSampleStyleSheet()
+    conteudo = [
+        Paragraph(relatorio.titulo, estilos['Title']),
+        Paragraph(
+            f"Período: {relatorio.periodo_inicio:%d/%m/%Y} a {relatorio.periodo_fim:%d/%m/%Y} &middot; "
+            f"Gerado por {relatorio.gerado_por} em {timezone.localtime():%d/%m/%Y %H:%M}",
+            estilos['Normal'],
+        ),
+        Spacer(1, 12),
+    ]
+    if len(tabela) > 1:
+        grelha = Table([[_texto(valor) for valor in linha] for linha in tabela], repeatRows=1)
+        grelha.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0d6efd')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f2f2f2')]),
+        ]))
+        conteudo.append(grelha)
+    else:
+        conteudo.append(Paragraph('Sem dados no período.', estilos['Normal']))
+    documento.build(conteudo)
+    return buffer.getvalue()
+
+
+def _xlsx(relatorio, tabela):
+    livro = openpyxl.Workbook(write_only=True)
+    folha = livro.create_sheet('Relatório')
+    folha.append([relatorio.titulo])
+    folha.append([f"Período: {relatorio.periodo_inicio:%d/%m/%Y} a {relatorio.periodo_fim:%d/%m/%Y}"])
+    folha.append([])
+    for linha in tabela:
+        folha.append(linha)
+    buffer = BytesIO()
+    livro.save(buffer)
+    return buffer.getvalue()
+
+
+def gerar(relatorio):
+    """Executa o relatório e guarda o PDF e o XLSX no registo. Devolve o número de linhas."""
+    gerador = RELATORIOS[relatorio.tipo_relatorio](relatorio.periodo_inicio, relatorio.periodo_fim)
+    with usar_replica():
+        tabela = gerador.tabela()
+    nome = f"relatorio_{relatorio.pk}_{relatorio.tipo_relatorio.lower()}"
+    relatorio.arquivo_pdf.save(f"{nome}.pdf", ContentFile(_pdf(relatorio, tabela)), save=False)
+    relatorio.arquivo_excel.save(f"{nome}.xlsx", ContentFile(_xlsx(relatorio, tabela)), save=False)
+    relatorio.status = 'GERADO'
+    relatorio.save(update_fields=['arquivo_pdf', 'arquivo_excel', 'status'])
+    return len(tabela) - 1
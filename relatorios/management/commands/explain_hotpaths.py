@@ -0,0 +1,125 @@
+"""
+Mostra o plano de execução (EXPLAIN) das consultas dos caminhos mais usados
+e assinala as leituras sequenciais de tabelas.
+
+Cada caminho é executado a sério (vistas com um pedido sintético e a cobrança
+em modo de simulação) dentro de uma transação que é revertida; as consultas
+SELECT emitidas são capturadas e analisadas com ``EXPLAIN QUERY PLAN`` (SQLite)
+ou ``EXPLAIN`` (PostgreSQL). Em PostgreSQL os planos dependem das estatísticas,
+pelo que o comando deve correr numa base de dados com volume real e após
+``ANALYZE``.
+
+As agregações de ``relatorios.metricas`` percorrem tabelas inteiras de
+propósito (ficam em cache); use ``--ignorar`` para as tabelas aceites.
+"""
+import re
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.utils import timezone
+
+from energia_gestao.views import dashboard
+from pagamentos.cobranca import processar_devedores
+from pagamentos.views import controlo_divida
+from relatorios import metricas
+from relatorios.views import estatisticas_gerais
+
+LEITURA_SEQUENCIAL = {
+    'sqlite': re.compile(r'^SCAN (?!CONSTANT|subquery)(\w+)(?!.*\bUSING\b)'),
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+}
+
+
+def _pedido(caminho, **params):
+    pedido = RequestFactory().get(caminho, params)
+    pedido.user = User(username='explain_hotpaths', is_staff=True, is_superuser=True)
+    return pedido
+
+
+def _dashboard():
+    # Sem cache, para que as consultas das métricas sejam executadas
+    metricas.invalidar()
+    dashboard(_pedido('/dashboard/'))
+
+
+def _estatisticas_gerais():
+    hoje = timezone.localdate()
+    metricas.invalidar()
+    estatisticas_gerais(_pedido(
+        '/relatorios/estatisticas/',
+        data_inicio=(hoje - timedelta(days=30)).isoformat(), data_fim=hoje.isoformat(),
+    ))
+
+
+CAMINHOS = {
+    'controlo_divida': lambda: controlo_divida(_pedido('/pagamentos/divida/')),
+    'dashboard': _dashboard,
+    'estatisticas_gerais': _estatisticas_gerais,
+    'suspender_devedores': lambda: processar_devedores(simular=True),
+}
+
+
+def _capturar(funcao):
+    """Executa ``funcao`` numa transação revertida e devolve os SELECT emitidos (sem repetições)."""
+    consultas = {}
+
+    def registar(execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith('SELECT'):
+            consultas.setdefault(sql, params)
+        return execute(sql, params, many, context)
+
+    # Dentro da transação as leituras ficam na principal (db_routers), a ligação capturada
+    with connection.execute_wrapper(registar), transaction.atomic():
+        funcao()
+        transaction.set_rollback(True)
+    return list(consultas.items())
+
+
+def _plano(sql, params):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [linha[-1] for linha in cursor.fetchall()]
+        cursor.execute(f'EXPLAIN {sql}', params)
+        return [linha[0] for linha in cursor.fetchall()]
+
+
+class Command(BaseCommand):
+    help = 'Mostra os planos de execução das consultas mais usadas e assinala leituras sequenciais'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--caminho', choices=sorted(CAMINHOS), action='append', help='Analisa apenas este caminho (pode repetir)')
+        parser.add_argument('--ignorar', action='append', default=[], help='Tabela cujas leituras sequenciais são aceitáveis (pode repetir)')
+        parser.add_argument('--estrito', action='store_true', help='Termina com erro se houver leituras sequenciais')
+
+    def handle(self, *args, **options):
+        padrao = LEITURA_SEQUENCIAL.get(connection.vendor)
+        if padrao is None:
+            raise CommandError(f'Base de dados não suportada: {connection.vendor} (apenas SQLite e PostgreSQL).')
+
+        sequenciais = []
+        for nome in options['caminho'] or sorted(CAMINHOS):
+            consultas = _capturar(CAMINHOS[nome])
+            self.stdout.write(self.style.MIGRATE_HEADING(f'== {nome} ({len(consultas)} consultas) =='))
+            for numero, (sql, params) in enumerate(consultas, start=1):
+                texto = sql if options['verbosity'] >= 2 else sql[:160] + ('…' if len(sql) > 160 else '')
+                self.stdout.write(f'[{numero}] {texto}')
+                for linha in _plano(sql, params):
+                    encontrado = padrao.search(linha.strip())
+                    if encontrado and encontrado.group(1) not in options['ignorar']:
+                        sequenciais.append((nome, numero, encontrado.group(1)))
+                        self.stdout.write(self.style.WARNING(f'    ! {linha}'))
+                    else:
+                        self.stdout.write(f'      {linha}')
+
+        if not sequenciais:
+            self.stdout.write(self.style.SUCCESS('Nenhuma leitura sequencial encontrada.'))
+            return
+        resumo = ', '.join(f'{nome}[{numero}]: {tabela}' for nome, numero, tabela in sequenciais)
+        mensagem = f'{len(sequenciais)} leituras sequenciais: {resumo}'
+        if options['estrito']:
+            raise CommandError(mensagem)
+        self.stdout.write(self.style.WARNING(mensagem))
@@ -0,0 +1,30 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from relatorios.resumos import RESUMOS, reconstruir
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói as tabelas de resumo (faturação e pagamentos) a partir do histórico'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Reconstrói apenas a partir deste mês (AAAA-MM-DD)')
+        parser.add_argument('--apenas', choices=sorted(RESUMOS), help='Reconstrói apenas um dos resumos')
+
+    def handle(self, *args, **options):
+        desde = None
+        if options['desde']:
+            try:
+                desde = date.fromisoformat(options['desde'])
+            except ValueError:
+                raise CommandError('Data inválida em --desde (use AAAA-MM-DD).')
+
+        for nome in [options['apenas']] if options['apenas'] else sorted(RESUMOS):
+            inicio = time.monotonic()
+            resultado = reconstruir(nome, desde=desde)
+            self.stdout.write(self.style.SUCCESS(
+                f"Resumo de {nome}: {resultado['diarios']} linhas diárias e {resultado['mensais']} mensais "
+                f"em {time.monotonic() - inicio:.2f}s"
+            ))
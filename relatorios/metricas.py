@@ -0,0 +1,123 @@
+"""
+Métricas do dashboard e da página inicial.
+
+Todos os contadores são calculados com uma consulta de agregação condicional
+por tabela e guardados em cache (``settings.METRICAS_CACHE_TTL`` segundos).
+Cada grupo tem a sua chave, invalidada pelos sinais em ``relatorios.signals``
+quando a tabela correspondente é escrita, pelo que um pagamento não obriga a
+recalcular as métricas de clientes ou contadores.
+"""
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from clientes.models import Cliente
+from equipamentos.models import Contador
+from pagamentos.models import Fatura, Recarga
+from pagamentos.recebimentos import SALDO
+
+
+def _metricas_clientes(hoje):
+    return Cliente.objects.aggregate(
+        total_clientes=Count('id'),
+        clientes_ativos=Count('id', filter=Q(status='ATIVO')),
+        clientes_inativos=Count('id', filter=Q(status='INATIVO')),
+        clientes_pre_pago=Count('id', filter=Q(tipo_cliente='PRE_PAGO')),
+        clientes_pos_pago=Count('id', filter=Q(tipo_cliente='POS_PAGO')),
+    )
+
+
+def _metricas_contadores(hoje):
+    return Contador.objects.aggregate(
+        total_contadores=Count('id'),
+        contadores_ativos=Count('id', filter=Q(status='ATIVO')),
+        contadores_suspensos=Count('id', filter=Q(status='SUSPENSO')),
+    )
+
+
+def _metricas_faturas(hoje):
+    inicio_mes = hoje.replace(day=1)
+    fim_mes = (inicio_mes + timedelta(days=32)).replace(day=1)
+    return Fatura.objects.aggregate(
+        total_faturas=Count('id'),
+        faturas_pendentes=Count('id', filter=Q(status='PENDENTE')),
+        faturas_pagas=Count('id', filter=Q(status='PAGO')),
+        faturas_vencidas=Count('id', filter=Q(status='VENCIDO')),
+        consumo_mes_atual=Sum('consumo_kwh', filter=Q(data_emissao__gte=inicio_mes, data_emissao__lt=fim_mes)),
+        total_divida_pendente=Sum(SALDO, filter=Q(status__in=['PENDENTE', 'VENCIDO'])),
+    )
+
+
+def _metricas_recargas(hoje):
+    inicio_dia = timezone.make_aware(datetime(hoje.year, hoje.month, hoje.day))
+    return Recarga.objects.aggregate(
+        total_recargas=Count('id', filter=Q(status='CONFIRMADO')),
+        valor_recargas=Sum('valor', filter=Q(status='CONFIRMADO')),
+        recargas_hoje=Count('id', filter=Q(data_recarga__gte=inicio_dia, data_recarga__lt=inicio_dia + timedelta(days=1))),
+    )
+
+
+NUM_DEVEDORES = 10
+
+GRUPOS = {
+    'clientes': _metricas_clientes,
+    'contadores': _metricas_contadores,
+    'faturas': _metricas_faturas,
+    'recargas': _metricas_recargas,
+}
+
+
+def _chave(grupo, hoje):
+    # A data faz parte da chave para que as métricas "do dia"/"do mês" mudem à meia-noite
+    return f'metricas:{grupo}:{hoje.isoformat()}'
+
+
+def obter_metricas():
+    """Devolve um dicionário com todas as métricas, lendo da cache sempre que possível."""
+    hoje = timezone.localdate()
+    chaves = {grupo: _chave(grupo, hoje) for grupo in GRUPOS}
+    em_cache = cache.get_many(chaves.values())
+
+    metricas = {}
+    em_falta = {}
+    for grupo, chave in chaves.items():
+        if chave in em_cache:
+            metricas.update(em_cache[chave])
+        else:
+            valores = {nome: valor or 0 for nome, valor in GRUPOS[grupo](hoje).items()}
+            em_falta[chave] = valores
+            metricas.update(valores)
+    if em_falta:
+        cache.set_many(em_falta, getattr(settings, 'METRICAS_CACHE_TTL', 60))
+    return metricas
+
+
+def clientes_devedores():
+    """
+    Os ``NUM_DEVEDORES`` clientes com maior dívida em faturas por pagar, em
+    cache como as métricas e invalidados com o grupo ``faturas``.
+    """
+    chave = _chave('devedores', timezone.localdate())
+    devedores = cache.get(chave)
+    if devedores is None:
+        devedores = list(
+            Fatura.objects.filter(status__in=['PENDENTE', 'VENCIDO'])
+            .values('cliente__nome', 'cliente__nif')
+            .annotate(total_divida=Sum(SALDO), faturas_count=Count('id'))
+            .order_by('-total_divida')[:NUM_DEVEDORES]
+        )
+        cache.set(chave, devedores, getattr(settings, 'METRICAS_CACHE_TTL', 60))
+    return devedores
+
+
+def invalidar(*grupos):
+    """Remove da cache os grupos indicados (todos, se nenhum for indicado)."""
+    hoje = timezone.localdate()
+    grupos = grupos or tuple(GRUPOS)
+    chaves = [_chave(grupo, hoje) for grupo in grupos]
+    if 'faturas' in grupos:
+        chaves.append(_chave('devedores', hoje))
+    cache.delete_many(chaves)
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('relatorios', '0002_alter_relatoriogerado_tipo_relatorio'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoFaturacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularidade', models.CharField(choices=[('DIA', 'Diário'), ('MES', 'Mensal')], max_length=3)),
+                ('data', models.DateField(help_text='Dia, ou primeiro dia do mês')),
+                ('tipo_tarifa', models.CharField(blank=True, default='', help_text='Vazio quando o cliente não tem tarifa', max_length=20)),
+                ('tipo_cliente', models.CharField(max_length=10)),
+                ('num_faturas', models.PositiveIntegerField(default=0)),
+                ('total_kwh', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('total_faturado', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+            ],
+            options={
+                'verbose_name': 'Resumo de Faturação',
+                'verbose_name_plural': 'Resumos de Faturação',
+                'ordering': ['-data'],
+                'constraints': [models.UniqueConstraint(fields=('granularidade', 'data', 'tipo_tarifa', 'tipo_cliente'), name='resumo_faturacao_unico')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumoPagamentos',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularidade', models.CharField(choices=[('DIA', 'Diário'), ('MES', 'Mensal')], max_length=3)),
+                ('data', models.DateField(help_text='Dia, ou primeiro dia do mês')),
+                ('tipo_tarifa', models.CharField(blank=True, default='', help_text='Vazio quando o cliente não tem tarifa', max_length=20)),
+                ('tipo_cliente', models.CharField(max_length=10)),
+                ('num_pagamentos', models.PositiveIntegerField(default=0)),
+                ('total_recebido', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+            ],
+            options={
+                'verbose_name': 'Resumo de Pagamentos',
+                'verbose_name_plural': 'Resumos de Pagamentos',
+                'ordering': ['-data'],
+                'constraints': [models.UniqueConstraint(fields=('granularidade', 'data', 'tipo_tarifa', 'tipo_cliente'), name='resumo_pagamentos_unico')],
+            },
+        ),
+    ]
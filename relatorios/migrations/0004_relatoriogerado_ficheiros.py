@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('processamento', '0001_initial'),
+        ('relatorios', '0003_resumofaturacao_resumopagamentos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='relatoriogerado',
+            name='arquivo_excel',
+            field=models.FileField(blank=True, null=True, upload_to='relatorios/'),
+        ),
+        migrations.AddField(
+            model_name='relatoriogerado',
+            name='processo',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='relatorios', to='processamento.processo'),
+        ),
+        migrations.AddField(
+            model_name='relatoriogerado',
+            name='status',
+            field=models.CharField(choices=[('PENDENTE', 'Pendente'), ('GERADO', 'Gerado'), ('ERRO', 'Erro')], default='PENDENTE', max_length=10),
+        ),
+    ]
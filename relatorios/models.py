@@ -12,11 +12,20 @@ class RelatorioGerado(models.Model):
         ('CONSUMO_MENSAL', 'Consumo Mensal Detalhado'),
     ]
     
+    STATUS_CHOICES = [
+        ('PENDENTE', 'Pendente'),
+        ('GERADO', 'Gerado'),
+        ('ERRO', 'Erro'),
+    ]
+    
     titulo = models.CharField(max_length=200)
     tipo_relatorio = models.CharField(max_length=30, choices=TIPO_RELATORIO_CHOICES)
     periodo_inicio = models.DateField()
     periodo_fim = models.DateField()
     arquivo_pdf = models.FileField(upload_to='relatorios/', null=True, blank=True)
+    arquivo_excel = models.FileField(upload_to='relatorios/', null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDENTE')
+    processo = models.ForeignKey('processamento.Processo', on_delete=models.SET_NULL, null=True, blank=True, related_name='relatorios')
     data_geracao = models.DateTimeField(auto_now_add=True)
     gerado_por = models.CharField(max_length=200)
     observacoes = models.TextField(blank=True, null=True)
@@ -28,3 +37,51 @@ class RelatorioGerado(models.Model):
     
     def __str__(self):
         return f"{self.tipo_relatorio} - {self.data_geracao.strftime('%d/%m/%Y')}"
+
+
+class ResumoFaturacao(models.Model):
+    """Totais de faturação por dia/mês de emissão, tipo de tarifa e tipo de cliente (mantidos por relatorios.resumos)."""
+    GRANULARIDADE_CHOICES = [
+        ('DIA', 'Diário'),
+        ('MES', 'Mensal'),
+    ]
+    
+    granularidade = models.CharField(max_length=3, choices=GRANULARIDADE_CHOICES)
+    data = models.DateField(help_text='Dia, ou primeiro dia do mês')
+    tipo_tarifa = models.CharField(max_length=20, blank=True, default='', help_text='Vazio quando o cliente não tem tarifa')
+    tipo_cliente = models.CharField(max_length=10)
+    num_faturas = models.PositiveIntegerField(default=0)
+    total_kwh = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    total_faturado = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    
+    class Meta:
+        verbose_name = 'Resumo de Faturação'
+        verbose_name_plural = 'Resumos de Faturação'
+        ordering = ['-data']
+        constraints = [
+            models.UniqueConstraint(fields=['granularidade', 'data', 'tipo_tarifa', 'tipo_cliente'], name='resumo_faturacao_unico'),
+        ]
+    
+    def __str__(self):
+        return f"{self.granularidade} {self.data} {self.tipo_tarifa or '-'}/{self.tipo_cliente}"
+
+
+class ResumoPagamentos(models.Model):
+    """Totais recebidos por dia/mês de pagamento, tipo de tarifa e tipo de cliente (mantidos por relatorios.resumos)."""
+    granularidade = models.CharField(max_length=3, choices=ResumoFaturacao.GRANULARIDADE_CHOICES)
+    data = models.DateField(help_text='Dia, ou primeiro dia do mês')
+    tipo_tarifa = models.CharField(max_length=20, blank=True, default='', help_text='Vazio quando o cliente não tem tarifa')
+    tipo_cliente = models.CharField(max_length=10)
+    num_pagamentos = models.PositiveIntegerField(default=0)
+    total_recebido = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    
+    class Meta:
+        verbose_name = 'Resumo de Pagamentos'
+        verbose_name_plural = 'Resumos de Pagamentos'
+        ordering = ['-data']
+        constraints = [
+            models.UniqueConstraint(fields=['granularidade', 'data', 'tipo_tarifa', 'tipo_cliente'], name='resumo_pagamentos_unico'),
+        ]
+    
+    def __str__(self):
+        return f"{self.granularidade} {self.data} {self.tipo_tarifa or '-'}/{self.tipo_cliente}"
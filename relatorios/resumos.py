@@ -0,0 +1,324 @@
+"""
+Manutenção das tabelas de resumo (``ResumoFaturacao`` e ``ResumoPagamentos``).
+
+Quando uma fatura ou um pagamento é gravado ou apagado (``registar``, pelos
+sinais), a diferença que a linha faz é somada, depois do commit, às linhas
+do dia e do mês (``F('total') + valor``): o custo de cada escrita é
+constante. As operações em lote (``bulk_create``/``update``, que não emitem
+sinais) pedem com ``marcar`` o recálculo de cada dia tocado (uma agregação
+sobre as linhas do dia) e do mês a partir dos resumos diários. As
+estatísticas leem apenas destas tabelas, pelo que o custo não cresce com o
+histórico.
+
+O tipo de tarifa e o tipo de cliente são os atuais do cliente; se mudarem,
+``python manage.py rebuild_rollups`` volta a alinhar o histórico.
+"""
+import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from functools import partial
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from clientes.models import Cliente
+from pagamentos.models import Fatura, Pagamento
+from .models import ResumoFaturacao, ResumoPagamentos
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_BLOCO = 2000
+
+
+def _inicio_do_dia(dia):
+    return timezone.make_aware(datetime(dia.year, dia.month, dia.day))
+
+
+def intervalo_dias(inicio, fim):
+    """Datetimes ``[inicio, fim + 1 dia)`` no fuso horário local, para filtrar campos de data e hora pelo índice."""
+    return _inicio_do_dia(inicio), _inicio_do_dia(fim) + timedelta(days=1)
+
+
+def _inicio_do_mes_seguinte(mes):
+    return (mes + timedelta(days=32)).replace(day=1)
+
+
+class _Resumo:
+    def __init__(self, modelo, origem, dia, tarifa, cliente, medidas, filtro_dias, filtro_desde, parcela):
+        self.modelo = modelo
+        self.origem = origem
+        self.dia = dia
+        self.tarifa = tarifa
+        self.cliente = cliente
+        self.medidas = medidas
+        self.filtro_dias = filtro_dias
+        self.filtro_desde = filtro_desde
+        # valores de origem.CAMPOS_RESUMO -> (dia, queryset do cliente, {medida: valor})
+        self.parcela = parcela
+        self.contagem = next(medida for medida in medidas if medida.startswith('num_'))
+
+    def agregar_dias(self, filtro):
+        return (
+            self.origem.objects.filter(filtro)
+            .annotate(dia_resumo=self.dia)
+            .order_by()
+            .values('dia_resumo', self.tarifa, self.cliente)
+            .annotate(**self.medidas)
+        )
+
+    def novo(self, granularidade, data, linha):
+        return self.modelo(
+            granularidade=granularidade,
+            data=data,
+            tipo_tarifa=linha[self.tarifa] or '',
+            tipo_cliente=linha[self.cliente] or '',
+            **{medida: linha[medida] or 0 for medida in self.medidas},
+        )
+
+
+def _filtro_dias_pagamento(dias):
+    filtro = Q()
+    for dia in dias:
+        inicio = _inicio_do_dia(dia)
+        filtro |= Q(data_pagamento__gte=inicio, data_pagamento__lt=inicio + timedelta(days=1))
+    return filtro
+
+
+RESUMOS = {
+    'faturacao': _Resumo(
+        ResumoFaturacao, Fatura,
+        dia=F('data_emissao'),
+        tarifa='cliente__tarifa__tipo',
+        cliente='cliente__tipo_cliente',
+        medidas={'num_faturas': Count('id'), 'total_kwh': Sum('consumo_kwh'), 'total_faturado': Sum('valor_total')},
+        filtro_dias=lambda dias: Q(data_emissao__in=dias),
+        filtro_desde=lambda desde: Q(data_emissao__gte=desde),
+        parcela=lambda valores: (
+            valores['data_emissao'],
+            Cliente.objects.filter(pk=valores['cliente_id']),
+            {'num_faturas': 1, 'total_kwh': valores['consumo_kwh'], 'total_faturado': valores['valor_total']},
+        ),
+    ),
+    'pagamentos': _Resumo(
+        ResumoPagamentos, Pagamento,
+        dia=TruncDate('data_pagamento'),
+        tarifa='fatura__cliente__tarifa__tipo',
+        cliente='fatura__cliente__tipo_cliente',
+        medidas={'num_pagamentos': Count('id'), 'total_recebido': Sum('valor_pago')},
+        filtro_dias=_filtro_dias_pagamento,
+        filtro_desde=lambda desde: Q(data_pagamento__gte=_inicio_do_dia(desde)),
+        parcela=lambda valores: (
+            timezone.localdate(valores['data_pagamento']),
+            Cliente.objects.filter(faturas=valores['fatura_id']),
+            {'num_pagamentos': 1, 'total_recebido': valores['valor_pago']},
+        ),
+    ),
+}
+
+
+def _substituir(resumo, granularidade, datas, objetos):
+    """Grava ``objetos`` (upsert) e remove as combinações dessas datas que deixaram de existir."""
+    modelo = resumo.modelo
+    chaves = {(o.data, o.tipo_tarifa, o.tipo_cliente) for o in objetos}
+    with transaction.atomic():
+        if objetos:
+            modelo.objects.bulk_create(
+                objetos,
+                update_conflicts=True,
+                unique_fields=['granularidade', 'data', 'tipo_tarifa', 'tipo_cliente'],
+                update_fields=list(resumo.medidas),
+            )
+        obsoletos = [
+            pk for pk, *chave in modelo.objects.filter(granularidade=granularidade, data__in=datas)
+            .values_list('pk', 'data', 'tipo_tarifa', 'tipo_cliente')
+            if tuple(chave) not in chaves
+        ]
+        if obsoletos:
+            modelo.objects.filter(pk__in=obsoletos).delete()
+
+
+def _recalcular_meses(resumo, meses):
+    for mes in meses:
+        linhas = (
+            resumo.modelo.objects
+            .filter(granularidade='DIA', data__gte=mes, data__lt=_inicio_do_mes_seguinte(mes))
+            .values('tipo_tarifa', 'tipo_cliente')
+            .annotate(**{medida: Sum(medida) for medida in resumo.medidas})
+        )
+        objetos = [
+            resumo.modelo(granularidade='MES', data=mes, tipo_tarifa=linha['tipo_tarifa'],
+                          tipo_cliente=linha['tipo_cliente'],
+                          **{medida: linha[medida] for medida in resumo.medidas})
+            for linha in linhas
+        ]
+        _substituir(resumo, 'MES', [mes], objetos)
+
+
+def atualizar(nome, dias):
+    """Recalcula os resumos diários de ``dias`` e os mensais correspondentes."""
+    resumo = RESUMOS[nome]
+    dias = set(dias)
+    if not dias:
+        return
+    objetos = [
+        resumo.novo('DIA', linha['dia_resumo'], linha)
+        for linha in resumo.agregar_dias(resumo.filtro_dias(dias))
+    ]
+    _substituir(resumo, 'DIA', dias, objetos)
+    _recalcular_meses(resumo, {dia.replace(day=1) for dia in dias})
+
+
+def reconstruir(nome, desde=None, tamanho_bloco=TAMANHO_BLOCO):
+    """Reconstrói os resumos a partir das tabelas de origem (todo o histórico ou desde ``desde``)."""
+    resumo = RESUMOS[nome]
+    modelo = resumo.modelo
+    if desde:
+        desde = desde.replace(day=1)
+    filtro = resumo.filtro_desde(desde) if desde else Q()
+    with transaction.atomic():
+        existentes = modelo.objects.all()
+        if desde:
+            existentes = existentes.filter(data__gte=desde)
+        existentes.delete()
+
+        bloco = []
+        dias = 0
+        for linha in resumo.agregar_dias(filtro).iterator(chunk_size=tamanho_bloco):
+            bloco.append(resumo.novo('DIA', linha['dia_resumo'], linha))
+            if len(bloco) >= tamanho_bloco:
+                modelo.objects.bulk_create(bloco)
+                dias += len(bloco)
+                bloco = []
+        modelo.objects.bulk_create(bloco)
+        dias += len(bloco)
+
+        diarios = modelo.objects.filter(granularidade='DIA')
+        if desde:
+            diarios = diarios.filter(data__gte=desde)
+        mensais = [
+            resumo.modelo(granularidade='MES', data=linha['mes'], tipo_tarifa=linha['tipo_tarifa'],
+                          tipo_cliente=linha['tipo_cliente'],
+                          **{medida: linha[medida] for medida in resumo.medidas})
+            for linha in diarios.annotate(mes=TruncMonth('data')).order_by()
+            .values('mes', 'tipo_tarifa', 'tipo_cliente')
+            .annotate(**{medida: Sum(medida) for medida in resumo.medidas})
+        ]
+        modelo.objects.bulk_create(mensais, batch_size=tamanho_bloco)
+    return {'diarios': dias, 'mensais': len(mensais)}
+
+
+_estado = threading.local()
+
+
+def marcar(nome, dia):
+    """Pede a atualização do resumo ``nome`` para ``dia`` depois do commit."""
+    pendentes = getattr(_estado, 'pendentes', None)
+    if pendentes is not None:
+        pendentes[nome].add(dia)
+    else:
+        transaction.on_commit(partial(atualizar, nome, {dia}))
+
+
+def _parcela(resumo, valores, sinal):
+    """``(dia, tipo_tarifa, tipo_cliente, {medida: valor × sinal})`` com que a linha conta nos resumos."""
+    dia, clientes, medidas = resumo.parcela(valores)
+    tipos = clientes.values_list('tarifa__tipo', 'tipo_cliente').first()
+    if tipos is None:
+        return None
+    return dia, tipos[0] or '', tipos[1] or '', {medida: (valor or 0) * sinal for medida, valor in medidas.items()}
+
+
+def _somar(resumo, chave, medidas):
+    """Soma ``medidas`` à linha ``chave`` (upsert incremental); remove-a se a contagem chegar a zero."""
+    modelo = resumo.modelo
+    incrementos = {medida: F(medida) + valor for medida, valor in medidas.items()}
+    try:
+        with transaction.atomic():
+            if modelo.objects.filter(**chave).update(**incrementos):
+                if medidas[resumo.contagem] < 0:
+                    modelo.objects.filter(**chave, **{resumo.contagem: 0}).delete()
+                return
+            if any(valor < 0 for valor in medidas.values()):
+                raise IntegrityError('linha de resumo inexistente')
+            try:
+                with transaction.atomic():
+                    modelo.objects.create(**chave, **medidas)
+            except IntegrityError:
+                # Criada entretanto por outro pedido
+                modelo.objects.filter(**chave).update(**incrementos)
+    except IntegrityError:
+        # Só acontece se o resumo já estiver desalinhado da origem (p. ex. o tipo do cliente mudou)
+        logger.warning(
+            "Resumo %s %s desalinhado; execute manage.py rebuild_rollups", modelo._meta.model_name, chave, exc_info=True
+        )
+
+
+def _aplicar(resumo, parcelas):
+    diferencas = defaultdict(lambda: defaultdict(int))
+    for dia, tipo_tarifa, tipo_cliente, medidas in parcelas:
+        for granularidade, data in (('DIA', dia), ('MES', dia.replace(day=1))):
+            chave = (granularidade, data, tipo_tarifa, tipo_cliente)
+            for medida, valor in medidas.items():
+                diferencas[chave][medida] += valor
+    for (granularidade, data, tipo_tarifa, tipo_cliente), medidas in diferencas.items():
+        if any(medidas.values()):
+            _somar(
+                resumo,
+                {'granularidade': granularidade, 'data': data, 'tipo_tarifa': tipo_tarifa, 'tipo_cliente': tipo_cliente},
+                medidas,
+            )
+
+
+def registar(nome, instancia, criada=False, apagada=False):
+    """
+    Regista nos resumos ``nome`` a escrita de ``instancia`` (fatura ou
+    pagamento): a diferença entre os valores lidos da base de dados
+    (``_resumo``, guardado por ``from_db``) e os atuais é somada depois do
+    commit. Sem alterações nos campos resumidos não faz nenhuma consulta.
+    """
+    resumo = RESUMOS[nome]
+    atual = {campo: getattr(instancia, campo) for campo in resumo.origem.CAMPOS_RESUMO}
+    anterior = None if criada else getattr(instancia, '_resumo', None)
+    instancia._resumo = None if apagada else atual
+    if apagada:
+        anterior, atual = anterior or atual, None
+    elif not criada and anterior is None:
+        # Valores anteriores desconhecidos (instância não lida da base de dados ou com campos adiados)
+        marcar(nome, resumo.parcela(atual)[0])
+        return
+    if anterior == atual:
+        return
+
+    pendentes = getattr(_estado, 'pendentes', None)
+    if pendentes is not None:
+        # O lote recalcula os dias no fim: somar também contaria a linha duas vezes
+        pendentes[nome].update(resumo.parcela(valores)[0] for valores in (anterior, atual) if valores)
+        return
+    # O cliente é lido já (num apagamento em cascata deixa de existir antes do commit)
+    parcelas = [
+        _parcela(resumo, valores, sinal)
+        for valores, sinal in ((anterior, -1), (atual, 1)) if valores
+    ]
+    transaction.on_commit(partial(_aplicar, resumo, [parcela for parcela in parcelas if parcela]))
+
+
+@contextmanager
+def adiar_atualizacao():
+    """
+    Agrupa as atualizações pedidas dentro do bloco (por exemplo, numa
+    operação em lote) e aplica-as uma única vez por dia no fim.
+    """
+    if getattr(_estado, 'pendentes', None) is not None:
+        yield
+        return
+    _estado.pendentes = defaultdict(set)
+    try:
+        yield
+    finally:
+        pendentes, _estado.pendentes = _estado.pendentes, None
+    for nome, dias in pendentes.items():
+        transaction.on_commit(partial(atualizar, nome, dias))
@@ -0,0 +1,54 @@
+"""Invalidação das métricas em cache e atualização dos resumos quando as tabelas de origem são escritas."""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from clientes.models import Cliente
+from equipamentos.models import Contador
+from pagamentos.models import Fatura, Pagamento, Recarga
+from . import metricas, resumos
+
+
+def _invalidar_apos_commit(grupo):
+    # Depois do commit, para que outro pedido não volte a guardar valores antigos
+    transaction.on_commit(lambda: metricas.invalidar(grupo))
+
+
+@receiver([post_save, post_delete], sender=Cliente)
+def invalidar_metricas_clientes(sender, **kwargs):
+    _invalidar_apos_commit('clientes')
+
+
+@receiver([post_save, post_delete], sender=Contador)
+def invalidar_metricas_contadores(sender, **kwargs):
+    _invalidar_apos_commit('contadores')
+
+
+@receiver([post_save, post_delete], sender=Fatura)
+def invalidar_metricas_faturas(sender, **kwargs):
+    _invalidar_apos_commit('faturas')
+
+
+@receiver([post_save, post_delete], sender=Recarga)
+def invalidar_metricas_recargas(sender, **kwargs):
+    _invalidar_apos_commit('recargas')
+
+
+@receiver(post_save, sender=Fatura)
+def atualizar_resumo_faturacao(sender, instance, created, **kwargs):
+    resumos.registar('faturacao', instance, criada=created)
+
+
+@receiver(post_delete, sender=Fatura)
+def remover_resumo_faturacao(sender, instance, **kwargs):
+    resumos.registar('faturacao', instance, apagada=True)
+
+
+@receiver(post_save, sender=Pagamento)
+def atualizar_resumo_pagamentos(sender, instance, created, **kwargs):
+    resumos.registar('pagamentos', instance, criada=created)
+
+
+@receiver(post_delete, sender=Pagamento)
+def remover_resumo_pagamentos(sender, instance, **kwargs):
+    resumos.registar('pagamentos', instance, apagada=True)
@@ -0,0 +1,15 @@
+"""Processos de relatórios executados pelo worker (``manage.py processar_fila``)."""
+from processamento.fila import tarefa
+from . import geradores
+from .models import RelatorioGerado
+
+
+@tarefa('GERAR_RELATORIO')
+def gerar_relatorio(processo, relatorio_id):
+    relatorio = RelatorioGerado.objects.get(pk=relatorio_id)
+    try:
+        linhas = geradores.gerar(relatorio)
+    except Exception:
+        RelatorioGerado.objects.filter(pk=relatorio_id).update(status='ERRO')
+        raise
+    return {'relatorio': relatorio.pk, 'tipo': relatorio.tipo_relatorio, 'linhas': linhas}
@@ -7,4 +7,5 @@ urlpatterns = [
     path('estatisticas/', views.estatisticas_gerais, name='estatisticas_gerais'),
     path('exportar/pdf/<int:pk>/', views.exportar_relatorio_pdf, name='exportar_relatorio_pdf'),
     path('exportar/excel/<int:pk>/', views.exportar_relatorio_excel, name='exportar_relatorio_excel'),
+    path('exportar/dados/', views.exportar_dados, name='exportar_dados'),
 ]
@@ -1,80 +1,81 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
-from .models import RelatorioGerado
+from .models import RelatorioGerado, ResumoFaturacao, ResumoPagamentos
+from .metricas import clientes_devedores, obter_metricas
 from django.utils import timezone
-from django.db.models import Count, Sum
-from django.db.models.functions import TruncMonth, TruncDay
+from django.db.models import Sum, F
 from clientes.models import Cliente
-from pagamentos.models import Pagamento, Fatura
-from equipamentos.models import Contador
-from django.http import HttpResponse
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-import openpyxl
-from io import BytesIO
+from pagamentos.models import Pagamento, Tarifa
+from django.http import StreamingHttpResponse, FileResponse
+from django.utils.dateparse import parse_date
+from .exportacao import gerar_csv, gerar_xlsx
+from .resumos import intervalo_dias
+from .forms import ExportacaoForm, RelatorioForm
+from django.contrib import messages
+from processamento.fila import enfileirar
+from energia_gestao.db_routers import usar_replica
+from .geradores import RELATORIOS
+import os
 
 def is_admin_or_financeiro(user):
     return user.is_staff or (hasattr(user, 'perfil') and user.perfil.tipo_usuario in ['ADMIN', 'FINANCEIRO'])
 
+def _enfileirar_relatorio(request, relatorio):
+    """Coloca a geração do relatório na fila (se ainda não estiver) e mostra o progresso."""
+    if relatorio.processo_id and relatorio.status == 'PENDENTE' and not relatorio.processo.terminado:
+        return redirect('processo_detail', pk=relatorio.processo_id)
+    relatorio.processo = enfileirar('GERAR_RELATORIO', criado_por=request.user, relatorio_id=relatorio.pk)
+    relatorio.status = 'PENDENTE'
+    relatorio.save(update_fields=['processo', 'status'])
+    messages.info(request, "Geração do relatório colocada em fila de processamento.")
+    return redirect('processo_detail', pk=relatorio.processo_id)
+
+def _servir_ficheiro(request, relatorio, campo):
+    """Serve o ficheiro já gerado; se ainda não existir, pede a geração."""
+    arquivo = getattr(relatorio, campo)
+    if relatorio.status == 'GERADO' and arquivo and arquivo.storage.exists(arquivo.name):
+        return FileResponse(arquivo.open('rb'), as_attachment=True, filename=os.path.basename(arquivo.name))
+    if relatorio.tipo_relatorio not in RELATORIOS:
+        messages.error(request, f"Não existe gerador para relatórios do tipo {relatorio.get_tipo_relatorio_display()}.")
+        return redirect('relatorio_list')
+    return _enfileirar_relatorio(request, relatorio)
+
 @login_required
 @user_passes_test(is_admin_or_financeiro)
 def exportar_relatorio_pdf(request, pk):
-    relatorio = get_object_or_404(RelatorioGerado, pk=pk)
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="relatorio_{relatorio.id}.pdf"'
-
-    buffer = BytesIO()
-    p = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
-
-    p.setFont("Helvetica-Bold", 16)
-    p.drawString(100, height - 100, f"Relatório: {relatorio.titulo}")
-    
-    p.setFont("Helvetica", 12)
-    p.drawString(100, height - 130, f"Tipo: {relatorio.get_tipo_relatorio_display()}")
-    p.drawString(100, height - 150, f"Período: {relatorio.periodo_inicio} a {relatorio.periodo_fim}")
-    p.drawString(100, height - 170, f"Gerado por: {relatorio.gerado_por}")
-    p.drawString(100, height - 190, f"Data de Geração: {relatorio.data_geracao.strftime('%d/%m/%Y %H:%M')}")
-    
-    p.drawString(100, height - 220, "Observações:")
-    p.drawString(100, height - 240, relatorio.observacoes)
-
-    p.showPage()
-    p.save()
-
-    pdf = buffer.getvalue()
-    buffer.close()
-    response.write(pdf)
-    return response
+    relatorio = get_object_or_404(RelatorioGerado.objects.select_related('processo'), pk=pk)
+    return _servir_ficheiro(request, relatorio, 'arquivo_pdf')
 
 @login_required
 @user_passes_test(is_admin_or_financeiro)
 def exportar_relatorio_excel(request, pk):
-    relatorio = get_object_or_404(RelatorioGerado, pk=pk)
-    
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Relatório"
-
-    ws['A1'] = "Título"
-    ws['B1'] = relatorio.titulo
-    ws['A2'] = "Tipo"
-    ws['B2'] = relatorio.get_tipo_relatorio_display()
-    ws['A3'] = "Período"
-    ws['B3'] = f"{relatorio.periodo_inicio} a {relatorio.periodo_fim}"
-    ws['A4'] = "Gerado por"
-    ws['B4'] = relatorio.gerado_por
-    ws['A5'] = "Data de Geração"
-    ws['B5'] = relatorio.data_geracao.strftime('%d/%m/%Y %H:%M')
-    ws['A6'] = "Observações"
-    ws['B6'] = relatorio.observacoes
-
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = f'attachment; filename="relatorio_{relatorio.id}.xlsx"'
-    
-    wb.save(response)
-    return response
+    relatorio = get_object_or_404(RelatorioGerado.objects.select_related('processo'), pk=pk)
+    return _servir_ficheiro(request, relatorio, 'arquivo_excel')
+
+@login_required
+@user_passes_test(is_admin_or_financeiro)
+def exportar_dados(request):
+    """Exporta faturas, pagamentos ou leituras de um período em CSV ou XLSX, em fluxo."""
+    form = ExportacaoForm(request.GET or None)
+    if not form.is_valid():
+        return render(request, 'relatorios/exportar_dados.html', {'form': form})
+
+    tipo = form.cleaned_data['tipo']
+    inicio = form.cleaned_data['data_inicio']
+    fim = form.cleaned_data['data_fim']
+    nome = f"{tipo}_{inicio:%Y%m%d}_{fim:%Y%m%d}"
+
+    if form.cleaned_data['formato'] == 'csv':
+        response = StreamingHttpResponse(gerar_csv(tipo, inicio, fim), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{nome}.csv"'
+        return response
+
+    return FileResponse(
+        gerar_xlsx(tipo, inicio, fim),
+        as_attachment=True,
+        filename=f"{nome}.xlsx",
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
 
 @login_required
 @user_passes_test(is_admin_or_financeiro)
@@ -85,80 +86,96 @@ def relatorio_list(request):
 @login_required
 @user_passes_test(is_admin_or_financeiro)
 def gerar_relatorio_view(request):
-    if request.method == 'POST':
-        tipo = request.POST.get('tipo_relatorio')
-        inicio = request.POST.get('periodo_inicio')
-        fim = request.POST.get('periodo_fim')
-        
-        # Simulação de geração de relatório
-        relatorio = RelatorioGerado.objects.create(
-            titulo=f"Relatório de {dict(RelatorioGerado.TIPO_RELATORIO_CHOICES).get(tipo)}",
-            tipo_relatorio=tipo,
-            periodo_inicio=inicio,
-            periodo_fim=fim,
-            gerado_por=request.user.username,
-            observacoes=f"Gerado automaticamente em {timezone.now().strftime('%d/%m/%Y %H:%M')}"
-        )
-        return redirect('relatorio_list')
-    
-    return render(request, 'relatorios/relatorio_form.html', {
-        'tipos': RelatorioGerado.TIPO_RELATORIO_CHOICES
-    })
+    """
+    Regista o pedido de relatório e enfileira a geração (relatorios.geradores);
+    o PDF e o XLSX ficam guardados no registo e são servidos a partir daí.
+    """
+    form = RelatorioForm(request.POST or None)
+    if request.method == 'POST' and form.is_valid():
+        relatorio = form.save(commit=False)
+        relatorio.titulo = f"Relatório de {relatorio.get_tipo_relatorio_display()}"
+        relatorio.gerado_por = request.user.username
+        relatorio.observacoes = f"Pedido em {timezone.localtime().strftime('%d/%m/%Y %H:%M')}"
+        relatorio.save()
+        return _enfileirar_relatorio(request, relatorio)
+
+    return render(request, 'relatorios/relatorio_form.html', {'form': form})
 
 @login_required
 @user_passes_test(is_admin_or_financeiro)
+@usar_replica()
 def estatisticas_gerais(request):
-    total_clientes = Cliente.objects.count()
-    total_recebido = Pagamento.objects.aggregate(Sum('valor_pago'))['valor_pago__sum'] or 0
-    total_faturado = Fatura.objects.aggregate(Sum('valor_total'))['valor_total__sum'] or 0
-    faturas_vencidas = Fatura.objects.filter(status='VENCIDO').count()
-    contadores_ativos = Contador.objects.filter(status='ATIVO').count()
-    
+    """
+    Estatísticas gerais lidas das tabelas de resumo (relatorios.resumos) e das
+    métricas em cache, para que o custo não cresça com o histórico.
+    """
+    metricas = obter_metricas()
+    faturacao_mensal = ResumoFaturacao.objects.filter(granularidade='MES')
+    pagamentos_mensais = ResumoPagamentos.objects.filter(granularidade='MES')
+    pagamentos_diarios = ResumoPagamentos.objects.filter(granularidade='DIA')
+
+    total_recebido = pagamentos_mensais.aggregate(Sum('total_recebido'))['total_recebido__sum'] or 0
+    total_faturado = faturacao_mensal.aggregate(Sum('total_faturado'))['total_faturado__sum'] or 0
+
     # Consumo Mensal (últimos 6 meses)
-    consumo_mensal = Fatura.objects.annotate(mes=TruncMonth('data_emissao'))\
-        .values('mes')\
-        .annotate(total_kwh=Sum('consumo_kwh'), total_valor=Sum('valor_total'))\
+    consumo_mensal = faturacao_mensal.values(mes=F('data'))\
+        .annotate(total_kwh=Sum('total_kwh'), total_valor=Sum('total_faturado'))\
         .order_by('-mes')[:6]
-    
+
     # Receita Mensal (Pagamentos confirmados)
-    receita_mensal = Pagamento.objects.annotate(mes=TruncMonth('data_pagamento'))\
-        .values('mes')\
-        .annotate(total_recebido=Sum('valor_pago'))\
+    receita_mensal = pagamentos_mensais.values(mes=F('data'))\
+        .annotate(total_recebido=Sum('total_recebido'))\
         .order_by('-mes')[:6]
         
     # Receita Diária (últimos 15 dias)
-    receita_diaria = Pagamento.objects.annotate(dia=TruncDay('data_pagamento'))\
-        .values('dia')\
-        .annotate(total_recebido=Sum('valor_pago'))\
+    receita_diaria = pagamentos_diarios.values(dia=F('data'))\
+        .annotate(total_recebido=Sum('total_recebido'))\
         .order_by('-dia')[:15]
 
+    # Faturação do mês corrente por tipo de tarifa e tipo de cliente
+    tipos_tarifa = dict(Tarifa.TIPO_TARIFA_CHOICES)
+    tipos_cliente = dict(Cliente.TIPO_CLIENTE_CHOICES)
+    faturacao_por_tipo = [
+        {
+            'tipo_tarifa': tipos_tarifa.get(resumo.tipo_tarifa, 'Sem tarifa'),
+            'tipo_cliente': tipos_cliente.get(resumo.tipo_cliente, resumo.tipo_cliente),
+            'num_faturas': resumo.num_faturas,
+            'total_kwh': resumo.total_kwh,
+            'total_faturado': resumo.total_faturado,
+        }
+        for resumo in faturacao_mensal.filter(data=timezone.localdate().replace(day=1)).order_by('tipo_tarifa', 'tipo_cliente')
+    ]
+
     # Pagamentos por Período (Filtro)
     data_inicio = request.GET.get('data_inicio')
     data_fim = request.GET.get('data_fim')
-    pagamentos_periodo = Pagamento.objects.all()
-    
-    if data_inicio and data_fim:
-        pagamentos_periodo = pagamentos_periodo.filter(data_pagamento__date__range=[data_inicio, data_fim])
-    
-    total_periodo = pagamentos_periodo.aggregate(Sum('valor_pago'))['valor_pago__sum'] or 0
+    pagamentos_periodo = Pagamento.objects.select_related('fatura__cliente')
+    total_periodo = 0
+
+    inicio, fim = parse_date(data_inicio or ''), parse_date(data_fim or '')
+    if inicio and fim:
+        # Intervalo de datetimes (e não data_pagamento__date) para poder usar o índice de data_pagamento
+        desde, ate = intervalo_dias(inicio, fim)
+        pagamentos_periodo = pagamentos_periodo.filter(data_pagamento__gte=desde, data_pagamento__lt=ate)
+        total_periodo = pagamentos_diarios.filter(data__range=[inicio, fim])\
+            .aggregate(Sum('total_recebido'))['total_recebido__sum'] or 0
+
     pagamentos_periodo = pagamentos_periodo.order_by('-data_pagamento')[:20]
 
-    # Clientes Devedores (Top 10 com maior dívida)
-    clientes_devedores = Fatura.objects.filter(status__in=['PENDENTE', 'VENCIDO'])\
-        .values('cliente__nome', 'cliente__nif')\
-        .annotate(total_divida=Sum('valor_total'), faturas_count=Count('id'))\
-        .order_by('-total_divida')[:10]
-    
+    # Clientes Devedores (Top 10 com maior dívida, em cache com as métricas)
+    devedores = clientes_devedores()
+
     context = {
-        'total_clientes': total_clientes,
+        'total_clientes': metricas['total_clientes'],
         'total_recebido': total_recebido,
         'total_faturado': total_faturado,
-        'faturas_vencidas': faturas_vencidas,
-        'contadores_ativos': contadores_ativos,
+        'faturas_vencidas': metricas['faturas_vencidas'],
+        'contadores_ativos': metricas['contadores_ativos'],
         'consumo_mensal': consumo_mensal,
         'receita_mensal': receita_mensal,
         'receita_diaria': receita_diaria,
-        'clientes_devedores': clientes_devedores,
+        'faturacao_por_tipo': faturacao_por_tipo,
+        'clientes_devedores': devedores,
         'pagamentos_periodo': pagamentos_periodo,
         'total_periodo': total_periodo,
         'filtros': {'inicio': data_inicio, 'fim': data_fim}